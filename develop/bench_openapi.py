@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开放平台客户端基准测试
+
+在本地启动一个模拟开放平台(每个请求固定延迟), 比较获取全部服务器和子频道的耗时:
+    - 旧方式: requests 逐个请求, 每次新建连接
+    - 新方式: OpenAPIClient 连接复用 + 并发获取
+
+用法:
+    python develop/bench_openapi.py --guilds 50 --channels 20 --latency 30
+"""
+
+import time
+import asyncio
+import argparse
+import threading
+
+import requests
+from aiohttp import web
+
+from openapi_client import OpenAPIClient
+
+
+def build_app(guilds: int, channels: int, latency: float) -> web.Application:
+    guild_list = [{"id": str(1000 + i), "name": f"服务器{i}"} for i in range(guilds)]
+
+    async def delay():
+        await asyncio.sleep(latency)
+
+    async def token(request):
+        await delay()
+        return web.json_response({"access_token": "mock-token", "expires_in": "7200"})
+
+    async def list_guilds(request):
+        await delay()
+        limit = int(request.query.get("limit", 100))
+        after = request.query.get("after")
+        start = 0 if after is None else next(i for i, g in enumerate(guild_list) if g["id"] == after) + 1
+        return web.json_response(guild_list[start:start + limit])
+
+    async def list_channels(request):
+        await delay()
+        guild_id = request.match_info["guild_id"]
+        return web.json_response([{"id": f"{guild_id}-{j}", "name": f"子频道{j}", "type": 0}
+                                  for j in range(channels)])
+
+    app = web.Application()
+    app.router.add_post("/app/getAppAccessToken", token)
+    app.router.add_get("/users/@me/guilds", list_guilds)
+    app.router.add_get("/guilds/{guild_id}/channels", list_channels)
+    return app
+
+
+def start_server(app: web.Application, port: int):
+    """在后台线程中运行模拟服务"""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+
+def sequential_inventory(base: str) -> int:
+    """旧方式: 与原 get.py 相同, 每个请求都是独立的 requests 调用"""
+    token = requests.post(f"{base}/app/getAppAccessToken", json={"appId": "1", "clientSecret": "2"}).json()
+    headers = {"Authorization": f"QQBot {token['access_token']}"}
+    guilds = requests.get(f"{base}/users/@me/guilds", headers=headers).json()
+    total = 0
+    for guild in guilds:
+        total += len(requests.get(f"{base}/guilds/{guild['id']}/channels", headers=headers).json())
+    return total
+
+
+async def pooled_inventory(base: str, concurrency: int) -> int:
+    async with OpenAPIClient("1", "2", base_url=base, concurrency=concurrency,
+                             token_url=f"{base}/app/getAppAccessToken", token_cache=None) as client:
+        inventory = await client.inventory()
+    return sum(len(item["channels"]) for item in inventory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="开放平台客户端基准测试(本地模拟服务)")
+    parser.add_argument("--guilds", type=int, default=50, help="模拟的服务器数量")
+    parser.add_argument("--channels", type=int, default=20, help="每个服务器的子频道数量")
+    parser.add_argument("--latency", type=float, default=30, help="每个请求的模拟延迟(毫秒)")
+    parser.add_argument("--concurrency", type=int, default=8, help="新客户端的并发上限")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    start_server(build_app(args.guilds, args.channels, args.latency / 1000), args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    time.sleep(0.2)
+
+    started = time.perf_counter()
+    old_total = sequential_inventory(base)
+    old_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_total = asyncio.run(pooled_inventory(base, args.concurrency))
+    new_time = time.perf_counter() - started
+
+    assert old_total == new_total == args.guilds * args.channels
+    print(f"服务器 {args.guilds} 个, 每个 {args.channels} 个子频道, 单次请求延迟 {args.latency:.0f}ms")
+    print(f"逐个请求(requests):     {old_time:.3f}s")
+    print(f"连接复用+并发({args.concurrency}):     {new_time:.3f}s  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@
 import os
 import sys
 import json
-import requests
+import asyncio
 from typing import Dict, List, Optional, Any
 import traceback
 import argparse
@@ -12,6 +12,8 @@ import logging as py_logging
 from botpy.ext.cog_yaml import read
 from botpy import logging
 
+from openapi_client import OpenAPIClient, API_BASE
+
 # 配置日志以显示更多信息
 py_logging.basicConfig(level=py_logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.get_logger()
@@ -19,7 +21,7 @@ logger = logging.get_logger()
 class ChannelCreator:
     """QQ频道子频道创建器"""
     
-    def __init__(self, appid: str = None, secret: str = None):
+    def __init__(self, appid: str = None, secret: str = None, concurrency: int = 8):
         if not appid or not secret:
             config_path = os.path.join(os.path.dirname(__file__), "config.yaml")
             print(f"正在尝试读取配置文件: {config_path}")
@@ -36,60 +38,31 @@ class ChannelCreator:
             self.secret = secret
         
         # 使用正式环境API地址
-        self.base_url = "https://api.sgroup.qq.com"
-        self.access_token = self.get_access_token()
+        self.base_url = API_BASE
+        self.client = OpenAPIClient(self.appid, self.secret, base_url=self.base_url, concurrency=concurrency)
         print(f"使用API地址: {self.base_url}")
 
-    def get_access_token(self) -> str:
-        """获取访问令牌"""
-        url = "https://bots.qq.com/app/getAppAccessToken"
-        data = {
-            "appId": self.appid,
-            "clientSecret": self.secret
-        }
-        headers = {"Content-Type": "application/json"}
-        print(f"正在请求access_token，URL: {url}")
-        try:
-            resp = requests.post(url, json=data, headers=headers)
-            print(f"access_token请求状态码: {resp.status_code}")
-            resp.raise_for_status()
-            result = resp.json()
-            if "access_token" in result:
-                print("成功获取access_token")
-                return result["access_token"]
-            else:
-                raise Exception(f"获取access_token失败: {result}")
-        except Exception as e:
-            print(f"获取access_token异常: {str(e)}")
-            logger.error(f"获取access_token异常: {str(e)}")
-            logger.error(traceback.format_exc())
-            raise
+    async def __aenter__(self):
+        await self.client.__aenter__()
+        return self
 
-    def get_guild_list(self) -> List[Dict[str, Any]]:
+    async def __aexit__(self, *exc):
+        await self.client.close()
+
+    async def get_guild_list(self) -> List[Dict[str, Any]]:
         """获取机器人加入的服务器列表"""
-        url = f"{self.base_url}/users/@me/guilds"
-        headers = {
-            "Authorization": f"QQBot {self.access_token}"
-        }
-        print(f"正在请求服务器列表，URL: {url}")
+        print(f"正在请求服务器列表，URL: {self.base_url}/users/@me/guilds")
         try:
-            response = requests.get(url, headers=headers)
-            print(f"服务器列表请求状态码: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            if isinstance(result, list):
-                print(f"获取到 {len(result)} 个服务器")
-                return result
-            else:
-                print(f"获取服务器列表失败，响应格式不正确: {result}")
-                return []
+            result = await self.client.list_guilds()
+            print(f"获取到 {len(result)} 个服务器")
+            return result
         except Exception as e:
             print(f"获取服务器列表异常: {str(e)}")
             return []
 
-    def create_channel(self, guild_id: str, name: str, channel_type: int = 0, 
-                      parent_id: str = "0", private_type: int = 0, 
-                      speak_permission: int = 0) -> Optional[Dict[str, Any]]:
+    async def create_channel(self, guild_id: str, name: str, channel_type: int = 0, 
+                             parent_id: str = "0", private_type: int = 0, 
+                             speak_permission: int = 0) -> Optional[Dict[str, Any]]:
         """创建子频道
         
         Args:
@@ -103,11 +76,6 @@ class ChannelCreator:
         Returns:
             Dict[str, Any]: 创建的子频道信息，失败返回None
         """
-        url = f"{self.base_url}/guilds/{guild_id}/channels"
-        headers = {
-            "Authorization": f"QQBot {self.access_token}",
-            "Content-Type": "application/json"
-        }
         data = {
             "name": name,
             "type": channel_type,
@@ -117,14 +85,11 @@ class ChannelCreator:
             "speak_permission": speak_permission
         }
         
-        print(f"正在创建子频道，URL: {url}")
+        print(f"正在创建子频道，服务器ID: {guild_id}")
         print(f"创建参数: {json.dumps(data, ensure_ascii=False)}")
         
         try:
-            response = requests.post(url, headers=headers, json=data)
-            print(f"创建子频道请求状态码: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
+            result = await self.client.create_channel(guild_id, data)
             print(f"创建子频道响应: {json.dumps(result, ensure_ascii=False)}")
             return result
         except Exception as e:
@@ -133,7 +98,7 @@ class ChannelCreator:
             logger.error(traceback.format_exc())
             return None
 
-def main():
+async def run():
     # 读取创建配置
     create_config_path = os.path.join(os.path.dirname(__file__), "createconfig.yaml")
     if not os.path.exists(create_config_path):
@@ -146,12 +111,14 @@ def main():
         print("配置文件中没有找到子频道配置")
         return
         
-    creator = ChannelCreator()
-    
+    async with ChannelCreator() as creator:
+        await create_all(creator, create_config, channels)
+
+async def create_all(creator, create_config, channels):
     # 获取服务器ID
     guild_id = create_config.get("guild_id", "")
     if not guild_id:
-        guilds = creator.get_guild_list()
+        guilds = await creator.get_guild_list()
         if not guilds:
             print("未获取到任何服务器信息")
             return
@@ -181,7 +148,7 @@ def main():
             continue
             
         print(f"\n正在创建子频道: {name}")
-        result = creator.create_channel(
+        result = await creator.create_channel(
             guild_id=guild_id,
             name=name,
             channel_type=channel.get("type", 0),
@@ -196,5 +163,228 @@ def main():
         else:
             print(f"创建子频道失败：{name}")
 
+# ---- 批量模式: 按清单创建/更新子频道 ----
+
+# 开放平台中子频道分组的类型值, 其他子频道通过 parent_id 挂在分组下
+CHANNEL_GROUP_TYPE = 4
+# 清单中可以声明、已存在时会被同步的字段: 清单键 -> 接口字段
+SYNC_FIELDS = {"private": "private_type", "speak": "speak_permission"}
+
+
+class PlanStep:
+    """批量模式中的一个操作"""
+
+    __slots__ = ("action", "guild_id", "guild_name", "name", "payload", "channel_id", "parent")
+
+    def __init__(self, action: str, guild_id: str, guild_name: str, name: str, payload: dict,
+                 channel_id: str = None, parent: str = None):
+        self.action = action          # "create" 或 "update"
+        self.guild_id = guild_id
+        self.guild_name = guild_name
+        self.name = name
+        self.payload = payload
+        self.channel_id = channel_id  # update 时为已有子频道ID
+        self.parent = parent          # 父分组在本次计划中才创建时, 为分组名称
+
+    def describe(self) -> str:
+        if self.action == "create":
+            parent = f", 分组: {self.parent}(待创建)" if self.parent else ""
+            return f"[创建] {self.guild_name} / {self.name} (类型 {self.payload['type']}{parent})"
+        changes = ", ".join(f"{k}={v}" for k, v in self.payload.items())
+        return f"[更新] {self.guild_name} / {self.name} (子频道ID: {self.channel_id}, {changes})"
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """读取 YAML/JSON 清单, 返回 [{"guild_id"/"name": ..., "channels": [...]}]
+
+    也接受 createconfig.yaml 的单服务器格式(顶层 guild_id + channels)。
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        manifest = read(path)
+    if not isinstance(manifest, dict):
+        raise ValueError("清单格式错误: 顶层应为对象")
+    guilds = manifest.get("guilds")
+    if guilds is None:
+        if not manifest.get("guild_id"):
+            raise ValueError("清单缺少 guilds 列表")
+        guilds = [{"guild_id": manifest["guild_id"], "channels": manifest.get("channels", [])}]
+    if not isinstance(guilds, list):
+        raise ValueError("guilds 应为列表")
+
+    for i, guild in enumerate(guilds, 1):
+        if not isinstance(guild, dict) or not (guild.get("guild_id") or guild.get("name")):
+            raise ValueError(f"第 {i} 个服务器缺少 guild_id 或 name")
+        channels = guild.get("channels") or []
+        seen = set()
+        for channel in channels:
+            if not isinstance(channel, dict) or not channel.get("name"):
+                raise ValueError(f"服务器 {guild.get('guild_id') or guild.get('name')} 中有未命名的子频道")
+            key = (channel["name"], int(channel.get("type", 0)))
+            if key in seen:
+                raise ValueError(f"子频道重复声明: {channel['name']}")
+            seen.add(key)
+        guild["channels"] = channels
+    return guilds
+
+
+def _resolve_guilds(manifest: List[Dict[str, Any]], guilds: List[Dict[str, Any]]) -> List[tuple]:
+    """把清单中的服务器对应到机器人已加入的服务器, 返回 [(服务器信息, 清单项)]"""
+    by_id = {g["id"]: g for g in guilds}
+    by_name = {}
+    for guild in guilds:
+        by_name.setdefault(guild.get("name"), []).append(guild)
+    resolved = []
+    for entry in manifest:
+        if entry.get("guild_id"):
+            guild = by_id.get(str(entry["guild_id"]))
+            if guild is None:
+                raise ValueError(f"机器人未加入服务器 {entry['guild_id']}")
+        else:
+            matches = by_name.get(entry["name"], [])
+            if len(matches) != 1:
+                raise ValueError(f"按名称找到 {len(matches)} 个服务器 \"{entry['name']}\", 请改用 guild_id")
+            guild = matches[0]
+        resolved.append((guild, entry))
+    return resolved
+
+
+def plan_guild(guild: Dict[str, Any], entry: Dict[str, Any], existing: List[Dict[str, Any]]) -> List[PlanStep]:
+    """对比一个服务器的清单和现有子频道, 只生成缺失的创建和不一致的更新"""
+    guild_id, guild_name = guild["id"], guild.get("name", guild["id"])
+    current = {(c.get("name"), int(c.get("type", 0))): c for c in existing}
+    groups = {c.get("name"): c["id"] for c in existing if int(c.get("type", 0)) == CHANNEL_GROUP_TYPE}
+    planned_groups = {c["name"] for c in entry["channels"]
+                      if int(c.get("type", 0)) == CHANNEL_GROUP_TYPE and c["name"] not in groups}
+    steps = []
+    for channel in entry["channels"]:
+        name, channel_type = channel["name"], int(channel.get("type", 0))
+        parent_name = channel.get("parent")
+        parent_id = str(channel["parent_id"]) if "parent_id" in channel else None
+        pending_parent = None
+        if parent_name:
+            if parent_name in groups:
+                parent_id = groups[parent_name]
+            elif parent_name in planned_groups:
+                pending_parent = parent_name
+            else:
+                raise ValueError(f"{guild_name} / {name}: 找不到分组 {parent_name}")
+
+        found = current.get((name, channel_type))
+        if found is None:
+            payload = {"name": name, "type": channel_type, "parent_id": parent_id or "0",
+                       "private_type": int(channel.get("private", 0)),
+                       "speak_permission": int(channel.get("speak", 0))}
+            if "position" in channel:
+                payload["position"] = int(channel["position"])
+            steps.append(PlanStep("create", guild_id, guild_name, name, payload, parent=pending_parent))
+            continue
+
+        changes = {}
+        for key, field in SYNC_FIELDS.items():
+            if key in channel and int(channel[key]) != int(found.get(field, 0)):
+                changes[field] = int(channel[key])
+        if parent_id is not None and parent_id != str(found.get("parent_id") or "0"):
+            changes["parent_id"] = parent_id
+        if "position" in channel and int(channel["position"]) != int(found.get("position", 0)):
+            changes["position"] = int(channel["position"])
+        if pending_parent is not None:
+            # 已有子频道要移到本次才创建的分组下, 需要在分组创建后再更新
+            steps.append(PlanStep("update", guild_id, guild_name, name, changes, found["id"], pending_parent))
+        elif changes:
+            steps.append(PlanStep("update", guild_id, guild_name, name, changes, found["id"]))
+    return steps
+
+
+async def build_plan(client: OpenAPIClient, manifest: List[Dict[str, Any]]) -> List[PlanStep]:
+    """一次列出服务器和相关子频道(并发), 生成完整计划"""
+    resolved = _resolve_guilds(manifest, await client.list_guilds())
+    listings = await asyncio.gather(*(client.list_channels(guild["id"]) for guild, _ in resolved))
+    steps = []
+    for (guild, entry), existing in zip(resolved, listings):
+        steps.extend(plan_guild(guild, entry, existing))
+    return steps
+
+
+async def apply_plan(client: OpenAPIClient, steps: List[PlanStep]) -> int:
+    """执行计划, 返回失败的操作数
+
+    先并发创建分组和执行不依赖新分组的操作, 再处理挂在新分组下的子频道。
+    并发数和 429 退避由 OpenAPIClient 控制。
+    """
+    created_groups = {}
+    failed = 0
+
+    async def run_step(step: PlanStep):
+        payload = dict(step.payload)
+        if step.parent is not None:
+            payload["parent_id"] = created_groups[(step.guild_id, step.parent)]
+        if step.action == "create":
+            result = await client.create_channel(step.guild_id, payload)
+            if payload["type"] == CHANNEL_GROUP_TYPE:
+                created_groups[(step.guild_id, step.name)] = result["id"]
+            return result
+        return await client.update_channel(step.channel_id, payload)
+
+    first = [s for s in steps if s.parent is None]
+    second = [s for s in steps if s.parent is not None]
+    for batch in (first, second):
+        if batch is second:
+            # 所依赖的分组创建失败时跳过
+            ready = [s for s in batch if (s.guild_id, s.parent) in created_groups]
+            for step in batch:
+                if step not in ready:
+                    failed += 1
+                    print(f"跳过(分组未创建): {step.describe()}")
+            batch = ready
+        results = await asyncio.gather(*(run_step(s) for s in batch), return_exceptions=True)
+        for step, result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"失败: {step.describe()} - {result}")
+                logger.error(f"批量操作失败 {step.describe()}: {result}")
+            else:
+                print(f"完成: {step.describe()}")
+    return failed
+
+
+def print_plan(steps: List[PlanStep]):
+    if not steps:
+        print("所有子频道已与清单一致, 无需操作")
+        return
+    creates = sum(1 for s in steps if s.action == "create")
+    print(f"计划: 创建 {creates} 个, 更新 {len(steps) - creates} 个")
+    for step in steps:
+        print(f"  {step.describe()}")
+
+
+async def run_manifest(args) -> int:
+    manifest = load_manifest(args.manifest)
+    async with ChannelCreator(concurrency=args.concurrency) as creator:
+        steps = await build_plan(creator.client, manifest)
+        print_plan(steps)
+        if args.dry_run or not steps:
+            return 0
+        failed = await apply_plan(creator.client, steps)
+    print(f"\n完成 {len(steps) - failed} 个操作, 失败 {failed} 个")
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="创建子频道")
+    parser.add_argument("--manifest", help="批量模式: 按 YAML/JSON 清单创建或更新缺失的子频道, 可重复执行")
+    parser.add_argument("--dry-run", action="store_true", help="只打印计划, 不做任何修改")
+    parser.add_argument("--concurrency", type=int, default=8, help="最大并发请求数")
+    args = parser.parse_args()
+    if not args.manifest:
+        asyncio.run(run())
+        return
+    try:
+        sys.exit(asyncio.run(run_manifest(args)))
+    except ValueError as e:
+        print(f"清单错误: {e}")
+        sys.exit(2)
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
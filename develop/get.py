@@ -3,20 +3,33 @@
 
 import os
 import sys
-import json
-import requests
-from typing import Dict, List, Optional, Any, Tuple
+import asyncio
+import argparse
 import traceback
 import logging as py_logging
 from botpy.ext.cog_yaml import read
 from botpy import logging
 
+from openapi_client import OpenAPIClient, SANDBOX_API_BASE
+
 # 配置日志以显示更多信息
 py_logging.basicConfig(level=py_logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.get_logger()
 
+CHANNEL_TYPES = {
+    0: "文字频道",
+    1: "语音频道",
+    2: "直播频道",
+    3: "应用频道",
+    4: "论坛频道",
+    5: "帖子频道"
+}
+
 class ChannelGetter:
-    def __init__(self, appid: str = None, secret: str = None):
+    """查询机器人加入的频道, 请求经由共享的异步客户端(连接复用、并发、重试)"""
+
+    def __init__(self, appid: str = None, secret: str = None, base_url: str = SANDBOX_API_BASE,
+                 concurrency: int = 8):
         if not appid or not secret:
             config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config.yaml")
             print(f"正在尝试读取配置文件: {config_path}")
@@ -31,119 +44,80 @@ class ChannelGetter:
         else:
             self.appid = appid
             self.secret = secret
-        # 使用沙箱环境API地址
-        self.base_url = "https://sandbox.api.sgroup.qq.com"
-        self.access_token = self.get_access_token()
+        # 默认使用沙箱环境API地址
+        self.base_url = base_url
+        self.client = OpenAPIClient(self.appid, self.secret, base_url=base_url, concurrency=concurrency)
         print(f"使用API地址: {self.base_url}")
 
-    def get_access_token(self) -> str:
-        url = "https://bots.qq.com/app/getAppAccessToken"
-        data = {
-            "appId": self.appid,
-            "clientSecret": self.secret
-        }
-        headers = {"Content-Type": "application/json"}
-        print(f"正在请求access_token，URL: {url}")
-        try:
-            resp = requests.post(url, json=data, headers=headers)
-            print(f"access_token请求状态码: {resp.status_code}")
-            print(f"请求数据: {data}")
-            resp.raise_for_status()
-            result = resp.json()
-            print(f"access_token响应: {result}")
-            if "access_token" in result:
-                print("成功获取access_token")
-                return result["access_token"]
-            else:
-                raise Exception(f"获取access_token失败: {result}")
-        except Exception as e:
-            print(f"获取access_token异常: {str(e)}")
-            logger.error(f"获取access_token异常: {str(e)}")
-            logger.error(traceback.format_exc())
-            raise
+    async def __aenter__(self):
+        await self.client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.close()
 
-    def get_guild_list(self) -> list:
+    async def get_guild_list(self) -> list:
         """获取机器人加入的频道列表"""
-        url = f"{self.base_url}/users/@me/guilds"
-        headers = {
-            "Authorization": f"QQBot {self.access_token}"
-        }
-        print(f"正在请求服务器列表，URL: {url}")
+        print(f"正在请求服务器列表，URL: {self.base_url}/users/@me/guilds")
         try:
-            response = requests.get(url, headers=headers)
-            print(f"服务器列表请求状态码: {response.status_code}")
-            print(f"请求头: {headers}")
-            print(f"服务器列表原始响应: {response.text}")
-            response.raise_for_status()
-            result = response.json()
-            if isinstance(result, list):
-                print(f"获取到 {len(result)} 个服务器")
-                return result
-            else:
-                print(f"获取服务器列表失败，响应格式不正确: {result}")
-                logger.error(f"获取服务器列表失败: {result}")
-                return []
+            result = await self.client.list_guilds()
+            print(f"获取到 {len(result)} 个服务器")
+            return result
         except Exception as e:
             print(f"获取服务器列表异常: {str(e)}")
             logger.error(f"获取服务器列表异常: {str(e)}")
             logger.error(traceback.format_exc())
             return []
 
-    def get_channel_list(self, guild_id: str) -> list:
+    async def get_channel_list(self, guild_id: str) -> list:
         """获取频道下的子频道列表"""
-        url = f"{self.base_url}/guilds/{guild_id}/channels"
-        headers = {
-            "Authorization": f"QQBot {self.access_token}"
-        }
-        print(f"正在请求频道列表，URL: {url}, 服务器ID: {guild_id}")
+        print(f"正在请求频道列表，服务器ID: {guild_id}")
         try:
-            response = requests.get(url, headers=headers)
-            print(f"频道列表请求状态码: {response.status_code}")
-            print(f"请求头: {headers}")
-            response.raise_for_status()
-            result = response.json()
-            print(f"频道列表响应: {result}")
-            if isinstance(result, list):
-                print(f"获取到 {len(result)} 个频道")
-                return result
-            else:
-                print(f"获取频道列表失败，响应格式不正确: {result}")
-                logger.error(f"获取频道列表失败: {result}")
-                return []
+            result = await self.client.list_channels(guild_id)
+            print(f"获取到 {len(result)} 个频道")
+            return result
         except Exception as e:
             print(f"获取频道列表异常: {str(e)}")
             logger.error(f"获取频道列表异常: {str(e)}")
             logger.error(traceback.format_exc())
             return []
 
-    def get_guild_info(self, guild_id: str) -> dict:
+    async def get_guild_info(self, guild_id: str) -> dict:
         """获取频道详细信息"""
-        url = f"{self.base_url}/guilds/{guild_id}"
-        headers = {
-            "Authorization": f"QQBot {self.access_token}"
-        }
-        print(f"正在请求频道信息，URL: {url}")
+        print(f"正在请求频道信息，服务器ID: {guild_id}")
         try:
-            response = requests.get(url, headers=headers)
-            print(f"频道信息请求状态码: {response.status_code}")
-            print(f"请求头: {headers}")
-            response.raise_for_status()
-            result = response.json()
-            print(f"频道信息响应: {result}")
-            return result
+            return await self.client.get_guild(guild_id) or {}
         except Exception as e:
             print(f"获取频道信息异常: {str(e)}")
             logger.error(f"获取频道信息异常: {str(e)}")
             logger.error(traceback.format_exc())
             return {}
 
-def main():
-    try:
-        # 创建获取器实例
-        getter = ChannelGetter()
-        
+    async def get_inventory(self) -> list:
+        """并发获取所有服务器及其子频道"""
+        return await self.client.inventory()
+
+def print_inventory(inventory: list):
+    """打印全部服务器和子频道"""
+    for item in inventory:
+        guild = item["guild"]
+        print(f"{guild.get('name')} (主频道ID: {guild.get('id')})")
+        if item["channels"] is None:
+            print("   └─ 获取子频道失败")
+            continue
+        for channel in item["channels"]:
+            channel_type = CHANNEL_TYPES.get(channel.get('type', 0), "未知类型")
+            print(f"   └─ {channel['name']} (子频道ID: {channel['id']}, 类型: {channel_type})")
+
+async def run(args):
+    async with ChannelGetter(concurrency=args.concurrency) as getter:
+        if args.all:
+            # 一次列出所有服务器及子频道
+            print_inventory(await getter.get_inventory())
+            return
+
         # 获取频道列表
-        guilds = getter.get_guild_list()
+        guilds = await getter.get_guild_list()
         if not guilds:
             print("未找到任何频道")
             sys.exit(1)
@@ -170,7 +144,7 @@ def main():
                 print("请输入有效的数字")
                 
         # 获取频道详细信息
-        guild_info = getter.get_guild_info(selected_guild["id"])
+        guild_info = await getter.get_guild_info(selected_guild["id"])
         if guild_info:
             print(f"\n频道详细信息:")
             print("=" * 50)
@@ -185,24 +159,25 @@ def main():
             print("=" * 50)
             
         # 获取子频道列表
-        channels = getter.get_channel_list(selected_guild["id"])
+        channels = await getter.get_channel_list(selected_guild["id"])
         if channels:
             print(f"\n{selected_guild['name']} 的子频道:")
             print("=" * 50)
             print("注意：子频道ID用于其他功能，发帖请使用主频道ID")
             print("=" * 50)
             for i, channel in enumerate(channels, 1):
-                channel_type = {
-                    0: "文字频道",
-                    1: "语音频道",
-                    2: "直播频道",
-                    3: "应用频道",
-                    4: "论坛频道",
-                    5: "帖子频道"
-                }.get(channel.get('type', 0), "未知类型")
+                channel_type = CHANNEL_TYPES.get(channel.get('type', 0), "未知类型")
                 print(f"{i}. {channel['name']}")
                 print(f"   └─ 子频道ID: {channel['id']} (类型: {channel_type})")
-            
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询机器人加入的频道和子频道")
+    parser.add_argument("--all", action="store_true", help="不交互, 并发列出所有服务器及其子频道")
+    parser.add_argument("--concurrency", type=int, default=8, help="最大并发请求数")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
     except Exception as e:
         print(f"程序执行出错: {str(e)}")
         logger.error(f"程序执行出错: {str(e)}")
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""botpy.log 日志检索工具
+
+按 botpy 日志格式(时间戳、级别、(文件:行号)函数、消息)流式解析 botpy.log 及其轮转文件,
+为每个文件在磁盘上维护一份紧凑的二进制索引, 查询时只按索引跳读需要的记录, 不整体载入文件。
+轮转日志(botpy.log.YYYY-MM-DD)超过保留天数后会被压缩为 .gz, 索引和查询对压缩文件透明。
+
+用法示例:
+    python develop/logquery.py index
+    python develop/logquery.py query --level ERROR --since "2025-05-31 00:00" --until "2025-06-01"
+    python develop/logquery.py smtp
+"""
+
+import os
+import re
+import sys
+import gzip
+import zlib
+import shutil
+import struct
+import argparse
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+# 日志目录默认为项目根目录(botpy 在工作目录下写 botpy.log)
+DEFAULT_LOG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_DIR_NAME = ".logindex"
+LOG_BASENAME = "botpy.log"
+
+# 2025-05-31 02:47:00,010	[INFO]	(reminder.py:178)admin_send_email	正在连接SMTP服务器: smtp.qq.com:465
+LINE_RE = re.compile(
+    rb"^(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2}),(\d{3})\t\[([A-Z]+)\]\t\(([^:()]+):(\d+)\)(\S*)\t?(.*)$"
+)
+ROTATED_RE = re.compile(r"^botpy\.log\.(\d{4}-\d{2}-\d{2})(\.gz)?$")
+
+LEVELS = {"DEBUG": 1, "INFO": 2, "WARNING": 3, "ERROR": 4, "CRITICAL": 5}
+LEVEL_NAMES = {code: name for name, code in LEVELS.items()}
+# 级别不低于 WARNING 的记录逐条入索引, 其余只按检查点稀疏索引
+INDEXED_LEVEL = LEVELS["WARNING"]
+# 邮件相关记录的标记位, 用于不扫全文统计 SMTP 耗时
+FLAG_SMTP = 0x40
+KIND_CHECKPOINT = 0
+CHECKPOINT_EVERY = 256
+
+SMTP_START = "正在连接SMTP服务器".encode("utf-8")
+SMTP_OK = "邮件发送成功".encode("utf-8")
+SMTP_FAIL = ("SMTP认证失败".encode("utf-8"), "SMTP错误".encode("utf-8"), "发送邮件失败".encode("utf-8"))
+
+# 索引文件格式: 头部 + 定长条目
+#   头部: 魔数, 版本, 已索引的(解压后)字节数, 续扫起点, 文件指纹
+#   条目: 时间戳(毫秒), 记录起始偏移, 类型(0 检查点 / 级别代码 | 标记位)
+INDEX_MAGIC = b"BLIX"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<4sBQQI")
+ENTRY = struct.Struct("<qQB")
+FINGERPRINT_BYTES = 256
+
+
+class LogRecord:
+    """一条日志记录(含续行, 如异常堆栈)"""
+
+    __slots__ = ("ts", "level", "file", "line", "func", "message", "source", "offset")
+
+    def __init__(self, ts, level, file, line, func, message, source, offset):
+        self.ts = ts
+        self.level = level
+        self.file = file
+        self.line = line
+        self.func = func
+        self.message = message
+        self.source = source
+        self.offset = offset
+
+    @property
+    def time(self) -> datetime:
+        return _from_ms(self.ts)
+
+    def format(self) -> str:
+        stamp = self.time.strftime("%Y-%m-%d %H:%M:%S") + f",{self.ts % 1000:03d}"
+        return f"{stamp}\t[{self.level}]\t({self.file}:{self.line}){self.func}\t{self.message}"
+
+
+def _to_ms(dt: datetime) -> int:
+    """把日志中的本地时间按"无时区"换算成毫秒, 只用于排序和区间比较"""
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _match_ts(match) -> int:
+    """直接由正则分组计算时间戳, 比 strptime 快得多"""
+    y, mo, d, h, mi, s, ms = (int(match.group(i)) for i in range(1, 8))
+    return _to_ms(datetime(y, mo, d, h, mi, s)) + ms
+
+
+def parse_time(value: str) -> int:
+    """解析命令行时间参数, 支持日期或日期+时间"""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return _to_ms(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"时间格式错误: {value}, 请使用 YYYY-MM-DD[ HH:MM[:SS]]")
+
+
+def parse_until(value: str) -> int:
+    """结束时间只给日期时包含当天全天"""
+    ms = parse_time(value)
+    if len(value.strip()) == 10:
+        ms += 86400000 - 1
+    return ms
+
+
+def open_log(path: str):
+    """以二进制方式打开日志, .gz 文件透明解压"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def logical_name(path: str) -> str:
+    """压缩前后共用同一个索引: botpy.log.2025-05-29.gz -> botpy.log.2025-05-29"""
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith(".gz") else name
+
+
+def discover_logs(log_dir: str) -> list:
+    """按时间顺序列出日志文件: 轮转文件按日期排序, 当前 botpy.log 放最后"""
+    rotated = []
+    for name in os.listdir(log_dir):
+        match = ROTATED_RE.match(name)
+        if match:
+            rotated.append((match.group(1), os.path.join(log_dir, name)))
+    rotated.sort()
+    paths = [path for _, path in rotated]
+    current = os.path.join(log_dir, LOG_BASENAME)
+    if os.path.exists(current):
+        paths.append(current)
+    return paths
+
+
+def iter_records(handle, source: str, offset: int = 0):
+    """从给定偏移开始流式产出记录, 不以时间戳开头的行并入上一条记录"""
+    handle.seek(offset)
+    pending = None
+    position = offset
+    for raw in handle:
+        start = position
+        position += len(raw)
+        line = raw.rstrip(b"\r\n")
+        match = LINE_RE.match(line)
+        if match:
+            if pending is not None:
+                yield pending
+            pending = [match, [match.group(12)], start]
+        elif pending is not None:
+            pending[1].append(line)
+    if pending is not None:
+        yield pending
+
+
+def build_record(pending, source: str) -> LogRecord:
+    match, lines, offset = pending
+    message = b"\n".join(lines).decode("utf-8", errors="replace")
+    return LogRecord(
+        ts=_match_ts(match),
+        level=match.group(8).decode("ascii"),
+        file=match.group(9).decode("utf-8", errors="replace"),
+        line=int(match.group(10)),
+        func=match.group(11).decode("utf-8", errors="replace"),
+        message=message,
+        source=source,
+        offset=offset,
+    )
+
+
+def _fingerprint(handle) -> int:
+    handle.seek(0)
+    return zlib.crc32(handle.read(FINGERPRINT_BYTES))
+
+
+def _entry_kind(match) -> int:
+    level = LEVELS.get(match.group(8).decode("ascii"), 0)
+    message = match.group(12)
+    flag = FLAG_SMTP if (message.startswith(SMTP_START) or message.startswith(SMTP_OK)
+                         or message.startswith(SMTP_FAIL)) else 0
+    if level >= INDEXED_LEVEL or flag:
+        return level | flag
+    return KIND_CHECKPOINT
+
+
+class LogIndex:
+    """单个日志文件的磁盘索引
+
+    - 每 CHECKPOINT_EVERY 条记录一个时间检查点, 时间区间查询先二分定位再顺序读
+    - WARNING 及以上的记录和邮件相关记录逐条入索引, 按级别查询时只跳读这些记录
+    - 当前 botpy.log 只增量扫描新增部分; 文件被轮转替换时(指纹变化)重建
+    """
+
+    def __init__(self, log_path: str, index_dir: str):
+        self.log_path = log_path
+        self.index_path = os.path.join(index_dir, logical_name(log_path) + ".idx")
+        self.indexed_size = 0
+        self.resume_offset = 0
+        self.fingerprint = 0
+        self.times = []
+        self.offsets = []
+        self.kinds = []
+
+    def load(self) -> bool:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < HEADER.size:
+            return False
+        magic, version, size, resume, fingerprint = HEADER.unpack_from(data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return False
+        self.indexed_size, self.resume_offset, self.fingerprint = size, resume, fingerprint
+        self.times, self.offsets, self.kinds = [], [], []
+        for ts, offset, kind in ENTRY.iter_unpack(data[HEADER.size:]):
+            self.times.append(ts)
+            self.offsets.append(offset)
+            self.kinds.append(kind)
+        return True
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.indexed_size,
+                                self.resume_offset, self.fingerprint))
+            f.write(b"".join(ENTRY.pack(t, o, k) for t, o, k in zip(self.times, self.offsets, self.kinds)))
+        os.replace(tmp_path, self.index_path)
+
+    def refresh(self) -> bool:
+        """确保索引覆盖整个文件, 返回是否有更新"""
+        loaded = self.load()
+        with open_log(self.log_path) as handle:
+            fingerprint = _fingerprint(handle)
+            if self.log_path.endswith(".gz"):
+                # 压缩文件不会再增长, 已有索引(解压后偏移)直接可用
+                if loaded and fingerprint == self.fingerprint:
+                    return False
+                size = None
+            else:
+                size = os.path.getsize(self.log_path)
+                if loaded and fingerprint == self.fingerprint and size == self.indexed_size:
+                    return False
+            if not loaded or fingerprint != self.fingerprint or (size is not None and size < self.indexed_size):
+                self.times, self.offsets, self.kinds = [], [], []
+                self.resume_offset = 0
+            self.fingerprint = fingerprint
+            self._scan(handle)
+        self.save()
+        return True
+
+    def _scan(self, handle):
+        # 续扫起点是上一次最后一条记录的开头(它可能还有续行未写完), 先丢掉它之后的条目
+        start = self.resume_offset
+        keep = bisect_left(self.offsets, start)
+        del self.times[keep:], self.offsets[keep:], self.kinds[keep:]
+        handle.seek(start)
+        position = start
+        count = 0
+        last_start = start
+        for raw in handle:
+            line_start = position
+            position += len(raw)
+            match = LINE_RE.match(raw.rstrip(b"\r\n"))
+            if not match:
+                continue
+            last_start = line_start
+            kind = _entry_kind(match)
+            if kind != KIND_CHECKPOINT or count % CHECKPOINT_EVERY == 0:
+                self.times.append(_match_ts(match))
+                self.offsets.append(line_start)
+                self.kinds.append(kind)
+            count += 1
+        self.indexed_size = position
+        self.resume_offset = last_start
+
+    def seek_offset(self, since_ms) -> int:
+        """找到不晚于 since 的最近一个索引点"""
+        if since_ms is None or not self.times:
+            return 0
+        pos = bisect_left(self.times, since_ms)
+        return self.offsets[pos - 1] if pos > 0 else 0
+
+    def entries(self, since_ms=None, until_ms=None):
+        lo = 0 if since_ms is None else bisect_left(self.times, since_ms)
+        hi = len(self.times) if until_ms is None else bisect_right(self.times, until_ms)
+        for i in range(lo, hi):
+            yield self.times[i], self.offsets[i], self.kinds[i]
+
+
+class LogStore:
+    """日志目录: 负责发现、压缩轮转文件以及维护各文件索引"""
+
+    def __init__(self, log_dir: str = DEFAULT_LOG_DIR):
+        self.log_dir = log_dir
+        self.index_dir = os.path.join(log_dir, INDEX_DIR_NAME)
+
+    def indexes(self, refresh: bool = True) -> list:
+        result = []
+        for path in discover_logs(self.log_dir):
+            index = LogIndex(path, self.index_dir)
+            if refresh:
+                index.refresh()
+            else:
+                index.load()
+            result.append(index)
+        return result
+
+    def compress_rotated(self, keep_days: int, today=None) -> list:
+        """把超过 keep_days 天的轮转日志压缩为 .gz, 返回被压缩的文件"""
+        today = today or datetime.now().date()
+        compressed = []
+        for name in os.listdir(self.log_dir):
+            match = ROTATED_RE.match(name)
+            if not match or match.group(2):
+                continue
+            day = datetime.strptime(match.group(1), "%Y-%m-%d").date()
+            if (today - day).days < keep_days:
+                continue
+            src = os.path.join(self.log_dir, name)
+            dst = src + ".gz"
+            tmp = dst + ".tmp"
+            with open(src, "rb") as f_in, gzip.open(tmp, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+            os.remove(src)
+            compressed.append(dst)
+        return compressed
+
+    def query(self, since_ms=None, until_ms=None, level=None, min_level=None, grep=None):
+        """按时间窗口/级别/关键字流式产出记录"""
+        level_code = LEVELS.get(level) if level else None
+        min_code = LEVELS.get(min_level) if min_level else None
+        floor = level_code or min_code
+        needle = grep.encode("utf-8") if grep else None
+        for index in self.indexes():
+            if index.times and until_ms is not None and index.times[0] > until_ms:
+                continue
+            with open_log(index.log_path) as handle:
+                if floor is not None and floor >= INDEXED_LEVEL:
+                    # 只跳读索引中的高级别记录
+                    for ts, offset, kind in index.entries(since_ms, until_ms):
+                        code = kind & ~FLAG_SMTP
+                        if code == KIND_CHECKPOINT or code < floor or (level_code and code != level_code):
+                            continue
+                        for pending in iter_records(handle, index.log_path, offset):
+                            if needle is None or any(needle in part for part in pending[1]):
+                                yield build_record(pending, index.log_path)
+                            break
+                    continue
+                start = index.seek_offset(since_ms)
+                for pending in iter_records(handle, index.log_path, start):
+                    ts = _match_ts(pending[0])
+                    if since_ms is not None and ts < since_ms:
+                        continue
+                    if until_ms is not None and ts > until_ms:
+                        break
+                    code = LEVELS.get(pending[0].group(8).decode("ascii"), 0)
+                    if level_code and code != level_code:
+                        continue
+                    if min_code and code < min_code:
+                        continue
+                    if needle is not None and not any(needle in part for part in pending[1]):
+                        continue
+                    yield build_record(pending, index.log_path)
+
+    def smtp_durations(self, since_ms=None, until_ms=None):
+        """按天统计 SMTP 发送耗时(连接 -> 发送成功), 只读取索引标记过的邮件记录
+
+        Returns:
+            dict: {日期: {"count", "failed", "total_ms", "max_ms", "functions"}}
+        """
+        days = {}
+        for index in self.indexes():
+            pending_start = {}
+            with open_log(index.log_path) as handle:
+                for ts, offset, kind in index.entries(since_ms, until_ms):
+                    if not kind & FLAG_SMTP:
+                        continue
+                    handle.seek(offset)
+                    raw = handle.readline().rstrip(b"\r\n")
+                    match = LINE_RE.match(raw)
+                    if not match:
+                        continue
+                    func = match.group(11)
+                    message = match.group(12)
+                    if message.startswith(SMTP_START):
+                        pending_start[func] = ts
+                        continue
+                    started = pending_start.pop(func, None)
+                    if started is None:
+                        continue
+                    day = _from_ms(started).strftime("%Y-%m-%d")
+                    stats = days.setdefault(day, {"count": 0, "failed": 0, "total_ms": 0,
+                                                  "max_ms": 0, "functions": {}})
+                    name = func.decode("utf-8", errors="replace")
+                    stats["functions"][name] = stats["functions"].get(name, 0) + 1
+                    if message.startswith(SMTP_OK):
+                        duration = ts - started
+                        stats["count"] += 1
+                        stats["total_ms"] += duration
+                        stats["max_ms"] = max(stats["max_ms"], duration)
+                    else:
+                        stats["failed"] += 1
+        return days
+
+
+def _cmd_index(store: LogStore, args):
+    if args.compress_after is not None:
+        for path in store.compress_rotated(args.compress_after):
+            print(f"已压缩: {os.path.basename(path)}")
+    for index in store.indexes(refresh=False):
+        updated = index.refresh()
+        state = "已更新" if updated else "无变化"
+        print(f"{logical_name(index.log_path)}: {state}, 索引条目 {len(index.times)}, "
+              f"已索引 {index.indexed_size} 字节")
+
+
+def _cmd_query(store: LogStore, args):
+    count = 0
+    for record in store.query(args.since, args.until, level=args.level,
+                              min_level=args.min_level, grep=args.grep):
+        prefix = f"{logical_name(record.source)}: " if args.show_file else ""
+        print(prefix + record.format())
+        count += 1
+        if args.limit and count >= args.limit:
+            break
+    print(f"共 {count} 条记录", file=sys.stderr)
+
+
+def _cmd_smtp(store: LogStore, args):
+    days = store.smtp_durations(args.since, args.until)
+    if not days:
+        print("没有找到SMTP发送记录")
+        return
+    print(f"{'日期':<12}{'成功':>6}{'失败':>6}{'平均(ms)':>12}{'最大(ms)':>12}  函数")
+    for day in sorted(days):
+        stats = days[day]
+        avg = stats["total_ms"] / stats["count"] if stats["count"] else 0
+        funcs = ", ".join(f"{name}×{n}" for name, n in sorted(stats["functions"].items()))
+        print(f"{day:<12}{stats['count']:>6}{stats['failed']:>6}{avg:>12.0f}{stats['max_ms']:>12}  {funcs}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="botpy.log 日志索引与检索工具")
+    parser.add_argument("--dir", default=DEFAULT_LOG_DIR, help="日志目录(默认项目根目录)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_index = sub.add_parser("index", help="建立/增量更新索引, 并压缩旧的轮转日志")
+    p_index.add_argument("--compress-after", type=int, default=7, metavar="DAYS",
+                         help="压缩超过指定天数的轮转日志(默认7天)")
+    p_index.add_argument("--no-compress", dest="compress_after", action="store_const", const=None,
+                         help="不压缩轮转日志")
+
+    p_query = sub.add_parser("query", help="按时间窗口/级别/关键字查询日志")
+    p_query.add_argument("--since", type=parse_time, help="起始时间 YYYY-MM-DD[ HH:MM[:SS]]")
+    p_query.add_argument("--until", type=parse_until, help="结束时间 YYYY-MM-DD[ HH:MM[:SS]]")
+    p_query.add_argument("--level", choices=list(LEVELS), help="只看指定级别")
+    p_query.add_argument("--min-level", choices=list(LEVELS), help="只看不低于指定级别的记录")
+    p_query.add_argument("--grep", help="消息中包含的关键字")
+    p_query.add_argument("--limit", type=int, default=0, help="最多输出条数")
+    p_query.add_argument("--show-file", action="store_true", help="输出记录所在的日志文件")
+
+    p_smtp = sub.add_parser("smtp", help="按天统计SMTP发送耗时")
+    p_smtp.add_argument("--since", type=parse_time, help="起始时间")
+    p_smtp.add_argument("--until", type=parse_until, help="结束时间")
+
+    args = parser.parse_args(argv)
+
+    store = LogStore(args.dir)
+    handlers = {"index": _cmd_index, "query": _cmd_query, "smtp": _cmd_smtp}
+    handlers[args.command](store, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+开发工具共用的异步开放平台客户端
+
+get.py 和 createchannel.py 原来每个请求都用 requests 新建 TCP+TLS 连接, 服务器和子频道
+逐个串行获取。这里改为:
+    - 一个 aiohttp 会话复用连接(连接池大小 = 并发上限)
+    - 所有服务器的子频道并发获取, 用信号量限制同时进行的请求数
+    - 5xx、429 和连接错误按指数退避重试, 退避时间加随机抖动, 避免同时重试;
+      POST 不是幂等的, 只在服务端肯定没有处理时(429、连接未建立)重试, 创建子频道遇到
+      5xx 或超时时先重新获取子频道列表, 按名称确认是否已经创建
+    - access_token 由 modules/token_manager.py 管理, 与机器人共用 data/.access_token 缓存
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from botpy import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.token_manager import TokenManager, TOKEN_URL, CACHE_FILE  # noqa: E402
+
+logger = logging.get_logger()
+
+API_BASE = "https://api.sgroup.qq.com"
+SANDBOX_API_BASE = "https://sandbox.api.sgroup.qq.com"
+DEFAULT_TOKEN_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", CACHE_FILE)
+
+# 可重试的状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 非幂等请求(POST)只在这些情况下重试: 请求被限流拒绝, 服务端没有处理
+SAFE_RETRY_STATUS = {429}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "PATCH", "OPTIONS"}
+# /users/@me/guilds 每页最多返回的数量
+GUILD_PAGE_LIMIT = 100
+
+
+class OpenAPIError(Exception):
+    """接口返回错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class OpenAPIClient:
+    """异步开放平台客户端, 需要在 async with 中使用
+
+    Args:
+        appid: 机器人 appid
+        secret: 机器人 secret
+        base_url: 接口地址
+        concurrency: 同时进行的最大请求数
+        retries: 失败后的最大重试次数
+        backoff: 首次重试的基础等待时间(秒), 之后每次翻倍
+        token_url: 获取 access_token 的地址(测试时可指向本地模拟服务)
+        token_cache: access_token 缓存文件, 默认与机器人共用; None 表示不缓存
+    """
+
+    def __init__(self, appid: str, secret: str, base_url: str = API_BASE, concurrency: int = 8,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 15, token_url: str = TOKEN_URL,
+                 token_cache: Optional[str] = DEFAULT_TOKEN_CACHE):
+        self.appid = appid
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.requests = 0
+        self.tokens = TokenManager(appid, secret, cache_path=token_cache, token_url=token_url)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        self.tokens.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        self.tokens.stop()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # ---- 令牌 ----
+
+    async def access_token(self) -> str:
+        try:
+            return await self.tokens.get()
+        except RuntimeError as e:
+            raise OpenAPIError(200, str(e))
+
+    # ---- 请求 ----
+
+    def _delay(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间: 指数退避 + 全抖动"""
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    async def request(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        return await self._send(method, f"{self.base_url}{path}", payload)
+
+    async def _send(self, method: str, url: str, payload: Optional[dict]) -> Any:
+        attempt = 0
+        reauthorized = False
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        while True:
+            token = await self.access_token()
+            headers = {"Content-Type": "application/json", "Authorization": f"QQBot {token}"}
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    async with self._session.request(method, url, json=payload, headers=headers) as resp:
+                        text = await resp.text()
+                        if resp.status < 400:
+                            return json.loads(text) if text else None
+                        if resp.status == 401 and not reauthorized:
+                            # 缓存的令牌可能已被其他进程换掉, 换新后重试一次
+                            self.tokens.invalidate(token)
+                            reauthorized = True
+                            continue
+                        retryable = RETRY_STATUS if idempotent else SAFE_RETRY_STATUS
+                        if resp.status not in retryable or attempt >= self.retries:
+                            raise OpenAPIError(resp.status, text)
+                        retry_after = resp.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # 连接没有建立时请求肯定没有发出; 其他连接错误和超时时服务端可能已经处理
+                if attempt >= self.retries or not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                    raise
+                retry_after = None
+                logger.warning(f"请求失败 {method} {url}: {e!r}")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self._delay(attempt)
+            attempt += 1
+            logger.info(f"{delay:.2f} 秒后重试 {method} {url} ({attempt}/{self.retries})")
+            await asyncio.sleep(delay)
+
+    # ---- 常用接口 ----
+
+    async def list_guilds(self) -> List[Dict[str, Any]]:
+        """机器人加入的全部服务器(自动翻页)"""
+        guilds = []
+        after = None
+        while True:
+            query = f"?limit={GUILD_PAGE_LIMIT}" + (f"&after={after}" if after else "")
+            page = await self.request("GET", f"/users/@me/guilds{query}") or []
+            guilds.extend(page)
+            if len(page) < GUILD_PAGE_LIMIT:
+                return guilds
+            after = page[-1]["id"]
+
+    async def get_guild(self, guild_id: str) -> Dict[str, Any]:
+        return await self.request("GET", f"/guilds/{guild_id}")
+
+    async def list_channels(self, guild_id: str) -> List[Dict[str, Any]]:
+        return await self.request("GET", f"/guilds/{guild_id}/channels") or []
+
+    async def create_channel(self, guild_id: str, payload: dict) -> Dict[str, Any]:
+        """创建子频道; 5xx 或超时后先按名称(和分组)查找, 已经创建时直接返回, 不会重复创建"""
+        attempt = 0
+        while True:
+            try:
+                return await self.request("POST", f"/guilds/{guild_id}/channels", payload)
+            except OpenAPIError as e:
+                if e.status < 500 or attempt >= self.retries:
+                    raise
+                error = e
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                error = e
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+            created = self._find_channel(await self.list_channels(guild_id), payload)
+            if created is not None:
+                logger.warning(f"创建子频道 {payload.get('name')} 时出错({error!r}), 但子频道已经创建, 不再重试")
+                return created
+            logger.info(f"子频道 {payload.get('name')} 尚未创建, 重试 ({attempt}/{self.retries})")
+
+    @staticmethod
+    def _find_channel(channels: List[Dict[str, Any]], payload: dict) -> Optional[Dict[str, Any]]:
+        for channel in channels:
+            if channel.get("name") == payload.get("name") \
+                    and str(channel.get("parent_id") or 0) == str(payload.get("parent_id") or 0):
+                return channel
+        return None
+
+    async def update_channel(self, channel_id: str, payload: dict) -> Dict[str, Any]:
+        return await self.request("PATCH", f"/channels/{channel_id}", payload)
+
+    async def inventory(self) -> List[Dict[str, Any]]:
+        """一次性获取所有服务器及其子频道, 子频道并发获取
+
+        Returns:
+            [{"guild": 服务器信息, "channels": 子频道列表或 None(获取失败)}]
+        """
+        guilds = await self.list_guilds()
+        results = await asyncio.gather(*(self.list_channels(g["id"]) for g in guilds), return_exceptions=True)
+        inventory = []
+        for guild, channels in zip(guilds, results):
+            if isinstance(channels, Exception):
+                logger.error(f"获取服务器 {guild.get('name')} 的子频道失败: {channels}")
+                channels = None
+            inventory.append({"guild": guild, "channels": channels})
+        return inventory
@@ -1,40 +1,103 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os
+import time
+_START = time.perf_counter()
+
 import sys
+import argparse
 import traceback
-import botpy
-from botpy.ext.cog_yaml import read
 from botpy import logging as botpy_logging
 from modules.commands import SweepingBot
+from modules.settings import load_settings, build_intents
+from modules.shutdown import ShutdownCoordinator
+from modules.timing import PhaseTimer
+
+def run_tenants(path: str, timer: PhaseTimer) -> int:
+    """在同一进程中运行清单中的所有机器人, 返回退出码"""
+    from modules.tenants import load_tenants, TenantHost
+
+    with timer.phase("读取机器人清单"):
+        tenants = load_tenants(path)
+    host = TenantHost(tenants, startup_timer=timer)
+    botpy_logging.get_logger().info(f"机器人清单共 {len(tenants)} 个机器人, 开始运行...")
+    coordinator = ShutdownCoordinator(lambda: [tenant.client for tenant in tenants if tenant.client is not None])
+    return coordinator.run(host.run())
+
+
+def run_shards(settings, workers: int, intents) -> int:
+    """路由进程持有网关连接, 事件按群分给 workers 个工作进程处理, 返回退出码"""
+    from modules.sharding import ShardRouter
+
+    router = ShardRouter(intents=intents, settings=settings, workers=workers)
+    return router.serve(appid=settings.appid, secret=settings.secret)
+
+
+async def serve(client: SweepingBot, settings):
+    """与 botpy.Client.run 相同, 结束(被取消)时关闭客户端: 保存网关会话、释放主实例租约"""
+    async with client:
+        await client.start(appid=settings.appid, secret=settings.secret)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="扫地提醒机器人")
+    parser.add_argument("--tenants", metavar="PATH", help="机器人清单(tenants.yaml), 在同一进程中运行多个机器人")
+    parser.add_argument("--role", choices=("all", "gateway", "scheduler"), default="all",
+                        help="all: 单进程运行全部功能; gateway: 只处理消息; scheduler: 只运行定时提醒和邮件发送")
+    parser.add_argument("--ha", action="store_true",
+                        help="主备模式: 多个实例共用数据目录, 只有主实例运行定时任务, 主实例退出后自动接管")
+    parser.add_argument("--shards", type=int, metavar="N", help="多进程分片运行, N 为处理事件的工作进程数(仅 Linux)")
+    args = parser.parse_args()
+    if args.tenants and args.shards:
+        parser.error("--tenants 和 --shards 不能同时使用")
+    if args.role != "all" and (args.tenants or args.shards):
+        parser.error("--role 不能与 --tenants 或 --shards 同时使用")
+    if args.ha and (args.tenants or args.shards or args.role == "gateway"):
+        parser.error("--ha 只能用于单个机器人或 --role scheduler")
+
+    # 获取botpy日志
+    logger = botpy_logging.get_logger()
     try:
-        # 获取botpy日志
-        logger = botpy_logging.get_logger()
+        timer = PhaseTimer(origin=_START)
+        timer.mark("导入模块")
         logger.info("正在启动扫地机器人...")
-        
-        # 读取配置文件
-        config_path = os.path.join(os.path.dirname(__file__), "config.yaml")
-        if not os.path.exists(config_path):
-            raise FileNotFoundError(f"配置文件不存在: {config_path}")
-            
-        config = read(config_path)
-        if not config.get("appid") or not config.get("secret"):
-            raise ValueError("配置文件缺少必要的appid或secret")
-        
-        # 设置机器人需要监听的事件通道
-        # 设置intents
-        intents = botpy.Intents(public_messages=True)
-        
+
+        if args.tenants:
+            sys.exit(run_tenants(args.tenants, timer))
+
+        # 读取配置文件(只解析一次, 之后各组件共享同一份快照)
+        with timer.phase("读取配置"):
+            settings = load_settings()
+
+        # 按 config.yaml 的 intent 设置机器人需要监听的事件通道
+        intents = build_intents(settings.intents, SweepingBot.HANDLED_INTENTS)
+
+        if args.role == "scheduler":
+            from modules.scheduler import run_scheduler
+            logger.info("以独立调度进程运行, 不连接网关")
+            sys.exit(run_scheduler(settings, ha=args.ha))
+
+        if args.shards:
+            logger.info(timer.summary())
+            sys.exit(run_shards(settings, args.shards, intents))
+
         # 创建机器人实例
-        client = SweepingBot(intents=intents)
-        
+        with timer.phase("创建机器人实例"):
+            client = SweepingBot(intents=intents, settings=settings, startup_timer=timer,
+                                 run_schedulers=args.role == "all")
+            if args.role == "gateway":
+                from modules.scheduler import SchedulerQueue, RemoteScheduler
+                client.reminder.remote = RemoteScheduler(SchedulerQueue.for_data_dir(settings.data_dir))
+            if args.ha:
+                from modules.lease import Lease, LeaderElection
+                LeaderElection(Lease.for_data_dir(settings.data_dir), client.reminder)
+
         # 启动机器人
         logger.info("机器人启动成功,开始运行...")
-        client.run(appid=config["appid"], secret=config["secret"])
-        
+        logger.info(timer.summary())
+        # SIGTERM/Ctrl+C 时等待进行中的工作并保存状态, 有被放弃的工作时退出码不为 0
+        sys.exit(ShutdownCoordinator(lambda: [client]).run(serve(client, settings)))
+
     except FileNotFoundError as e:
         logger.error(f"配置文件错误: {str(e)}")
         sys.exit(1)
@@ -47,4 +110,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
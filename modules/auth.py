@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+管理员权限索引
+
+admin_ids 和按群配置的 group_admins 在加载配置时一次性解析为 frozenset / dict,
+权限判断只做哈希查找。每个 (用户, 群) 的判断结果会被缓存; 配置重新加载时整体
+替换 AdminAuthority 实例, 旧缓存随之失效。
+
+成员列表、假期和提醒配置由所有群共用, 修改它们的命令只认全局管理员;
+按群配置的角色只对该群中的只读管理员命令(例如 /export)有效。
+
+config.yaml 示例:
+    admin_ids: "openid1, openid2"   # 全局管理员(owner), 在所有群有效
+    group_admins:                   # 可选, 按群配置
+      GROUP_OPENID:
+        - openid3                   # 默认角色 admin
+        - {id: openid4, role: owner}
+"""
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+ROLE_MEMBER = "member"
+ROLE_ADMIN = "admin"
+ROLE_OWNER = "owner"
+ROLE_LEVELS = {ROLE_MEMBER: 0, ROLE_ADMIN: 1, ROLE_OWNER: 2}
+
+# 缓存条目上限, 超过后整体清空(判断本身是 O(1), 缓存只是省去重复查找)
+CACHE_LIMIT = 4096
+
+
+def parse_group_admins(value) -> tuple:
+    """把 group_admins 配置解析为 ((群, 用户, 角色), ...)
+
+    Raises:
+        ValueError: 格式错误或角色未知
+    """
+    if not value:
+        return ()
+    if not isinstance(value, dict):
+        raise ValueError("group_admins 必须是 群openid -> 管理员列表 的映射")
+    entries = []
+    for group_id, admins in value.items():
+        if isinstance(admins, (str, dict)):
+            admins = [admins]
+        if not isinstance(admins, list):
+            raise ValueError(f"group_admins 中群 {group_id} 的管理员列表格式错误")
+        for admin in admins:
+            if isinstance(admin, dict):
+                user_id, role = admin.get("id"), admin.get("role", ROLE_ADMIN)
+            else:
+                user_id, role = admin, ROLE_ADMIN
+            if not user_id:
+                raise ValueError(f"group_admins 中群 {group_id} 存在空的管理员ID")
+            if role not in ROLE_LEVELS:
+                raise ValueError(f"未知的角色: {role}")
+            entries.append((str(group_id), str(user_id), role))
+    return tuple(entries)
+
+
+class AdminAuthority:
+    """管理员权限判断
+
+    Args:
+        admin_ids: 全局管理员, 角色为 owner
+        group_admins: ((群, 用户, 角色), ...)
+    """
+
+    def __init__(self, admin_ids=(), group_admins=()):
+        self.global_admins = frozenset(admin_ids)
+        groups = {}
+        for group_id, user_id, role in group_admins:
+            groups.setdefault(group_id, {})[user_id] = ROLE_LEVELS[role]
+        self.group_admins = groups
+        # 没有配置任何管理员时保持原有行为: 所有人都可以执行管理员命令
+        self.open_access = not self.global_admins and not self.group_admins
+        self._cache = {}
+        if self.open_access:
+            _log.info("未配置管理员ID,默认允许访问管理员命令")
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.admin_ids, settings.group_admins)
+
+    def role_level(self, user_id, group_id=None) -> int:
+        """返回用户在群中的角色等级"""
+        key = (user_id, group_id)
+        level = self._cache.get(key)
+        if level is not None:
+            return level
+        if self.open_access or user_id in self.global_admins:
+            level = ROLE_LEVELS[ROLE_OWNER]
+        else:
+            level = self.group_admins.get(group_id, {}).get(user_id, ROLE_LEVELS[ROLE_MEMBER])
+        if len(self._cache) >= CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[key] = level
+        return level
+
+    def has_role(self, user_id, group_id=None, role=ROLE_ADMIN) -> bool:
+        if not user_id:
+            return self.open_access
+        return self.role_level(user_id, group_id) >= ROLE_LEVELS[role]
+
+    def check_message(self, message, role=ROLE_ADMIN, shared=True) -> bool:
+        """根据消息的发送者和所在群判断权限
+
+        shared 为 True 时命令会修改所有群共用的数据, 不考虑按群配置的角色。
+        """
+        author = getattr(message, "author", None)
+        user_id = getattr(author, "member_openid", None) or getattr(author, "user_openid", None)
+        group_id = None if shared else getattr(message, "group_openid", None)
+        return self.has_role(user_id, group_id, role)
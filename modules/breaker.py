@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+下游服务熔断器
+
+SMTP 服务器和 QQ 开放平台接口各有一个熔断器:
+    - closed(正常): 请求照常发出, 连续失败 failure_threshold 次后进入 open
+    - open(熔断): 请求直接失败(CircuitOpenError), 不再等待超时和重试;
+      后台每隔 probe_interval 秒探测一次下游是否恢复
+    - half_open(半开): 探测成功(或没有探测函数时熔断超过 probe_interval 秒)后放行一次请求,
+      成功则恢复 closed, 失败则重新 open
+熔断期间每次调用的开销只是一次状态判断。
+"""
+
+import time
+import asyncio
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+STATE_NAMES = {STATE_CLOSED: "正常", STATE_OPEN: "熔断", STATE_HALF_OPEN: "半开(等待试探请求)"}
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断期间的调用"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} 暂不可用(熔断中)")
+        self.name = name
+
+
+class CircuitBreaker:
+    """单个下游服务的熔断器
+
+    Args:
+        name: 下游名称, 用于日志和 /status
+        failure_threshold: 连续失败多少次后熔断
+        probe_interval: 熔断后探测恢复的间隔(秒)
+        probe: 可选的协程函数, 返回 True 表示下游已恢复
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, probe_interval: float = 60, probe=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = ""
+        self._trial = False
+        self._probe_task = None
+        self._closed_event = None
+
+    # ---- 调用前后 ----
+
+    def allow(self) -> bool:
+        """当前是否允许发出请求; half_open 时只放行一个试探请求"""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            if self.probe is not None or time.monotonic() - self.opened_at < self.probe_interval:
+                return False
+            self.state = STATE_HALF_OPEN
+            self._trial = False
+        if self._trial:
+            return False
+        self._trial = True
+        return True
+
+    @property
+    def is_open(self) -> bool:
+        """是否处于熔断状态(只查询, 不占用半开时的试探名额)"""
+        return self.state == STATE_OPEN
+
+    def check(self):
+        """不允许请求时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+
+    def record_success(self):
+        if self.state != STATE_CLOSED:
+            _log.info(f"{self.name} 已恢复, 熔断解除")
+            if self._closed_event is not None:
+                self._closed_event.set()
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._trial = False
+        self._stop_probe()
+
+    def record_failure(self, error=None):
+        if error is not None:
+            self.last_error = str(error)
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or (self.state == STATE_CLOSED and self.failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self):
+        if self.state != STATE_OPEN:
+            _log.warning(f"{self.name} 连续失败 {self.failures} 次, 进入熔断: {self.last_error}")
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self._trial = False
+        self._start_probe()
+
+    # ---- 后台探测 ----
+
+    def _start_probe(self):
+        if self.probe is None or (self._probe_task is not None and not self._probe_task.done()):
+            return
+        try:
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+        except RuntimeError:
+            # 没有运行中的事件循环(例如命令行工具), 退化为按时间进入半开
+            self.probe = None
+
+    def _stop_probe(self):
+        task, self._probe_task = self._probe_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _probe_loop(self):
+        while self.state == STATE_OPEN:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                ok = await self.probe()
+            except Exception as e:
+                ok = False
+                self.last_error = str(e)
+            if ok:
+                _log.info(f"{self.name} 探测成功, 放行试探请求")
+                self.state = STATE_HALF_OPEN
+                self._trial = False
+                if self._closed_event is not None:
+                    # 让等待恢复的任务发出试探请求
+                    self._closed_event.set()
+                return
+            _log.debug(f"{self.name} 仍不可用: {self.last_error}")
+
+    async def wait_available(self, timeout: float) -> bool:
+        """等待熔断解除或进入半开, 超时返回 False"""
+        if self.state != STATE_OPEN:
+            return True
+        if self.probe is None:
+            # 没有探测函数时到时间自动进入半开
+            remaining = self.probe_interval - (time.monotonic() - self.opened_at)
+            await asyncio.sleep(max(0.0, min(remaining, timeout)))
+            return remaining <= timeout
+        self._closed_event = self._closed_event or asyncio.Event()
+        self._closed_event.clear()
+        try:
+            await asyncio.wait_for(self._closed_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return self.state != STATE_OPEN
+        return True
+
+    # ---- 包装 ----
+
+    async def call(self, func, *args, **kwargs):
+        """通过熔断器调用协程函数, 抛出异常视为失败"""
+        self.check()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def describe(self) -> str:
+        text = STATE_NAMES[self.state]
+        if self.state == STATE_OPEN:
+            text += f" {int(time.monotonic() - self.opened_at)}秒, 最近错误: {self.last_error}"
+        elif self.failures:
+            text += f"(连续失败 {self.failures} 次)"
+        return text
+
+
+def guard_http(http, breaker: CircuitBreaker):
+    """让 botpy 的所有开放平台请求经过熔断器
+
+    5xx、连接错误计为失败; 4xx 说明接口本身可用, 计为成功。
+    熔断器的探测使用未包装的请求。
+    """
+    import aiohttp
+    from botpy.errors import ServerError
+    from botpy.http import Route
+
+    request = http.request
+
+    async def guarded(route, retry_time: int = 0, **kwargs):
+        breaker.check()
+        try:
+            result = await request(route, retry_time, **kwargs)
+        except (ServerError, aiohttp.ClientError, OSError) as e:
+            breaker.record_failure(e)
+            raise
+        except Exception:
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+    async def probe():
+        return await request(Route("GET", "/users/@me")) is not None
+
+    http.request = guarded
+    breaker.probe = probe
+    return breaker
@@ -2,14 +2,25 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import asyncio
 
 import botpy
 from botpy import logging as botpy_logging
+from botpy.connection import ConnectionSession
 from botpy.message import GroupMessage, C2CMessage
-from botpy.ext.cog_yaml import read
+from botpy.robot import Robot
 
+from .auth import AdminAuthority, ROLE_ADMIN, ROLE_OWNER
+from .breaker import CircuitBreaker, guard_http
+from .gateway_session import SESSION_FILE, save_session, load_session
+from .metrics import METRICS
+from .pager import build_page_keyboard
 from .reminder import Reminder
+from .settings import load_settings
+from .throttle import RecentKeys
+from .token_manager import TokenManager, ManagedToken, CACHE_FILE as TOKEN_CACHE_FILE
+from .watcher import FileWatcher
 
 from botpy.manage import GroupManageEvent
 
@@ -28,7 +39,58 @@ class ValidationError(CommandError):
     """参数验证错误"""
     pass
 
+def _command_body(content):
+    """去掉命令名, 保留后面的原始文本(包括换行)"""
+    parts = content.split(None, 1)
+    return parts[1] if len(parts) > 1 else ""
+
+def parse_member_rows(text):
+    """解析批量添加成员的文本
+
+    支持三种写法:
+        /addm 张三 123456
+        /addm 张三 123456 李四 654321
+        /addm
+        张三,123456
+        李四,654321
+    多行时每行一名成员, 以逗号、制表符或空格分隔; 空行和 # 开头的行被忽略。
+
+    Raises:
+        ValidationError: 存在无法解析的行
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line and not line.startswith("#")]
+    if len(lines) == 1:
+        # 单行时允许多名成员连写
+        tokens = [t for t in re.split(r"[\s,，]+", lines[0]) if t]
+        if not tokens or len(tokens) % 2:
+            raise ValidationError("格式错误,请使用: /addm [name] [qq]")
+        return list(zip(tokens[0::2], tokens[1::2]))
+    rows = []
+    for line_no, line in enumerate(lines, 1):
+        tokens = [t for t in re.split(r"[\t,，]+|\s+", line) if t]
+        if len(tokens) != 2:
+            raise ValidationError(f"第{line_no}行格式错误: {line}\n每行格式为: 名字,QQ号")
+        rows.append((tokens[0], tokens[1]))
+    if not rows:
+        raise ValidationError("格式错误,请使用: /addm [name] [qq]")
+    return rows
+
+def parse_holiday_dates(text):
+    """解析以空格、逗号或换行分隔的多个 MM-DD 日期"""
+    return [t for t in re.split(r"[\s,，]+", text) if t]
+
 # 定义命令处理函数
+def is_command_event(payload, prefix="/"):
+    """原始事件中的消息内容是否以命令前缀开头(不构造消息对象)"""
+    data = payload.get("d") or {}
+    return str(data.get("content") or "").lstrip().startswith(prefix)
+
+
+def ignore_event(payload):
+    """替换不需要处理的事件的解析函数"""
+
+
 async def help_command():
     """显示帮助信息"""
     return True
@@ -41,10 +103,22 @@ async def current_command():
     """显示当前值日人员"""
     return True
 
+async def who_command():
+    """查询某天的值日人员"""
+    return True
+
 async def list_command():
     """列出成员或假期"""
     return True
 
+async def history_command():
+    """查看提醒记录"""
+    return True
+
+async def stats_command():
+    """查看值日统计"""
+    return True
+
 async def add_member_command():
     """添加成员"""
     return True
@@ -53,6 +127,10 @@ async def add_holiday_command():
     """添加假期"""
     return True
 
+async def export_command():
+    """导出成员或假期"""
+    return True
+
 async def remove_command():
     """删除成员或假期"""
     return True
@@ -81,6 +159,14 @@ async def next_command():
     """获取下一个成员"""
     return True
 
+async def away_command():
+    """设置成员请假"""
+    return True
+
+async def swap_command():
+    """互换两位成员的值日"""
+    return True
+
 async def reset_command():
     """重置轮换顺序"""
     return True
@@ -89,13 +175,50 @@ async def restart_command():
     return True
 
 class SweepingBot(botpy.Client):
-    def __init__(self, intents):
+    # 有处理函数的事件通道(群聊 @ 消息、私聊、进群/退群都属于 public_messages)
+    HANDLED_INTENTS = ("public_messages",)
+
+    def __init__(self, intents, settings=None, startup_timer=None, tenant="default", http_session=None,
+                 watcher=None, run_schedulers=True):
+        """
+        Args:
+            tenant: 机器人名称, 同一进程托管多个机器人时用于区分计数和日志
+            http_session: 可选, 与其他机器人共用的 aiohttp 会话(连接池)
+            watcher: 可选, 与其他机器人共用的配置文件监视器(已启动)
+            run_schedulers: 是否运行定时提醒和索引更新(分片模式下只有一个进程运行)
+        """
         super().__init__(intents=intents)
+        self.tenant = tenant
+        METRICS.register(tenant)
+        self._shared_session = http_session is not None
+        if http_session is not None:
+            # botpy 只在没有会话时才创建, 预先放入共用的会话
+            self.http._session = http_session
+        # 开放平台接口故障时快速失败, 不再逐个等待超时
+        self.api_breaker = guard_http(self.http, CircuitBreaker("开放平台接口"))
+        # main() 已解析过配置时直接复用同一份快照
+        self.settings = settings if settings is not None else load_settings()
+        self.startup_timer = startup_timer
         self.reminder = Reminder(self)
-        self.config = read(os.path.join(os.path.dirname(__file__), "..", "config.yaml"))
+        self.reminder.run_schedulers = run_schedulers
         self.command_prefix = "/"  # 使用标准的斜杠作为前缀
-        self.admin_ids = self.config.get("admin_ids", [])
+        self.authority = AdminAuthority.from_settings(self.settings)
         self.silent_mode = False
+        # 最近已收到过命令提示的私聊用户
+        self.hint_throttle = RecentKeys()
+        self.watcher = watcher
+        self._watching = False
+        self.token_manager = None
+        # 网关会话恢复: 本次登录的机器人信息、各分片的会话和启动时读取的保存记录
+        self._login_user = None
+        self._gateway_sessions = {}
+        self._resume = None
+        # 退出流程: 是否接受新事件、正在处理的事件任务、停止接受时各分片的 seq
+        self.accepting = True
+        self.inflight = set()
+        self._stopped_seq = {}
+        # 可选, 替代 loop.create_task 调度事件任务(分片工作进程用它按群排序)
+        self.event_runner = None
         
         # 初始化命令处理器和帮助信息
         self.command_handlers = {}
@@ -111,11 +234,15 @@ class SweepingBot(botpy.Client):
         self._add_command("help", help_command, ["帮助"], "显示帮助信息")
         self._add_command("status", status_command, ["状态"], "查看机器人当前状态")
         self._add_command("current", current_command, ["当前"], "显示当前值日人员")
+        self._add_command("who", who_command, ["值日"], "查询某天的值日人员")
         self._add_command("list", list_command, [], "列出成员或假期")
+        self._add_command("history", history_command, ["记录"], "查看最近的提醒记录")
+        self._add_command("stats", stats_command, ["统计"], "查看每个成员的值日统计")
         
         # 管理员命令
         self._add_command("addm", add_member_command, [], "添加成员", admin=True)
         self._add_command("addh", add_holiday_command, [], "添加假期", admin=True)
+        self._add_command("export", export_command, [], "导出成员或假期", admin=True)
         self._add_command("rm", remove_command, [], "删除成员或假期", admin=True)
         self._add_command("set", set_command, [], "设置配置", admin=True)
         self._add_command("on", enable_command, [], "启用提醒功能", admin=True)
@@ -124,6 +251,8 @@ class SweepingBot(botpy.Client):
         self._add_command("send", send_command, [], "手动触发提醒", admin=True)
         self._add_command("next", next_command, [], "获取下一个成员", admin=True)
         self._add_command("reset", reset_command, [], "重置轮换顺序", admin=True)
+        self._add_command("away", away_command, ["请假"], "设置成员请假", admin=True)
+        self._add_command("swap", swap_command, ["互换"], "互换两位成员的值日", admin=True)
         self._add_command("restart", restart_command, [], "重启所有定时任务", admin=True)
 
     def _add_command(self, name, handler, aliases=None, help_text="", admin=False):
@@ -140,13 +269,182 @@ class SweepingBot(botpy.Client):
             for alias in aliases:
                 self.command_aliases[alias] = name
 
+    async def start(self, appid: str, secret: str, ret_coro: bool = False):
+        """与 botpy.Client.start 相同, 但令牌交给 TokenManager 管理(缓存到磁盘并提前刷新)"""
+        if self.token_manager is not None:
+            # 重新连接时停止上一次的后台刷新
+            self.token_manager.stop()
+        self.token_manager = TokenManager(
+            appid, secret, cache_path=os.path.join(self.settings.data_dir, TOKEN_CACHE_FILE))
+        token = ManagedToken(self.token_manager)
+        self.ret_coro = ret_coro
+        self._resume = load_session(self._session_path, appid, self.intents)
+
+        if self.loop is botpy.client._loop:
+            await self._async_setup_hook()
+
+        await self._bot_login(token)
+        self._install_event_filter()
+        self.token_manager.start()
+        return await self._bot_init(token)
+
+    @property
+    def _session_path(self):
+        return os.path.join(self.settings.data_dir, SESSION_FILE)
+
+    async def _bot_login(self, token):
+        """与 botpy 相同; 有可恢复的网关会话时跳过 /users/@me 和 /gateway/bot 请求"""
+        if self._resume is None:
+            user = await self.http.login(token)
+            self._ws_ap = await self.api.get_ws_url()
+        else:
+            # 与 BotHttp.login 相同, 只是不请求 /users/@me
+            self.http._token = token
+            await self.http.check_session()
+            self.http._global_over = asyncio.Event()
+            self.http._global_over.set()
+            user, self._ws_ap = self._resume["user"], self._resume["ws_ap"]
+            _log.info("使用保存的网关会话, 跳过登录请求")
+        self._login_user = user
+        self._connection = ConnectionSession(
+            max_async=self._ws_ap["session_start_limit"]["max_concurrency"],
+            connect=self.bot_connect,
+            dispatch=self.ws_dispatch,
+            loop=self.loop,
+            api=self.api,
+        )
+        self._connection.state.robot = Robot(user)
+
+    async def bot_connect(self, session):
+        """记录各分片的会话; 首次连接时填入保存的 session_id/last_seq, botpy 会改用 resume"""
+        shard_id = session["shards"]["shard_id"]
+        self._gateway_sessions[shard_id] = session
+        saved = self._resume["shards"].pop(shard_id, None) if self._resume is not None else None
+        if saved is not None and not session["session_id"]:
+            session["session_id"] = saved["session_id"]
+            session["last_seq"] = saved["last_seq"]
+            _log.info(f"尝试恢复网关会话(分片 {shard_id}, seq {saved['last_seq']})")
+        await super().bot_connect(session)
+
+    def _install_event_filter(self):
+        """在 botpy 构造事件对象之前丢弃不会处理的事件
+
+        没有 on_xxx 处理函数的事件, 群聊中不以命令前缀开头的 @ 消息(原本也只是写一行日志),
+        以及 HINT_WINDOW 内已经提示过的用户的私聊闲聊, 只检查原始字段就直接丢弃,
+        不再构造消息对象、调度任务和写日志。
+        """
+        parsers = self._connection.parser
+        for event in list(parsers):
+            if not hasattr(self, "on_" + event):
+                parsers[event] = ignore_event
+        group_parser = parsers.get("group_at_message_create")
+        if group_parser is not None and group_parser is not ignore_event:
+            def group_filter(payload):
+                if is_command_event(payload, self.command_prefix):
+                    group_parser(payload)
+                else:
+                    METRICS.incr(self.tenant, "events_dropped")
+            parsers["group_at_message_create"] = group_filter
+        c2c_parser = parsers.get("c2c_message_create")
+        if c2c_parser is not None and c2c_parser is not ignore_event:
+            def c2c_filter(payload):
+                if not is_command_event(payload, self.command_prefix):
+                    author = (payload.get("d") or {}).get("author") or {}
+                    if self.hint_throttle.hit(str(author.get("user_openid") or "")):
+                        METRICS.incr(self.tenant, "c2c_hints_suppressed")
+                        return
+                c2c_parser(payload)
+            parsers["c2c_message_create"] = c2c_filter
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        """记录正在处理的事件, 退出时等待其完成; 停止接受后不再处理新事件"""
+        if not self.accepting:
+            METRICS.incr(self.tenant, "events_deferred")
+            return None
+        if self.event_runner is not None:
+            task = self.event_runner(self._run_event(coro, event_name, *args, **kwargs))
+        else:
+            task = super()._schedule_event(coro, event_name, *args, **kwargs)
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+        return task
+
+    def stop_accepting(self):
+        """退出时调用: 不再处理新事件
+
+        保存的网关会话使用此刻的 seq, 之后收到但未处理的事件在下次 resume 时由服务端补发。
+        """
+        if not self.accepting:
+            return
+        self.accepting = False
+        self._stopped_seq = {shard_id: session["last_seq"] for shard_id, session in self._gateway_sessions.items()}
+
+    def save_gateway_session(self):
+        """退出前保存网关会话, 下次启动时尝试 resume"""
+        sessions = [dict(session, last_seq=self._stopped_seq.get(shard_id, session["last_seq"]))
+                    for shard_id, session in self._gateway_sessions.items()]
+        save_session(self._session_path, self.settings.appid, self.intents, self._login_user,
+                     getattr(self, "_ws_ap", None), sessions)
+
+    async def on_resumed(self):
+        """恢复网关会话后触发(不会再触发 on_ready)"""
+        await self.on_ready()
+
     async def on_ready(self):
         """机器人启动时触发"""
-        #启动任务
-        #定时提醒任务
-        asyncio.create_task(self.reminder.start_reminder(self))
-        #定时更新索引任务
-        asyncio.create_task(self.reminder.start_update_index(self))
+        if self.startup_timer is not None:
+            self.startup_timer.mark("登录并连接网关")
+            _log.info(self.startup_timer.summary())
+            self.startup_timer = None
+        # 网关重新鉴权时也会触发 on_ready, 定时任务已在运行时不再重复启动
+        if self.reminder.leader is not None:
+            # 主备模式下由选举决定是否运行定时任务
+            self.reminder.leader.start()
+        elif not self.reminder.tasks_running():
+            #启动任务
+            #定时提醒任务
+            asyncio.create_task(self.reminder.start_reminder(self))
+            #定时更新索引任务
+            asyncio.create_task(self.reminder.start_update_index(self))
+        # 监视配置文件, 修改后无需重启
+        if not self._watching:
+            shared = self.watcher is not None
+            if not shared:
+                self.watcher = FileWatcher()
+            self.watcher.watch(self.settings.config_path, self.reload_settings)
+            self.watcher.watch(self.reminder.config_path, self.reminder.reload_config)
+            self.watcher.watch(self.reminder.members_path, self.reminder.reload_members)
+            if not shared:
+                self.watcher.start()
+            self._watching = True
+
+    async def close(self):
+        """共用的 HTTP 会话由托管方关闭, 这里只断开引用"""
+        if not self._closed:
+            self.save_gateway_session()
+        if self.reminder.leader is not None:
+            # 主动释放租约, 备用实例无需等待过期
+            self.reminder.leader.stop()
+        if self._shared_session:
+            self.http._session = None
+        await super().close()
+
+    def reload_settings(self, path=None):
+        """重新加载被修改的 config.yaml, 内容无效时保留当前配置"""
+        try:
+            settings = load_settings(self.settings.config_path, self.settings.data_dir)
+        except Exception as e:
+            _log.error(f"config.yaml 修改无效, 保留当前配置: {e}")
+            return False
+        if settings == self.settings:
+            return False
+        if (settings.appid, settings.secret) != (self.settings.appid, self.settings.secret):
+            _log.warning("appid/secret 的修改需要重启机器人才能生效")
+        self.settings = settings
+        # 重新构建权限索引, 旧的判断缓存随旧实例一起丢弃
+        self.authority = AdminAuthority.from_settings(settings)
+        _log.info("config.yaml 已重新加载")
+        return True
 
     async def generate_help_text(self) -> str:
         """生成帮助文本"""
@@ -157,21 +455,29 @@ class SweepingBot(botpy.Client):
         help_text.append(f"{self.command_prefix}help - 显示帮助信息")
         help_text.append(f"{self.command_prefix}status - 查看机器人当前状态")
         help_text.append(f"{self.command_prefix}current - 显示当前值日人员")
-        help_text.append(f"{self.command_prefix}list [m/h] - 列出成员(m)或假期(h)")
+        help_text.append(f"{self.command_prefix}who [MM-DD/YYYY-MM-DD/+天数] - 查询某天的值日人员(过去或将来)")
+        help_text.append(f"{self.command_prefix}list [m/h] [页码] - 列出成员(m)或假期(h), 内容较多时分页")
+        help_text.append(f"{self.command_prefix}history [条数] - 查看最近的提醒记录")
+        help_text.append(f"{self.command_prefix}stats - 查看每个成员的值日统计")
         
         # 管理员命令
         help_text.append("\n管理员命令:")
-        help_text.append(f"{self.command_prefix}addm [name] [qq] - 添加成员")
-        help_text.append(f"{self.command_prefix}addh [MM-DD] - 添加假期")
+        help_text.append(f"{self.command_prefix}addm [name] [qq] - 添加成员(多行或 名字,QQ号 格式可批量添加)")
+        help_text.append(f"{self.command_prefix}addh [MM-DD] - 添加假期(多个日期用空格分隔)")
+        help_text.append(f"{self.command_prefix}export [m/h] - 导出成员(可直接用于批量添加)或假期")
         help_text.append(f"{self.command_prefix}rm [m/h] [id/MM-DD] - 删除成员或假期")
         help_text.append(f"{self.command_prefix}set [time/index-time/id] [HH:MM/HH:MM:SS/1、2、3...] - 设置提醒时间、索引更新时间和当前值日生")
+        help_text.append(f"{self.command_prefix}set rotation [sequential/fair] - 设置轮换策略(顺序/按值日次数均衡)")
         help_text.append(f"{self.command_prefix}on - 启用提醒功能")
         help_text.append(f"{self.command_prefix}off - 禁用提醒功能")
         help_text.append(f"{self.command_prefix}silent [on/off] - 设置静默模式")
         help_text.append(f"{self.command_prefix}send - 手动触发提醒")
         help_text.append(f"{self.command_prefix}next - 切换到下一值日人员")
         help_text.append(f"{self.command_prefix}reset - 重置轮换顺序")
+        help_text.append(f"{self.command_prefix}away [id] [MM-DD/off] - 成员请假到某天(轮换时跳过), off 取消请假")
+        help_text.append(f"{self.command_prefix}swap [id1] [id2] - 一次性互换两位成员的值日")
         help_text.append(f"{self.command_prefix}restart - 重启所有定时任务")
+        help_text.append(f"{self.command_prefix}stats newterm - 开始新学期, 清零本学期统计")
         
         return "\n".join(help_text)
 
@@ -201,15 +507,14 @@ class SweepingBot(botpy.Client):
     async def on_group_at_message_create(self, message: GroupMessage):
         """处理群聊消息"""
         _log.info(f"收到群聊消息: {message.content}")
+        METRICS.incr(self.tenant, "group_messages")
             
         # 处理命令
         content = message.content.strip()
         
         # 检查命令完整性
-        if content.startswith("/addm") and len(content.split()) < 3:
-            await message.reply(content="格式错误,请使用: /addm [name] [qq]")
-            return
-        elif content.startswith("/list") and len(content.split()) < 2:
+        # /addm 的格式由 parse_member_rows 按行检查(单行 "名字,QQ号" 只有两个词)
+        if content.startswith("/list") and len(content.split()) < 2:
             await message.reply(content="格式错误,请使用: /list [m/h] (m:成员列表, h:假期列表)")
             return
         elif content.startswith("/addh") and len(content.split()) < 2:
@@ -224,21 +529,45 @@ class SweepingBot(botpy.Client):
         elif content.startswith("/silent") and len(content.split()) < 2:
             await message.reply(content="格式错误,请使用: /silent [on/off]")
             return
+        elif content.startswith("/export") and len(content.split()) < 2:
+            await message.reply(content="格式错误,请使用: /export [m/h]")
+            return
+        elif content.startswith("/away") and len(content.split()) < 3:
+            await message.reply(content="格式错误,请使用: /away [id] [MM-DD/off]")
+            return
+        elif content.startswith("/swap") and len(content.split()) < 3:
+            await message.reply(content="格式错误,请使用: /swap [id1] [id2]")
+            return
             
-        # 添加成员
-        if content.startswith("/addm "):
+        command = content.split(None, 1)[0] if content else ""
+        if self._changes_state(command[len(self.command_prefix):]):
+            self._refresh_state()
+
+        # 添加成员(支持多行批量添加)
+        if command == "/addm":
             try:
                 #权限检查
                 if not self.is_admin(message):
-                    cmd = content.split( )
-                    await message.reply(content=f"你没有权限执行' {cmd[0]} '命令")
+                    await message.reply(content=f"你没有权限执行' {command} '命令")
                     return
-                parts = content.split()
-                _, name, qq_id = parts
-                success, msg = self.reminder.add_member(name, qq_id)
+                rows = parse_member_rows(_command_body(content))
+                success, msg = self.reminder.add_members_bulk(rows)
                 await message.reply(content=msg)
-            except ValueError:
-                await message.reply(content="格式错误,请使用: /addm [name] [qq]")
+            except ValidationError as e:
+                await message.reply(content=str(e))
+
+        # 导出成员或假期
+        elif command == "/export":
+            if not self.is_admin(message, shared=False):
+                await message.reply(content=f"你没有权限执行' {command} '命令")
+                return
+            export_type = content.split()[1]
+            if export_type == "m":
+                await message.reply(content=self.reminder.export_members())
+            elif export_type == "h":
+                await message.reply(content=self.reminder.export_holidays())
+            else:
+                await message.reply(content="格式错误,请使用: /export [m/h]")
                 
         # 强制发送提醒
         elif content == "/send":
@@ -248,8 +577,10 @@ class SweepingBot(botpy.Client):
                     cmd = content.split( )
                     await message.reply(content=f"你没有权限执行' {cmd[0]} '命令")
                     return
-                current_member = self.reminder.members_data["members"][self.reminder.members_data["current_index"]]
-                if not self.reminder.config["enabled"]:
+                current_member = self.reminder.current_member()
+                if current_member is None:
+                    await message.reply(content="没有可用的成员")
+                elif not self.reminder.config["enabled"]:
                     await message.reply(content="提醒功能已禁用,无法发送提醒")
                 elif self.reminder.config["silent_mode"]:
                     await message.reply(content="静默模式已启用,不发送提醒")
@@ -257,7 +588,7 @@ class SweepingBot(botpy.Client):
                     await message.reply(content="今天是假期,不发送提醒")
                 else:
                     await self.reminder.send_reminder(self, force_send=True)
-                    await message.reply(content=f"已发送提醒给：{current_member['name']}(ID:{current_member['id']})")
+                    await message.reply(content=f"已发送提醒给：{current_member.name}(ID:{current_member.id})")
             except Exception as e:
                 await message.reply(content=f"提醒发送失败：{str(e)}")
                 
@@ -266,36 +597,30 @@ class SweepingBot(botpy.Client):
             status = self.reminder.get_status()
             await message.reply(content=status)
             
-        # 列出成员或假期
+        # 列出成员或假期(分页)
         elif content.startswith("/list "):
-            try:
-                parts = content.split()
-                _, list_type = parts
-                if list_type == "m":
-                    member_list = self.reminder.list_members()
-                    await message.reply(content=member_list)
-                elif list_type == "h":
-                    holidays = self.reminder.list_holidays()
-                    await message.reply(content=holidays)
-                else:
-                    await message.reply(content="格式错误,请使用: /list [m/h] (m:成员列表, h:假期列表)")
-            except ValueError:
-                await message.reply(content="格式错误,请使用: /list [m/h] (m:成员列表, h:假期列表)")
+            parts = content.split()
+            page_no = parts[2] if len(parts) > 2 else "1"
+            page = self.reminder.list_page(parts[1], int(page_no)) if page_no.isdigit() and int(page_no) > 0 else None
+            if page is None:
+                await message.reply(content="格式错误,请使用: /list [m/h] [页码] (m:成员列表, h:假期列表)")
+                return
+            await message.reply(content=page.text)
+            if self.reminder.config.get("list_keyboard") and (page.has_next or page.number > 1):
+                await self._send_page_keyboard(message, f"/list {parts[1]}", page)
             
-        # 添加假期
-        elif content.startswith("/addh "):
-            try:
-                #权限检查
-                if not self.is_admin(message):
-                    cmd = content.split( )
-                    await message.reply(content=f"你没有权限执行' {cmd[0]} '命令")
-                    return
-                parts = content.split()
-                _, date = parts
-                success, msg = self.reminder.add_holiday(date)
-                await message.reply(content=msg)
-            except ValueError:
-                await message.reply(content="格式错误,请使用: /addh [MM-DD]")
+        # 添加假期(支持一次添加多个日期)
+        elif command == "/addh":
+            #权限检查
+            if not self.is_admin(message):
+                await message.reply(content=f"你没有权限执行' {command} '命令")
+                return
+            dates = parse_holiday_dates(_command_body(content))
+            if len(dates) == 1:
+                success, msg = self.reminder.add_holiday(dates[0])
+            else:
+                success, msg = self.reminder.add_holidays_bulk(dates)
+            await message.reply(content=msg)
                 
         # 删除成员或假期
         elif content.startswith("/rm "):
@@ -334,6 +659,8 @@ class SweepingBot(botpy.Client):
                     success, msg = self.reminder.set_index_update_time(value)
                 elif set_type == "id":
                     success, msg = self.reminder.set_current_member(value)
+                elif set_type == "rotation":
+                    success, msg = self.reminder.set_rotation_strategy(value)
                 else:
                     await message.reply(content="格式错误,请使用: /set [time/id] [HH:MM/1、2、3...]")
                     return
@@ -407,6 +734,46 @@ class SweepingBot(botpy.Client):
             self.reminder.reset_rotation()
             await message.reply(content="轮换已重置")
             
+        # 成员请假
+        elif command == "/away":
+            if not self.is_admin(message):
+                await message.reply(content=f"你没有权限执行' {command} '命令")
+                return
+            _, member_id, until = content.split()[:3]
+            success, msg = self.reminder.set_absence(member_id, until)
+            await message.reply(content=msg)
+
+        # 互换值日
+        elif command == "/swap":
+            if not self.is_admin(message):
+                await message.reply(content=f"你没有权限执行' {command} '命令")
+                return
+            _, first_id, second_id = content.split()[:3]
+            success, msg = self.reminder.swap_members(first_id, second_id)
+            await message.reply(content=msg)
+
+        # 查看提醒记录
+        elif command == "/history":
+            await message.reply(content=self._history_text(content.split()[1:]))
+
+        # 查看值日统计 / 开始新学期
+        elif command == "/stats":
+            params = content.split()[1:]
+            if params and params[0] == "newterm":
+                if not self.is_admin(message):
+                    await message.reply(content=f"你没有权限执行' {command} newterm '命令")
+                    return
+                self.reminder.ledger.start_term()
+                await message.reply(content="已开始新学期,本学期统计已清零")
+            else:
+                await message.reply(content=self.reminder.ledger.format_stats(self.reminder.roster))
+
+        # 查询某天的值日人员
+        elif command == "/who":
+            params = content.split()[1:]
+            success, msg = self.reminder.member_on(params[0] if params else "+0")
+            await message.reply(content=msg)
+
         # 获取当前值日人员
         elif content == "/current":
             current = self.reminder.get_current_member()
@@ -419,18 +786,15 @@ class SweepingBot(botpy.Client):
                 cmd = content.split( )
                 await message.reply(content=f"你没有权限执行' {cmd[0]} '命令")
                 return
-            next_member = self.reminder.get_next_member()
-            if isinstance(next_member, dict):
-                current_index = self.reminder.members_data["current_index"]
-                next_index = (current_index + 1) % len(self.reminder.members_data["members"])
-                self.reminder.members_data["current_index"] = next_index
-                self.reminder.save_members()
-                await message.reply(content=f"已切换到下一值日人员: {next_member['name']}")
+            next_member = self.reminder.advance_rotation()
+            if next_member is not None:
+                await message.reply(content=f"已切换到下一值日人员: {next_member.name}")
             else:
                 await message.reply(content="没有可用的成员")
         
         elif content == "/restart":
-            if not self.is_admin(message):
+            # 重启定时任务影响所有群, 需要全局管理员
+            if not self.is_admin(message, ROLE_OWNER):
                 cmd = content.split( )
                 await message.reply(content=f"你没有权限执行' {cmd[0]} '命令")
                 return
@@ -446,11 +810,12 @@ class SweepingBot(botpy.Client):
         """处理私聊消息"""
         try:
             _log.info(f"收到私聊消息: {message.content}")
+            METRICS.incr(self.tenant, "c2c_messages")
             
             # 解析命令
             content = message.content.strip()
             if not content.startswith(self.command_prefix):
-                # 非命令消息,返回默认提示
+                # 非命令消息,返回默认提示(同一用户在 HINT_WINDOW 内只会走到这里一次)
                 await message._api.post_c2c_message(
                     openid=message.author.user_openid,
                     msg_type=0,
@@ -468,7 +833,8 @@ class SweepingBot(botpy.Client):
             params = parts[1:] if len(parts) > 1 else None
 
             # 处理命令并生成响应文本
-            result = await self._process_c2c_command(message, command, params)
+            result = await self._process_c2c_command(message, command, params,
+                                                     _command_body(content[len(self.command_prefix):].strip()))
             
             # 使用私聊API回复消息
             await message._api.post_c2c_message(
@@ -490,8 +856,23 @@ class SweepingBot(botpy.Client):
             except:
                 _log.error(f"回复私聊错误消息失败: {str(e)}")
 
-    async def _process_c2c_command(self, message, command, params):
-        """处理私聊命令,返回结果字符串"""
+    def _changes_state(self, command):
+        """command(不含前缀)是否为会修改成员或配置的管理员命令"""
+        handler = self.command_handlers.get(self.command_aliases.get(command, command))
+        return handler is not None and handler.is_admin
+
+    def _refresh_state(self):
+        """执行管理员命令前读入其他进程(调度进程、主备实例、分片工作进程)写入的修改"""
+        try:
+            self.reminder.refresh()
+        except OSError as e:
+            _log.error(f"读取数据目录失败, 按当前内存中的数据执行命令: {e}")
+
+    async def _process_c2c_command(self, message, command, params, body=""):
+        """处理私聊命令,返回结果字符串
+
+        body 为命令名之后的原始文本(保留换行), 供批量命令解析使用
+        """
         # 查找命令处理函数
         if command in self.command_handlers:
             handler = self.command_handlers[command]
@@ -501,9 +882,12 @@ class SweepingBot(botpy.Client):
         else:
             return f"未找到命令: {command},请使用{self.command_prefix}help查看可用命令"
             
-        # 检查权限
-        # if handler.is_admin and not self.is_admin(message):
-        #     return "您没有权限执行此命令"
+        # 检查权限(私聊中按 author.user_openid 判断, 只有全局管理员有效)
+        role = ROLE_OWNER if handler is restart_command else ROLE_ADMIN
+        if handler.is_admin and not self.is_admin(message, role):
+            return f"你没有权限执行' {self.command_prefix}{command} '命令"
+        if handler.is_admin:
+            self._refresh_state()
             
         # 根据命令类型获取结果
         if command == "help":
@@ -519,9 +903,23 @@ class SweepingBot(botpy.Client):
             return self.reminder.get_status()
         elif command == "current":
             return self.reminder.get_current_member()
+        elif command == "who":
+            return self.reminder.member_on(params[0] if params else "+0")[1]
+        elif command == "history":
+            return self._history_text(params or [])
+        elif command == "stats":
+            if params and params[0] == "newterm":
+                if not self.is_admin(message):
+                    return f"你没有权限执行' {self.command_prefix}stats newterm '命令"
+                self.reminder.ledger.start_term()
+                return "已开始新学期,本学期统计已清零"
+            return self.reminder.ledger.format_stats(self.reminder.roster)
         elif command == "list":
             if not params or not params:
-                return "格式错误,请使用: /list [m/h] (m:成员列表, h:假期列表)"
+                return "格式错误,请使用: /list [m/h] [页码] (m:成员列表, h:假期列表)"
+            if len(params) > 1:
+                page = self.reminder.list_page(params[0], int(params[1])) if params[1].isdigit() and int(params[1]) > 0 else None
+                return page.text if page is not None else "格式错误,请使用: /list [m/h] [页码] (m:成员列表, h:假期列表)"
             if params[0] == "m":
                 return self.reminder.list_members()
             elif params[0] == "h":
@@ -529,15 +927,29 @@ class SweepingBot(botpy.Client):
             else:
                 return "格式错误,请使用: /list [m/h] (m:成员列表, h:假期列表)"
         elif command == "addm":
-            if not params or len(params) < 2:
-                return "格式错误,请使用: /addm [name] [qq]"
-            success, msg = self.reminder.add_member(params[0], params[1])
+            try:
+                rows = parse_member_rows(body)
+            except ValidationError as e:
+                return str(e)
+            success, msg = self.reminder.add_members_bulk(rows)
             return msg
         elif command == "addh":
             if not params or not params:
                 return "格式错误,请使用: /addh [MM-DD]"
-            success, msg = self.reminder.add_holiday(params[0])
+            if len(params) == 1:
+                success, msg = self.reminder.add_holiday(params[0])
+            else:
+                success, msg = self.reminder.add_holidays_bulk(parse_holiday_dates(body))
             return msg
+        elif command == "export":
+            if not params:
+                return "格式错误,请使用: /export [m/h]"
+            if params[0] == "m":
+                return self.reminder.export_members()
+            elif params[0] == "h":
+                return self.reminder.export_holidays()
+            else:
+                return "格式错误,请使用: /export [m/h]"
         elif command == "rm":
             if not params or len(params) < 2:
                 return "格式错误,请使用: /rm [m/h] [id/MM-DD]"
@@ -561,6 +973,9 @@ class SweepingBot(botpy.Client):
             elif params[0] == "id":
                 success, msg = self.reminder.set_current_member(params[1])
                 return msg
+            elif params[0] == "rotation":
+                success, msg = self.reminder.set_rotation_strategy(params[1])
+                return msg
             else:
                 return "格式错误,请使用: /set [time/index-time/id] [HH:MM/HH:MM:SS/1、2、3...]"
         elif command == "on":
@@ -593,69 +1008,78 @@ class SweepingBot(botpy.Client):
             else:
                 return "格式错误,请使用: /silent [on/off]"
         elif command == "send":
-            await self.reminder.send_reminder(self, force_send=True)
-            current_member = self.reminder.members_data["members"][self.reminder.members_data["current_index"]]
-            if not self.reminder.config["enabled"]:
+            # 与群聊相同, 先检查再发送(暂停时不手动发送暂停通知)
+            current_member = self.reminder.current_member()
+            if current_member is None:
+                return "没有可用的成员"
+            elif not self.reminder.config["enabled"]:
                 return "提醒功能已禁用,无法发送提醒"
             elif self.reminder.config["silent_mode"]:
                 return "静默模式已启用,不发送提醒"
             elif self.reminder.is_holiday():
                 return "今天是假期,不发送提醒"
             else:
-                return f"已发送提醒给：{current_member['name']}(ID:{current_member['id']})"
+                await self.reminder.send_reminder(self, force_send=True)
+                return f"已发送提醒给：{current_member.name}(ID:{current_member.id})"
         elif command == "next":
-            next_member = self.reminder.get_next_member()
-            if isinstance(next_member, dict):
-                # 更新当前索引
-                current_index = self.reminder.members_data["current_index"]
-                next_index = (current_index + 1) % len(self.reminder.members_data["members"])
-                self.reminder.members_data["current_index"] = next_index
-                self.reminder.save_members()
-                return f"已切换到下一值日人员: {next_member['name']}"
+            # 更新当前索引
+            next_member = self.reminder.advance_rotation()
+            if next_member is not None:
+                return f"已切换到下一值日人员: {next_member.name}"
             else:
                 return "没有可用的成员"
         elif command == "reset":
             self.reminder.reset_rotation()
             return "轮换已重置"
+        elif command == "away":
+            if not params or len(params) < 2:
+                return "格式错误,请使用: /away [id] [MM-DD/off]"
+            success, msg = self.reminder.set_absence(params[0], params[1])
+            return msg
+        elif command == "swap":
+            if not params or len(params) < 2:
+                return "格式错误,请使用: /swap [id1] [id2]"
+            success, msg = self.reminder.swap_members(params[0], params[1])
+            return msg
         elif command == "restart":
             success, content = self.reminder.restart_task()
             return f"{content}"
         # 未知命令或格式错误
         return f"命令格式错误,请使用{self.command_prefix}help查看帮助"
 
-    def is_admin(self, message):
-        """检查用户是否为管理员"""
-        
-        # 特殊情况: 如果没有设置管理员ID,则默认允许所有人访问管理员命令
-        if not self.admin_ids:
-            _log.info("未配置管理员ID,默认允许访问管理员命令")
-            return True
-            
-        # 打印消息对象信息用于调试
-        _log.info(f"消息对象类型: {type(message).__name__}")
-        
+    async def _send_page_keyboard(self, message, command, page):
+        """在分页回复后附带翻页按钮(需要机器人有 markdown/按钮 消息权限, 失败时忽略)"""
+        markdown, keyboard = build_page_keyboard(command, page)
         try:
-            # 对于群聊消息
-            if hasattr(message, 'author'):
-                # 尝试获取用户ID
-                if hasattr(message.author, 'member_openid'):
-                    user_id = message.author.member_openid
-                    _log.info(f"检查管理员权限:{(user_id in self.admin_ids)}")
-                    _log.info(f"从群聊消息获取用户ID(member_openid): {user_id}")
-                    return user_id in self.admin_ids
-                    
-                # 打印所有可用属性
-                _log.info(f"用户对象属性: {dir(message.author)}")
-                
-                # 紧急情况: 群聊消息暂时全部允许
-                _log.info("无法确定用户ID,暂时允许群聊中的管理员命令")
-                return True
-                
-            # 紧急情况: 如果找不到用户ID,暂时允许访问
-            _log.info("无法确定消息类型,暂时允许管理员命令")
-            return True
-            
+            await message._api.post_group_message(
+                group_openid=message.group_openid,
+                msg_type=2,
+                msg_id=message.id,
+                msg_seq=2,
+                markdown=markdown,
+                keyboard=keyboard,
+            )
+        except Exception as e:
+            _log.warning(f"发送翻页按钮失败: {e}")
+
+    def _history_text(self, params):
+        """/history [条数], 条数默认10, 最多50"""
+        count = 10
+        if params:
+            if not params[0].isdigit():
+                return "格式错误,请使用: /history [条数]"
+            count = max(1, min(int(params[0]), 50))
+        return self.reminder.ledger.format_history(self.reminder.roster, count)
+
+    def is_admin(self, message, role=ROLE_ADMIN, shared=True):
+        """检查用户是否为管理员(角色不低于 role)
+
+        shared 为 True(默认)表示命令会修改共用的成员/配置, 只有全局管理员可以执行;
+        只读的管理员命令传 False, 所在群的群管理员也可以执行。
+        """
+        try:
+            return self.authority.check_message(message, role, shared)
         except Exception as e:
             _log.error(f"检查管理员权限时出错: {str(e)}")
             # 安全起见,权限检查失败时拒绝访问
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+网关会话恢复
+
+每次重启原来都要重新登录(/users/@me、/gateway/bot)并重新鉴权(identify), 重启期间的事件也会丢失。
+正常退出时把网关会话(session_id、last_seq)连同机器人信息和网关地址写入数据目录,
+RESUME_WINDOW 秒内再次启动时跳过登录请求, 直接用原会话 resume, 服务端会补发期间的事件。
+resume 被拒绝(会话已失效)时 botpy 会自动改为重新鉴权。
+
+文件只使用一次, 读取后立即删除: 崩溃后留下的旧记录不会被再次使用。
+"""
+
+import os
+import json
+import time
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+SESSION_FILE = ".gateway_session"
+# 退出后多久内尝试 resume(秒), 超过时直接重新登录和鉴权
+RESUME_WINDOW = 120
+
+
+def save_session(path: str, appid: str, intents: int, user: dict, ws_ap: dict, sessions: list) -> bool:
+    """保存可恢复的网关会话, 没有已建立的会话时不写入
+
+    Args:
+        sessions: botpy 的会话字典列表(含 session_id、last_seq、shards)
+    """
+    shards = [{"shard_id": s["shards"]["shard_id"], "session_id": s["session_id"], "last_seq": s["last_seq"]}
+              for s in sessions if s.get("session_id")]
+    if not shards or user is None or ws_ap is None:
+        return False
+    state = {"appid": str(appid), "intents": intents, "saved_at": time.time(),
+             "user": user, "ws_ap": ws_ap, "shards": shards}
+    tmp_path = path + ".tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        _log.warning(f"保存网关会话失败: {e}")
+        return False
+    _log.info(f"已保存网关会话({len(shards)} 个分片), {RESUME_WINDOW} 秒内重启将尝试恢复")
+    return True
+
+
+def load_session(path: str, appid: str, intents: int):
+    """读取并删除保存的网关会话; 不存在、过期或与当前机器人不符时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        _log.warning(f"读取网关会话失败: {e}")
+        state = None
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    if not isinstance(state, dict):
+        return None
+    age = time.time() - state.get("saved_at", 0)
+    if state.get("appid") != str(appid) or state.get("intents") != intents:
+        _log.info("保存的网关会话属于其他机器人或事件通道已变化, 重新鉴权")
+        return None
+    if not 0 <= age <= RESUME_WINDOW:
+        _log.info(f"保存的网关会话已超过 {RESUME_WINDOW} 秒, 重新鉴权")
+        return None
+    state["shards"] = {shard["shard_id"]: shard for shard in state.get("shards", [])}
+    return state
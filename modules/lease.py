@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+主备运行
+
+同时运行两个实例做冗余时, 两边的定时器都会触发, 每个成员会收到两封提醒; 只运行一个实例时,
+进程崩溃到 systemd 重启之间的提醒会丢失。带 --ha 启动的实例通过数据目录下 leader.db 中的
+一行租约选出主实例:
+    - 租约有效期 LEASE_TTL 秒, 主实例每 RENEW_INTERVAL 秒续期一次
+    - 只有主实例运行定时提醒和索引更新; 备用实例只处理消息, 并不断尝试获取租约
+    - 主实例崩溃或卡住后, 租约在 LEASE_TTL 秒内过期, 备用实例接管: 先读入最新的成员和配置,
+      再启动定时任务; 如果接管时今天的提醒时间刚过(CATCH_UP_WINDOW 内)且今天还没有发送, 立即补发
+    - 定时发送前再向数据库确认一次仍持有租约(续期成功), 已被接管时放弃本次发送;
+      "今天已发送"记录在共享的 member.json 中, 新的主实例不会再发一次
+    - 推进值日索引和记录发送日期前再确认一次, 已被接管的旧主实例不会覆盖新主实例的轮换位置;
+      写入 member.json 时持有数据目录的文件锁并与文件内容合并(见 statelock)
+
+两个实例必须使用同一个数据目录(同一台机器或本地共享磁盘, SQLite 不适合网络文件系统)。
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import asyncio
+from datetime import datetime, timedelta
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+LEASE_FILE = "leader.db"
+# 租约有效期和续期间隔(秒)
+LEASE_TTL = 10
+RENEW_INTERVAL = 2
+# 接管时今天的提醒时间已过去不超过该秒数, 且今天尚未发送, 则立即补发
+CATCH_UP_WINDOW = 3600
+
+
+class Lease:
+    """数据库中的一行租约
+
+    Args:
+        path: 数据库文件路径
+        name: 租约名称
+        ttl: 有效期(秒)
+    """
+
+    def __init__(self, path: str, name: str = "scheduler", ttl: float = LEASE_TTL):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.epoch = 0
+        self._db = sqlite3.connect(path, timeout=2, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS lease ("
+                         "name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL, epoch INTEGER NOT NULL)")
+
+    @classmethod
+    def for_data_dir(cls, data_dir: str) -> "Lease":
+        return cls(os.path.join(data_dir, LEASE_FILE))
+
+    def try_acquire(self) -> bool:
+        """获取或续期租约, 返回本实例是否持有"""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("SELECT holder, expires, epoch FROM lease WHERE name = ?", (self.name,)).fetchone()
+            if row is None:
+                epoch = 1
+                self._db.execute("INSERT INTO lease (name, holder, expires, epoch) VALUES (?, ?, ?, ?)",
+                                 (self.name, self.holder, now + self.ttl, epoch))
+            elif row[0] == self.holder:
+                epoch = row[2]
+                self._db.execute("UPDATE lease SET expires = ? WHERE name = ?", (now + self.ttl, self.name))
+            elif row[1] < now:
+                # 原持有者已过期, 接管并增加代数
+                epoch = row[2] + 1
+                self._db.execute("UPDATE lease SET holder = ?, expires = ?, epoch = ? WHERE name = ?",
+                                 (self.holder, now + self.ttl, epoch, self.name))
+            else:
+                self._db.execute("COMMIT")
+                return False
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        self.epoch = epoch
+        return True
+
+    def confirm(self) -> bool:
+        """执行不可重复的操作前确认仍持有租约; 数据库出错时按未持有处理"""
+        try:
+            return self.try_acquire()
+        except sqlite3.Error as e:
+            _log.error(f"确认主实例租约失败: {e}")
+            return False
+
+    def current(self):
+        """当前持有者 (holder, 剩余秒数), 没有时返回 None"""
+        row = self._db.execute("SELECT holder, expires FROM lease WHERE name = ?", (self.name,)).fetchone()
+        return None if row is None else (row[0], row[1] - time.time())
+
+    def release(self):
+        """主动释放, 备用实例无需等待过期即可接管"""
+        try:
+            self._db.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (self.name, self.holder))
+        except sqlite3.Error as e:
+            _log.warning(f"释放主实例租约失败: {e}")
+
+    def close(self):
+        self._db.close()
+
+
+class LeaderElection:
+    """根据租约启动或停止 Reminder 的定时任务
+
+    Args:
+        lease: Lease
+        reminder: 本实例的 Reminder(创建时应设置 run_schedulers=False)
+    """
+
+    def __init__(self, lease: Lease, reminder):
+        self.lease = lease
+        self.reminder = reminder
+        self.leading = False
+        self._task = None
+        reminder.leader = self
+        reminder.run_schedulers = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        _log.info(f"主备模式已启用, 本实例: {self.lease.holder}")
+        while True:
+            try:
+                holding = self.lease.try_acquire()
+            except sqlite3.Error as e:
+                _log.error(f"续期主实例租约失败: {e}")
+                holding = False
+            if holding and not self.leading:
+                await self._promote()
+            elif not holding and self.leading:
+                self._demote()
+            await asyncio.sleep(RENEW_INTERVAL)
+
+    async def _promote(self):
+        self.leading = True
+        reminder = self.reminder
+        # 原主实例最后的修改可能还没被监视器读入
+        reminder.reload_config()
+        reminder.reload_members()
+        reminder.run_schedulers = True
+        await reminder.start_reminder(reminder.client)
+        await reminder.start_update_index(reminder.client)
+        _log.warning(f"本实例成为主实例(第 {self.lease.epoch} 代), 已启动定时任务")
+        if self._missed_today():
+            _log.warning("接管时今天的提醒时间已过且尚未发送, 立即补发")
+            reminder.delivery = asyncio.create_task(self._catch_up())
+
+    async def _catch_up(self):
+        try:
+            await self.reminder._send_when_available()
+        except Exception as e:
+            _log.error(f"补发今天的提醒失败: {e}")
+
+    def _demote(self):
+        self.leading = False
+        self.reminder.stop_schedulers()
+        _log.warning("本实例已不是主实例, 定时任务已停止")
+
+    def _missed_today(self) -> bool:
+        reminder = self.reminder
+        now = datetime.now()
+        fire = datetime.combine(now.date(), datetime.strptime(reminder.config["reminder_time"], "%H:%M").time())
+        return fire <= now < fire + timedelta(seconds=CATCH_UP_WINDOW) \
+            and reminder.members_data["last_reminder_date"] != now.date().isoformat()
+
+    def describe(self) -> str:
+        if self.leading:
+            return f"主实例(第 {self.lease.epoch} 代)"
+        current = self.lease.current()
+        if current is None or current[1] < 0:
+            return "备用, 等待接管"
+        return f"备用, 主实例为 {current[0]}"
+
+    def pause(self):
+        """停止续期和接管, 暂不释放租约(退出时等待进行中的发送期间使用)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stop(self):
+        """停止选举并释放租约"""
+        self.pause()
+        if self.leading:
+            self._demote()
+            self.lease.release()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+提醒发送记录
+
+每次投递尝试追加一条定长记录到 data/reminder_ledger.bin, 文件只追加不修改。
+每个成员的统计(成功/失败次数、最近一次值日)在追加时增量更新, 保存在
+data/reminder_stats.json 中, 并记下已统计的记录数; 启动时只需重放统计之后
+新增的记录。因此 /stats 与 /history 的耗时与历史长度无关。
+
+多个进程共用数据目录时(分片、独立调度进程、主备), 追加记录、保存统计和读取统计都持有
+数据目录的文件锁(见 statelock), 并先从文件重新加载统计、重放其他进程追加的记录,
+不会用本进程过时的统计覆盖文件, 也不会把同一条记录统计两次。
+"""
+
+import os
+import json
+import struct
+import time
+from datetime import date, datetime
+
+from botpy import logging as botpy_logging
+
+from .statelock import StateLock
+
+_log = botpy_logging.get_logger()
+
+# 记录格式(16字节): 时间戳, 成员ID, 值日日期(ordinal), 渠道, 结果, 第几次尝试, 标记
+RECORD = struct.Struct("<IIIBBBB")
+
+CHANNEL_EMAIL = 1
+CHANNEL_GROUP = 2
+CHANNEL_C2C = 3
+CHANNEL_NAMES = {CHANNEL_EMAIL: "邮件", CHANNEL_GROUP: "群消息", CHANNEL_C2C: "私聊"}
+
+STATUS_FAILED = 0
+STATUS_OK = 1
+# 发送过程中出错, 服务器可能已经收下(统计中按失败计)
+STATUS_UNKNOWN = 2
+
+FLAG_FORCED = 0x01
+FLAG_PAUSED = 0x02
+
+
+class LedgerRecord:
+    """一条投递记录"""
+
+    __slots__ = ("ts", "member_id", "duty_date", "channel", "status", "attempt", "flags")
+
+    def __init__(self, ts, member_id, duty_date, channel, status, attempt, flags):
+        self.ts = ts
+        self.member_id = member_id
+        self.duty_date = duty_date
+        self.channel = channel
+        self.status = status
+        self.attempt = attempt
+        self.flags = flags
+
+    @classmethod
+    def unpack(cls, data: bytes, offset: int = 0) -> "LedgerRecord":
+        ts, member_id, ordinal, channel, status, attempt, flags = RECORD.unpack_from(data, offset)
+        return cls(ts, member_id, date.fromordinal(ordinal), channel, status, attempt, flags)
+
+    def pack(self) -> bytes:
+        return RECORD.pack(self.ts, self.member_id, self.duty_date.toordinal(),
+                           self.channel, self.status, self.attempt, self.flags)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == STATUS_OK
+
+
+class ReminderLedger:
+    """追加式投递记录及每个成员的统计
+
+    统计结构: {成员ID: {"ok": 成功提醒的值日天数, "failed": 失败次数, "last": 最近成功的值日日期,
+                         "term_ok": 本学期成功提醒的值日天数}}
+    """
+
+    def __init__(self, data_dir: str):
+        self.ledger_path = os.path.join(data_dir, "reminder_ledger.bin")
+        self.stats_path = os.path.join(data_dir, "reminder_stats.json")
+        self.records = 0
+        self.term_start = ""
+        self.members = {}
+        self.lock = StateLock.for_data_dir(data_dir)
+        # 上次加载时两个文件的状态, 没有变化时不必重新读取
+        self._loaded_key = None
+        with self.lock:
+            self._load()
+
+    # ---- 持久化 ----
+
+    def _file_key(self):
+        try:
+            stat = os.stat(self.stats_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, self._ledger_count()
+
+    def _sync(self):
+        """在锁内调用: 其他进程修改过统计或追加过记录时重新加载"""
+        key = self._file_key()
+        if key is None or key != self._loaded_key:
+            self._load()
+
+    def _load(self):
+        self.records, self.term_start, self.members = 0, "", {}
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            self.records = int(stats.get("records", 0))
+            self.term_start = stats.get("term_start", "")
+            self.members = {int(k): v for k, v in stats.get("members", {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            _log.error(f"加载提醒统计失败, 将从发送记录重建: {e}")
+            self.records, self.members = 0, {}
+
+        total = self._ledger_count()
+        if total < self.records:
+            # 记录文件被替换或截断, 统计作废
+            _log.warning("提醒记录文件比统计更短, 重新统计")
+            self.records, self.members = 0, {}
+        if total > self.records:
+            replayed = total - self.records
+            for record in self._read_range(self.records, total):
+                self._apply(record)
+            self.records = total
+            self._save_stats()
+            _log.info(f"已从发送记录补充 {replayed} 条统计")
+        self._loaded_key = self._file_key()
+
+    def _ledger_count(self) -> int:
+        try:
+            return os.path.getsize(self.ledger_path) // RECORD.size
+        except OSError:
+            return 0
+
+    def _read_range(self, start: int, stop: int):
+        if stop <= start:
+            return []
+        with open(self.ledger_path, "rb") as f:
+            f.seek(start * RECORD.size)
+            data = f.read((stop - start) * RECORD.size)
+        return [LedgerRecord.unpack(data, i) for i in range(0, len(data) - RECORD.size + 1, RECORD.size)]
+
+    def _save_stats(self):
+        tmp_path = self.stats_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "records": self.records,
+                    "term_start": self.term_start,
+                    "members": {str(k): v for k, v in self.members.items()},
+                }, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.stats_path)
+            self._loaded_key = self._file_key()
+        except Exception as e:
+            _log.error(f"保存提醒统计失败: {e}")
+
+    def _apply(self, record: LedgerRecord):
+        stats = self.members.setdefault(record.member_id, {"ok": 0, "failed": 0, "last": "", "term_ok": 0})
+        if record.flags & FLAG_PAUSED:
+            # 暂停期间的通知不算值日
+            return
+        if record.ok:
+            # 同一天重复发送(如手动 /send)只算一次值日
+            duty = record.duty_date.isoformat()
+            if duty > stats["last"]:
+                stats["ok"] += 1
+                stats["last"] = duty
+                if not self.term_start or duty >= self.term_start:
+                    stats["term_ok"] += 1
+        else:
+            stats["failed"] += 1
+
+    # ---- 写入 ----
+
+    def record(self, member_id: int, channel: int, ok: bool, attempt: int = 1,
+               duty_date: date = None, forced: bool = False, paused: bool = False,
+               uncertain: bool = False) -> LedgerRecord:
+        """追加一条投递记录并更新统计, uncertain 表示结果未知(ok 应为 False)"""
+        flags = (FLAG_FORCED if forced else 0) | (FLAG_PAUSED if paused else 0)
+        status = STATUS_OK if ok else STATUS_UNKNOWN if uncertain else STATUS_FAILED
+        record = LedgerRecord(int(time.time()), member_id, duty_date or date.today(), channel,
+                              status, min(attempt, 255), flags)
+        with self.lock:
+            self._sync()
+            try:
+                with open(self.ledger_path, "ab") as f:
+                    f.write(record.pack())
+            except Exception as e:
+                _log.error(f"写入提醒记录失败: {e}")
+                return record
+            self.records += 1
+            self._apply(record)
+            self._save_stats()
+        return record
+
+    def start_term(self, term_start: date = None):
+        """开始新学期: 清零各成员的本学期次数"""
+        with self.lock:
+            self._sync()
+            self.term_start = (term_start or date.today()).isoformat()
+            for stats in self.members.values():
+                stats["term_ok"] = 0
+            self._save_stats()
+
+    # ---- 查询 ----
+
+    def recent(self, count: int = 10) -> list:
+        """最近 count 条记录(新的在前), 只读取文件末尾"""
+        total = self._ledger_count()
+        return list(reversed(self._read_range(max(0, total - count), total)))
+
+    def member_stats(self, member_id: int) -> dict:
+        with self.lock:
+            self._sync()
+        return self.members.get(member_id, {"ok": 0, "failed": 0, "last": "", "term_ok": 0})
+
+    def format_history(self, roster, count: int = 10) -> str:
+        records = self.recent(count)
+        if not records:
+            return "暂无提醒记录"
+        lines = [f"最近 {len(records)} 条提醒记录:"]
+        for record in records:
+            member = roster.get(record.member_id)
+            name = member.name if member is not None else f"已删除成员#{record.member_id}"
+            sent_at = datetime.fromtimestamp(record.ts).strftime("%m-%d %H:%M")
+            if record.ok:
+                result = "成功"
+            elif record.status == STATUS_UNKNOWN:
+                result = f"结果未知(第{record.attempt}次)"
+            else:
+                result = f"失败(第{record.attempt}次)"
+            extra = "(手动)" if record.flags & FLAG_FORCED else ""
+            lines.append(f"{record.duty_date.isoformat()} {name} {CHANNEL_NAMES.get(record.channel, '未知')}"
+                         f" {result}{extra} @{sent_at}")
+        return "\n".join(lines)
+
+    def format_stats(self, roster) -> str:
+        if not roster:
+            return "当前没有成员"
+        with self.lock:
+            self._sync()
+        term = f"(本学期自 {self.term_start} 起)" if self.term_start else ""
+        lines = [f"值日统计{term}:"]
+        for member in roster:
+            stats = self.members.get(member.id, {"ok": 0, "failed": 0, "last": "", "term_ok": 0})
+            last = stats["last"] or "无"
+            lines.append(f"{member.id}. {member.name}: 本学期 {stats['term_ok']} 次, 累计 {stats['ok']} 次,"
+                         f" 失败 {stats['failed']} 次, 最近 {last}")
+        return "\n".join(lines)
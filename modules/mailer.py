@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+SMTP 连接预热
+
+原来每封邮件都在发送时才建立 SSL 连接并登录, 定时提醒的大部分耗时花在握手和认证上。
+调度器在提醒时间前调用 prewarm() 建好并登录一条连接, 到点后 send() 直接使用它,
+只剩发送本身; 预热的连接过期、配置变化或被服务器断开时退回到现连现发。
+所有方法都是阻塞的, 由调用方放到线程池中执行。
+"""
+
+import time
+import threading
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+# 预热的连接最多保留多久(秒), 服务器一般会在几分钟后断开空闲连接
+WARM_MAX_AGE = 120
+CONNECT_TIMEOUT = 30
+
+
+class DeliveryError(Exception):
+    """开始发送(send_message)之后出错, 不应重发
+
+    uncertain 为 True 时服务器可能已经收下邮件(连接断开、超时); 为 False 时服务器明确拒收。
+    """
+
+    def __init__(self, error: Exception, uncertain: bool):
+        super().__init__(str(error) or type(error).__name__)
+        self.error = error
+        self.uncertain = uncertain
+
+
+def _smtplib():
+    """首次使用时才导入 smtplib, 不影响启动时间"""
+    import smtplib
+    return smtplib
+
+
+class SmtpMailer:
+    """发送邮件, 可提前建立并登录连接
+
+    Args:
+        get_config: 返回当前 email_config 的函数(配置热加载后自动使用新配置)
+    """
+
+    def __init__(self, get_config):
+        self.get_config = get_config
+        self._lock = threading.Lock()
+        self._server = None
+        self._server_key = None
+        self._warmed_at = 0.0
+
+    @staticmethod
+    def _key(config: dict) -> tuple:
+        return (config["smtp_server"], config.get("smtp_port", 465), config["sender_email"], config["sender_password"])
+
+    def _connect(self, config: dict):
+        server = _smtplib().SMTP_SSL(config["smtp_server"], config.get("smtp_port", 465), timeout=CONNECT_TIMEOUT)
+        try:
+            server.login(config["sender_email"], config["sender_password"])
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def prewarm(self):
+        """建立并登录一条连接供下一次 send() 使用, 失败时抛出异常(send 仍会现连)"""
+        config = self.get_config()
+        started = time.perf_counter()
+        server = self._connect(config)
+        with self._lock:
+            old, self._server = self._server, server
+            self._server_key = self._key(config)
+            self._warmed_at = time.monotonic()
+        if old is not None:
+            self._close(old)
+        _log.info(f"SMTP 连接已预热, 耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _take_warm(self, config: dict):
+        """取出可用的预热连接, 没有时返回 None"""
+        with self._lock:
+            server, self._server = self._server, None
+            fresh = server is not None and self._server_key == self._key(config) \
+                and time.monotonic() - self._warmed_at < WARM_MAX_AGE
+        if server is not None and not fresh:
+            self._close(server)
+            return None
+        return server
+
+    def send(self, msg):
+        """发送一封邮件; 优先使用预热的连接, 它已被服务器断开时重新连接一次
+
+        只在发出邮件之前(NOOP 检查预热连接时)发现断开才重新连接。连接和登录失败时原样抛出,
+        调用方可以重试; 开始发送后的任何错误都包装为 DeliveryError 抛出, 服务器可能已经
+        收下邮件, 重发会让收件人收到两封。
+        """
+        config = self.get_config()
+        smtplib = _smtplib()
+        server = self._take_warm(config)
+        if server is not None:
+            try:
+                # NOOP 在发送之前, 这里的任何错误(断开、超时、SSL 错误)都可以安全地重新连接
+                alive = server.noop()[0] == 250
+            except (smtplib.SMTPException, OSError) as e:
+                _log.info(f"预热的 SMTP 连接已失效, 重新连接: {e}")
+                alive = False
+            if not alive:
+                self._close(server)
+                server = None
+        if server is None:
+            server = self._connect(config)
+        try:
+            server.send_message(msg)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            raise DeliveryError(e, uncertain=False) from e
+        except Exception as e:
+            raise DeliveryError(e, uncertain=True) from e
+        finally:
+            self._close(server)
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            self._close(server)
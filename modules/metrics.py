@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+进程内计数
+
+同一进程托管多个机器人时共用一份计数, 按机器人(tenant)分别统计收到的消息和发送的提醒,
+定期汇总到日志, /status 中也会显示本进程的概况。
+"""
+
+import time
+from collections import Counter, defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def rss_mb() -> float:
+    """进程的峰值常驻内存(MB), 不支持的平台返回 0"""
+    if resource is None:
+        return 0.0
+    # Linux 下 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Metrics:
+    """按机器人分组的计数器"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = defaultdict(Counter)
+
+    def register(self, tenant: str):
+        """登记机器人, 没有任何计数时也会出现在汇总中"""
+        self._counters[tenant]
+
+    def incr(self, tenant: str, key: str, amount: int = 1):
+        self._counters[tenant][key] += amount
+
+    @property
+    def tenants(self) -> list:
+        return list(self._counters)
+
+    def snapshot(self) -> dict:
+        return {tenant: dict(counter) for tenant, counter in self._counters.items()}
+
+    def summary(self) -> str:
+        hours = (time.time() - self.started) / 3600
+        lines = [f"进程运行 {hours:.1f} 小时, 托管 {len(self._counters)} 个机器人, 内存峰值 {rss_mb():.0f}MB"]
+        for tenant, counter in self._counters.items():
+            counts = ", ".join(f"{key}={value}" for key, value in sorted(counter.items())) or "无"
+            lines.append(f"  {tenant}: {counts}")
+        return "\n".join(lines)
+
+
+# 进程内共享的计数
+METRICS = Metrics()
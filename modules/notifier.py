@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+管理员通知汇总
+
+原来每个事件(提醒发送成功、索引更新、每次发送失败)都单独给管理员发一封邮件。
+现在按事件级别处理:
+    - 普通事件(LEVEL_INFO): 先缓存, 每隔 digest_interval 秒合并成一封汇总邮件
+    - 严重事件(LEVEL_CRITICAL): 立即发送; 同一个 key 在 alert_window 秒内只发一次,
+      期间重复发生的次数计入下一封汇总邮件; 发送失败(SMTP 熔断或出错)的告警放回汇总缓存,
+      每隔 ALERT_RETRY 秒随汇总邮件重试, 直到发出
+同一个 key 在一个汇总周期内多次出现时只保留最近一条内容和出现次数。
+"""
+
+import time
+import asyncio
+from datetime import datetime
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+LEVEL_INFO = "info"
+LEVEL_CRITICAL = "critical"
+
+DIGEST_SUBJECT = "Admin-bot-digest"
+ALERT_SUBJECT = "Admin-bot-alert"
+# 有发送失败的告警时, 提前发送汇总邮件的间隔(秒)
+ALERT_RETRY = 300
+
+
+class _Entry:
+    __slots__ = ("content", "count", "first", "last")
+
+    def __init__(self, content: str, now: float):
+        self.content = content
+        self.count = 1
+        self.first = now
+        self.last = now
+
+
+class AdminNotifier:
+    """管理员通知汇总器
+
+    Args:
+        send: 协程函数 send(content, subject) -> bool, 实际发送邮件
+        digest_interval: 汇总邮件间隔(秒)
+        alert_window: 同一严重事件的最短告警间隔(秒)
+    """
+
+    def __init__(self, send, digest_interval: float = 3600, alert_window: float = 1800):
+        self._send = send
+        self.digest_interval = digest_interval
+        self.alert_window = alert_window
+        self._digest = {}
+        self._suppressed = {}
+        self._failed = {}
+        self._last_alert = {}
+        self._task = None
+        self._wakeup = None
+        self._retry = None
+
+    def notify(self, key: str, content: str, level: str = LEVEL_INFO):
+        """记录一个事件, 不等待邮件发送
+
+        必须在事件循环中调用; 首次调用时启动汇总任务。
+        """
+        now = time.time()
+        self._ensure_task()
+        if level == LEVEL_CRITICAL:
+            last = self._last_alert.get(key)
+            if last is None or now - last >= self.alert_window:
+                self._last_alert[key] = now
+                asyncio.get_running_loop().create_task(self._send_alert(key, content))
+                return
+            # 告警窗口内的重复事件只计数
+            self._add(self._suppressed, key, content, now)
+            return
+        self._add(self._digest, key, content, now)
+
+    @staticmethod
+    def _add(bucket: dict, key: str, content: str, now: float):
+        entry = bucket.get(key)
+        if entry is None:
+            bucket[key] = _Entry(content, now)
+        else:
+            entry.content = content
+            entry.count += 1
+            entry.last = now
+
+    def pending(self) -> int:
+        """尚未发送的事件数"""
+        return sum(e.count for bucket in (self._failed, self._digest, self._suppressed) for e in bucket.values())
+
+    async def _send_alert(self, key: str, content: str):
+        try:
+            ok = await self._send(content, ALERT_SUBJECT)
+            if not ok:
+                _log.error(f"管理员告警发送失败: {key}")
+        except Exception as e:
+            _log.error(f"管理员告警发送失败: {key}: {e}")
+            ok = False
+        if not ok:
+            # 放回缓存, SMTP 恢复后随汇总邮件发出
+            self._add(self._failed, key, content, time.time())
+            self._retry_later()
+
+    def _retry_later(self):
+        if self._retry is None or self._retry.cancelled():
+            self._retry = asyncio.get_running_loop().call_later(ALERT_RETRY, self._retry_now)
+
+    def _retry_now(self):
+        self._retry = None
+        self.request_flush()
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._digest_loop())
+
+    async def _digest_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.digest_interval)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                break
+            self._wakeup.clear()
+            await self.flush()
+
+    def format_digest(self) -> str:
+        lines = []
+        if self._failed:
+            lines.append("未能及时发出的告警:")
+            for key, entry in self._failed.items():
+                times = f" (共 {entry.count} 次)" if entry.count > 1 else ""
+                lines.append(f"[{key}] {datetime.fromtimestamp(entry.first):%m-%d %H:%M}{times}\n{entry.content}")
+        if self._suppressed:
+            if lines:
+                lines.append("")
+            lines.append("告警期间重复发生的问题:")
+            for key, entry in self._suppressed.items():
+                lines.append(f"[{key}] 又发生 {entry.count} 次, 最近一次 "
+                             f"{datetime.fromtimestamp(entry.last):%m-%d %H:%M}: {entry.content}")
+        if self._digest:
+            if lines:
+                lines.append("")
+            lines.append("事件:")
+            for key, entry in self._digest.items():
+                when = f"{datetime.fromtimestamp(entry.last):%m-%d %H:%M}"
+                times = f" (共 {entry.count} 次)" if entry.count > 1 else ""
+                lines.append(f"[{key}] {when}{times}\n{entry.content}")
+        return "\n".join(lines)
+
+    async def flush(self) -> bool:
+        """立即发送汇总邮件, 没有待发送事件时直接返回"""
+        if not self._failed and not self._digest and not self._suppressed:
+            return True
+        content = self.format_digest()
+        failed, digest, suppressed = self._failed, self._digest, self._suppressed
+        self._failed, self._digest, self._suppressed = {}, {}, {}
+        try:
+            ok = await self._send(content, DIGEST_SUBJECT)
+        except Exception as e:
+            _log.error(f"管理员汇总邮件发送失败: {e}")
+            ok = False
+        if not ok:
+            # 发送失败时放回, 下个周期再试
+            for bucket, old in ((self._failed, failed), (self._digest, digest), (self._suppressed, suppressed)):
+                for key, entry in old.items():
+                    new = bucket.get(key)
+                    if new is not None:
+                        entry.content, entry.last = new.content, new.last
+                        entry.count += new.count
+                    bucket[key] = entry
+            if self._failed:
+                self._retry_later()
+        return ok
+
+    def request_flush(self):
+        """让汇总任务尽快发送一次(例如机器人退出前)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stop(self):
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
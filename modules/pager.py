@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+列表分页
+
+/list 原来把整个名单拼成一条消息, 名单较大时超过QQ消息长度限制, 整条回复失败。
+现在按行流式生成分页: 每页正文不超过 byte_budget 字节(UTF-8), 只生成到请求的那一页为止。
+已生成的页面按数据版本缓存, 成员或假期变化后整体失效。
+"""
+
+from botpy.types.inline import Keyboard, Button, RenderData, Action, Permission, KeyboardRow
+from botpy.types.message import MarkdownPayload, KeyboardPayload
+
+# QQ 单条文本消息的安全长度, 给页眉页脚留出余量
+DEFAULT_BYTE_BUDGET = 1500
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _truncate(line: str, budget: int) -> str:
+    """按字节截断过长的单行"""
+    data = line.encode("utf-8")
+    if len(data) <= budget:
+        return line
+    return data[:max(0, budget - 3)].decode("utf-8", "ignore") + "..."
+
+
+class Page:
+    __slots__ = ("number", "text", "has_next", "total")
+
+    def __init__(self, number: int, text: str, has_next: bool, total):
+        self.number = number
+        self.text = text
+        self.has_next = has_next
+        # 总页数只有在全部生成过之后才知道, 否则为 None
+        self.total = total
+
+
+class _Cursor:
+    """某个列表在某个数据版本下的分页进度"""
+
+    __slots__ = ("version", "lines", "pages", "pending", "done")
+
+    def __init__(self, version, lines):
+        self.version = version
+        self.lines = iter(lines)
+        self.pages = []
+        self.pending = None
+        self.done = False
+
+
+class Paginator:
+    """按字节预算分页并缓存
+
+    Args:
+        byte_budget: 每页正文的最大字节数
+    """
+
+    def __init__(self, byte_budget: int = DEFAULT_BYTE_BUDGET):
+        self.byte_budget = byte_budget
+        self._cursors = {}
+
+    def page(self, key: str, version, lines_factory, number: int):
+        """取第 number 页(从1开始)的正文行, 超出范围时返回 None
+
+        lines_factory 只在数据版本变化后调用一次, 返回逐行生成的可迭代对象。
+        """
+        cursor = self._cursors.get(key)
+        if cursor is None or cursor.version != version:
+            cursor = _Cursor(version, lines_factory())
+            self._cursors[key] = cursor
+        while len(cursor.pages) < number and not cursor.done:
+            self._fill_page(cursor)
+        if number > len(cursor.pages) or (number > 1 and not cursor.pages[number - 1]):
+            return None
+        if number == len(cursor.pages) and not cursor.done and cursor.pending is None:
+            # 看一眼是否还有下一页
+            cursor.pending = next(cursor.lines, None)
+            if cursor.pending is None:
+                cursor.done = True
+        has_next = number < len(cursor.pages) or not cursor.done
+        total = len(cursor.pages) if cursor.done else None
+        return cursor.pages[number - 1], has_next, total
+
+    def _fill_page(self, cursor: _Cursor):
+        lines = []
+        used = 0
+        while True:
+            line = cursor.pending if cursor.pending is not None else next(cursor.lines, None)
+            cursor.pending = None
+            if line is None:
+                cursor.done = True
+                break
+            line = _truncate(line, self.byte_budget)
+            size = _byte_len(line) + 1
+            if lines and used + size > self.byte_budget:
+                cursor.pending = line
+                break
+            lines.append(line)
+            used += size
+        if lines or not cursor.pages:
+            cursor.pages.append(tuple(lines))
+
+    def render(self, key: str, version, lines_factory, number: int, title: str, command: str, empty: str) -> Page:
+        """生成带页眉页脚的一页; 页码超出范围时返回提示
+
+        Args:
+            title: 页眉, 如 "成员列表"
+            command: 翻页命令前缀, 如 "/list m"
+            empty: 列表为空时的提示
+        """
+        result = self.page(key, version, lines_factory, number)
+        if result is None:
+            first = self.page(key, version, lines_factory, 1)
+            if not first[0]:
+                return Page(1, empty, False, 1)
+            return Page(number, f"没有第 {number} 页", False, None)
+        lines, has_next, total = result
+        if not lines:
+            return Page(1, empty, False, 1)
+        if number == 1 and not has_next:
+            return Page(1, f"{title}:\n" + "\n".join(lines), False, 1)
+        page_info = f"第 {number}/{total} 页" if total else f"第 {number} 页"
+        footer = f"\n({page_info}, 下一页: {command} {number + 1})" if has_next else f"\n({page_info}, 已是最后一页)"
+        return Page(number, f"{title}({page_info}):\n" + "\n".join(lines) + footer, has_next, total)
+
+
+def build_page_keyboard(command: str, page: Page) -> tuple:
+    """翻页用的 markdown 和按钮, 返回 (MarkdownPayload, KeyboardPayload)"""
+    buttons = []
+    if page.number > 1:
+        buttons.append(_command_button("prev", "上一页", f"{command} {page.number - 1}"))
+    if page.has_next:
+        buttons.append(_command_button("next", "下一页", f"{command} {page.number + 1}"))
+    total = f"/{page.total}" if page.total else ""
+    markdown = MarkdownPayload(content=f"第 {page.number}{total} 页")
+    keyboard = KeyboardPayload(content=Keyboard(rows=[KeyboardRow(buttons=buttons)]))
+    return markdown, keyboard
+
+
+def _command_button(button_id: str, label: str, data: str) -> Button:
+    return Button(
+        id=button_id,
+        render_data=RenderData(label=label, visited_label=label, style=1),
+        # type=2: 点击后把 data 填入输入框作为指令; permission type=2: 所有人可点击
+        action=Action(type=2, permission=Permission(type=2, specify_role_ids=[], specify_user_ids=[]),
+                      click_limit=10, data=data, at_bot_show_channel_list=False),
+    )
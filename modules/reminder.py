@@ -4,42 +4,202 @@
 import os
 import json
 import asyncio
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 import botpy
 from botpy import logging as botpy_logging
 
+from .roster import Roster
+from .ledger import ReminderLedger, CHANNEL_EMAIL
+from .pager import Paginator
+from .breaker import CircuitBreaker, CircuitOpenError
+from .mailer import SmtpMailer, DeliveryError
+from .metrics import METRICS, rss_mb
+from .notifier import AdminNotifier, LEVEL_CRITICAL
+from .templates import TemplateSet, DEFAULT_TEMPLATES, KIND_NORMAL, KIND_PAUSE, WEEKDAY_NAMES, LANG_DEFAULT
+from .statelock import StateLock, merge_changes, normalize, read_json
+from .rotation import (RotationEngine, HolidayCalendar, STRATEGY_NAMES, STRATEGY_SEQUENTIAL,
+                       validate_rotation_state, dump_rotation_state, new_rotation_state)
+
 # 配置日志
 _log = botpy_logging.get_logger()
 
+_mail_modules = None
+
+# 提醒时间前多少秒预热 SMTP 连接
+PREWARM_LEAD = 30
+
+def _load_mail_modules():
+    """首次发送邮件时才导入 smtplib 和 MIME 相关模块, 缩短启动时间"""
+    global _mail_modules
+    if _mail_modules is None:
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        _mail_modules = (smtplib, MIMEText, MIMEMultipart)
+    return _mail_modules
+
+def _write_json_atomic(path, data):
+    """先写临时文件再替换, 避免文件监视或并发读取看到写了一半的内容"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def next_fire_time(time_str, now=None):
+    """下一次到达 HH:MM 或 HH:MM:SS 的时间(今天已过则为明天)"""
+    now = now or datetime.now()
+    parts = list(map(int, time_str.split(":"))) + [0]
+    fire = now.replace(hour=parts[0], minute=parts[1], second=parts[2], microsecond=0)
+    if now >= fire:
+        fire += timedelta(days=1)
+    return fire
+
+
+class PreparedReminder:
+    """提前渲染好的一封提醒邮件, 到点后只需发送"""
+
+    __slots__ = ("day", "member_id", "version", "recipient", "subject", "content", "message")
+
+    def __init__(self, day, member_id, version, recipient, subject, content, message):
+        self.day = day
+        self.member_id = member_id
+        # 生成时的数据版本, 成员、配置或模板变化后作废
+        self.version = version
+        self.recipient = recipient
+        self.subject = subject
+        self.content = content
+        self.message = message
+
+
+def validate_config(config):
+    """校验 config.json 的内容, 补齐可选字段
+
+    Raises:
+        ValueError: 缺少必要字段或格式错误
+    """
+    if not isinstance(config, dict):
+        raise ValueError("配置内容必须是JSON对象")
+    for key in ("reminder_time", "index_update_time", "message_templates", "email_config",
+                "enabled", "silent_mode", "holiday_whitelist"):
+        if key not in config:
+            raise ValueError(f"缺少配置项: {key}")
+    datetime.strptime(config["reminder_time"], "%H:%M")
+    datetime.strptime(config["index_update_time"], "%H:%M:%S")
+    templates = config["message_templates"]
+    if not isinstance(templates, dict) or not isinstance(templates.get("normal"), str):
+        raise ValueError("message_templates 缺少 normal 模板")
+    # 模板本身的字段在 TemplateSet 中校验
+    if not isinstance(config["email_config"], dict):
+        raise ValueError("email_config 格式错误")
+    if not isinstance(config["enabled"], bool) or not isinstance(config["silent_mode"], bool):
+        raise ValueError("enabled/silent_mode 必须是 true 或 false")
+    if not isinstance(config["holiday_whitelist"], list):
+        raise ValueError("holiday_whitelist 必须是列表")
+    for date_str in config["holiday_whitelist"]:
+        datetime.strptime(date_str, "%m-%d")
+    config.setdefault("sender?", False)
+    config.setdefault("group_open_ids", [])
+    if not isinstance(config["group_open_ids"], list):
+        raise ValueError("group_open_ids 必须是列表")
+    for key in ("admin_digest_minutes", "admin_alert_minutes"):
+        value = config.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(f"{key} 必须是正数")
+    config.setdefault("rotation_strategy", STRATEGY_SEQUENTIAL)
+    if config["rotation_strategy"] not in STRATEGY_NAMES:
+        raise ValueError(f"未知的轮换策略: {config['rotation_strategy']}")
+    weights = config.setdefault("rotation_weights", {})
+    if not isinstance(weights, dict):
+        raise ValueError("rotation_weights 必须是 成员ID -> 权重 的映射")
+    for member_id, weight in weights.items():
+        if not str(member_id).isdigit() or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"rotation_weights 格式错误: {member_id}: {weight}")
+    return config
+
+def validate_members(members_data):
+    """校验 member.json 的内容
+
+    Raises:
+        ValueError: 缺少必要字段、ID或QQ号重复
+    """
+    if not isinstance(members_data, dict) or not isinstance(members_data.get("members"), list):
+        raise ValueError("成员数据缺少 members 列表")
+    ids, qq_ids = set(), set()
+    for member in members_data["members"]:
+        if not isinstance(member, dict) or not isinstance(member.get("id"), int) \
+                or not member.get("name") or not member.get("qq_id"):
+            raise ValueError(f"成员格式错误: {member}")
+        if member["id"] in ids or member["qq_id"] in qq_ids:
+            raise ValueError(f"成员ID或QQ号重复: {member}")
+        ids.add(member["id"])
+        qq_ids.add(member["qq_id"])
+    current_index = members_data.get("current_index", 0)
+    if not isinstance(current_index, int) or current_index < 0 \
+            or (members_data["members"] and current_index >= len(members_data["members"])):
+        raise ValueError(f"current_index 越界: {current_index}")
+    members_data.setdefault("current_index", 0)
+    members_data.setdefault("last_reminder_date", "")
+    members_data["rotation"] = validate_rotation_state(members_data.get("rotation"))
+    next_id = members_data.get("next_id")
+    if next_id is not None and not isinstance(next_id, int):
+        raise ValueError(f"next_id 格式错误: {next_id}")
+    return members_data
+
 class Reminder:
     def __init__(self, client):
         self.client = client
-        # group_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "groupids", str(group_id))
-        self.config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "config.json")
-        self.members_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "member.json")
+        self._tenant = getattr(client, "tenant", "default")
+        # 数据目录来自共享的配置快照
+        settings = getattr(client, "settings", None)
+        data_dir = settings.data_dir if settings is not None else os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        self.config_path = os.path.join(data_dir, "config.json")
+        self.members_path = os.path.join(data_dir, "member.json")
+        self.ledger = ReminderLedger(data_dir)
+        # 多个进程共用数据目录时(分片、独立调度进程、主备), 写入 config.json/member.json 前取得的文件锁
+        self.state_lock = StateLock.for_data_dir(data_dir)
+        # 上次从文件读到或写入文件的内容, 写入时据此判断哪些字段是本进程修改的
+        self._config_base = None
+        self._members_base = None
+        # 成员或假期每次变化时加一, 使 /list 的分页缓存失效
+        self.data_version = 0
+        self.pager = Paginator()
         self.load_config()
         self.load_members()
+        self.smtp_breaker = CircuitBreaker("SMTP", probe=self._probe_smtp)
+        self.mailer = SmtpMailer(lambda: self.config["email_config"])
+        self.prepared = None
+        self.notifier = AdminNotifier(self.admin_send_email)
+        self._configure_notifier()
         self.scheduler_task = None
         self.update_index = None
+        # 正在进行的定时发送(取消定时任务时不会中断, 退出时等待其完成)
+        self.delivery = None
+        # 上次写入失败, 退出前需要再保存一次
+        self._config_dirty = False
+        self._members_dirty = False
+        # 为 False 时不启动定时任务(分片模式或独立调度进程时由另一个进程负责)
+        self.run_schedulers = True
+        # 独立调度进程的句柄(RemoteScheduler), 设置后 /send、/restart 交给调度进程
+        self.remote = None
+        # 主备模式的选举(LeaderElection), 定时发送前确认本实例仍是主实例
+        self.leader = None
 
     def load_config(self):
         """加载配置文件"""
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 self.config = json.load(f)
+            self._config_base = normalize(self.config)
+            # 与 validate_config 补齐的默认值一致, 否则热加载会误判轮换设置发生了变化
+            self.config.setdefault("rotation_strategy", STRATEGY_SEQUENTIAL)
+            self.config.setdefault("rotation_weights", {})
             _log.info("配置文件加载成功")
         except Exception as e:
             _log.error(f"加载配置文件失败: {e}")
             self.config = {
                 "reminder_time": "08:00",
-                "message_templates": {
-                    "normal": "今天 ({year}-{month}-{day}) 星期 {weekday} ,今天该 {name} 你扫地啦",
-                    "pause": "今天( {year}-{month}-{day} ) 星期 {weekday} ,本应该是 {name} 扫地,但轮换任务已暂停(不用扫)"
-                },
+                "message_templates": dict(DEFAULT_TEMPLATES),
                 "email_config": {
                     "smtp_server": "smtp.qq.com",
                     "smtp_port": 465,
@@ -52,155 +212,486 @@ class Reminder:
                 "enabled": True,
                 "sender?": False,
                 "silent_mode": False,
-                "holiday_whitelist": []
+                "holiday_whitelist": [],
+                "rotation_strategy": STRATEGY_SEQUENTIAL,
+                "rotation_weights": {}
             }
             self.save_config()
+        try:
+            self._set_templates(TemplateSet(self.config["message_templates"]))
+        except Exception as e:
+            _log.error(f"消息模板无效, 使用默认模板: {e}")
+            self._set_templates(TemplateSet(DEFAULT_TEMPLATES))
+
+    def _configure_notifier(self):
+        """汇总间隔和告警窗口来自 config.json 的 admin_digest_minutes / admin_alert_minutes"""
+        self.notifier.digest_interval = self.config.get("admin_digest_minutes", 60) * 60
+        self.notifier.alert_window = self.config.get("admin_alert_minutes", 30) * 60
+
+    async def _probe_smtp(self):
+        """熔断期间探测 SMTP 服务器是否恢复(只连接, 不发信)"""
+        smtplib = _load_mail_modules()[0]
+        email_config = self.config["email_config"]
+
+        def probe():
+            server = smtplib.SMTP_SSL(email_config["smtp_server"], email_config["smtp_port"], timeout=10)
+            try:
+                return server.noop()[0] == 250
+            finally:
+                server.close()
+
+        return await asyncio.get_running_loop().run_in_executor(None, probe)
+
+    def _set_templates(self, templates):
+        """替换编译好的消息模板, 并提示可能的笔误"""
+        self.templates = templates
+        for warning in templates.warnings():
+            _log.warning(f"消息模板: {warning}")
 
     def load_members(self):
         """加载成员列表"""
         try:
             with open(self.members_path, 'r', encoding='utf-8') as f:
-                self.members_data = json.load(f)
+                raw = json.load(f)
+                self._members_base = normalize(raw)
+                if self._set_members_data(validate_members(raw)):
+                    self.save_members()
             _log.info("成员列表加载成功")
         except Exception as e:
             _log.error(f"加载成员列表失败: {e}")
-            self.members_data = {
+            self._set_members_data({
                 "members": [],
                 "current_index": 0,
-                "last_reminder_date": ""
-            }
+                "last_reminder_date": "",
+                "rotation": new_rotation_state()
+            })
             self.save_members()
 
+    def _set_members_data(self, members_data):
+        """成员保存在 self.roster 中, members_data 只保留轮换状态
+
+        Returns:
+            bool: 是否补上了锚定日期(旧格式的 member.json), 需要保存
+        """
+        self.roster = Roster.from_dicts(members_data.pop("members"), members_data.pop("next_id", None))
+        self.members_data = members_data
+        self.data_version += 1
+        migrated = members_data["rotation"]["anchor"] is None
+        if migrated:
+            # 旧版本每晚推进 current_index, 它表示的就是今天的值日位置
+            members_data["rotation"]["anchor"] = date.today().isoformat()
+        self._build_rotation()
+        return migrated
+
+    def _build_rotation(self):
+        """根据当前配置和轮换状态创建轮换引擎"""
+        state = self.members_data["rotation"]
+        strategy = self.config.get("rotation_strategy", STRATEGY_SEQUENTIAL)
+        if not state["counts"]:
+            # 首次使用时以本学期的值日统计作为初始次数
+            state["counts"] = {m.id: self.ledger.member_stats(m.id)["term_ok"] for m in self.roster}
+        weights = {int(k): v for k, v in self.config.get("rotation_weights", {}).items()}
+        calendar = HolidayCalendar(self.config["holiday_whitelist"])
+        self.rotation = RotationEngine(self.roster, state, strategy, weights, calendar)
+
+    def _anchor_today(self):
+        """把锚点移到今天, 在名单、假期或轮换策略变化前调用, 保证今天的值日人员不变"""
+        today = date.today()
+        if self.rotation.anchored and self.roster:
+            self.members_data["current_index"] = self.rotation.position_on(today, self.members_data["current_index"])
+        self.members_data["rotation"]["anchor"] = today.isoformat()
+
+    def _members_payload(self):
+        """member.json 的完整内容"""
+        payload = {"members": self.roster.to_dicts(), "next_id": self.roster.next_id}
+        payload.update(self.members_data)
+        payload["rotation"] = dump_rotation_state(self.members_data["rotation"])
+        return payload
+
     def save_config(self):
         """保存配置文件"""
+        self.data_version += 1
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
+            with self.state_lock:
+                self._config_base = self._write_merged(self.config_path, self._config_base, self.config)
+                # 合并进了其他进程的修改时按热加载处理(可能需要重启定时任务)
+                if self._config_base != normalize(self.config):
+                    self.reload_config()
+            self._config_dirty = False
             _log.info("配置文件保存成功")
         except Exception as e:
+            self._config_dirty = True
             _log.error(f"保存配置文件失败: {e}")
 
     def save_members(self):
         """保存成员列表"""
+        self.data_version += 1
         try:
-            with open(self.members_path, 'w', encoding='utf-8') as f:
-                json.dump(self.members_data, f, ensure_ascii=False, indent=2)
+            with self.state_lock:
+                payload = self._members_payload()
+                self._members_base = self._write_merged(self.members_path, self._members_base, payload)
+                if self._members_base != normalize(payload):
+                    self.reload_members()
+            self._members_dirty = False
             _log.info("成员列表保存成功")
         except Exception as e:
+            self._members_dirty = True
             _log.error(f"保存成员列表失败: {e}")
 
-    def get_next_member(self, random_mode=False):
-        """获取下一个成员"""
-        if not self.members_data["members"]:
+    @staticmethod
+    def _write_merged(path, base, data):
+        """在状态锁内调用: 把本进程的修改合并到文件的当前内容上再写入, 返回写入的内容
+
+        其他进程(调度进程、主备实例、分片工作进程)在上次读取之后写入的字段不会被旧值覆盖。
+        """
+        merged = merge_changes(base, normalize(data), read_json(path))
+        _write_json_atomic(path, merged)
+        return merged
+
+    def flush_state(self):
+        """退出前重新保存写入失败的配置和成员列表
+
+        只保存本进程修改过但没有写入成功的文件, 不会用旧数据覆盖其他进程刚写入的内容。
+        """
+        if self._config_dirty:
+            self.save_config()
+        if self._members_dirty:
+            self.save_members()
+
+    def reload_config(self, path=None):
+        """重新加载被手动修改的 config.json
+
+        校验通过后整体替换当前配置, 只重启时间发生变化的定时任务;
+        内容无效时保留当前配置。
+        """
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+                config = validate_config(normalize(raw))
+            templates = None
+            if config["message_templates"] != self.config.get("message_templates"):
+                templates = TemplateSet(config["message_templates"])
+        except Exception as e:
+            _log.error(f"config.json 修改无效, 保留当前配置: {e}")
+            return False
+        self._config_base = normalize(raw)
+        if config == self.config:
+            return False
+        rotation_changed = (config["rotation_strategy"], config["rotation_weights"], config["holiday_whitelist"]) != \
+            (self.config.get("rotation_strategy"), self.config.get("rotation_weights"), self.config.get("holiday_whitelist"))
+        if rotation_changed:
+            self._anchor_today()
+        old_config = self.config
+        self.config = config
+        self.data_version += 1
+        if templates is not None:
+            self._set_templates(templates)
+        self._configure_notifier()
+        _log.info("config.json 已重新加载")
+        if rotation_changed:
+            self._build_rotation()
+            self.save_members()
+        if config["reminder_time"] != old_config.get("reminder_time") and self.scheduler_task is not None:
+            asyncio.create_task(self.start_reminder(self.client))
+        if config["index_update_time"] != old_config.get("index_update_time") and self.update_index is not None:
+            asyncio.create_task(self.start_update_index(self.client))
+        return True
+
+    def reload_members(self, path=None):
+        """重新加载被手动修改的 member.json, 内容无效时保留当前成员列表"""
+        try:
+            with open(self.members_path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+                members_data = validate_members(normalize(raw))
+        except Exception as e:
+            _log.error(f"member.json 修改无效, 保留当前成员列表: {e}")
+            return False
+        self._members_base = normalize(raw)
+        members_data.setdefault("next_id", self.roster.next_id)
+        if dict(members_data, rotation=dump_rotation_state(members_data["rotation"])) == self._members_payload():
+            return False
+        self._set_members_data(members_data)
+        _log.info("member.json 已重新加载")
+        return True
+
+    def refresh(self):
+        """读入其他进程写入的修改(执行会修改数据的命令前调用, 不必等文件监视器)"""
+        with self.state_lock:
+            self.reload_config()
+            self.reload_members()
+
+    def tasks_running(self):
+        """定时提醒和索引更新任务是否都在运行"""
+        return all(task is not None and not task.done() for task in (self.scheduler_task, self.update_index))
+
+    def current_member(self, day=None):
+        """当前(或 day 当天)值日成员(考虑互换), 没有成员时返回 None
+
+        顺序轮换时, 假期返回其后第一个非假期日的值日成员。
+        """
+        if not self.roster:
             return None
-            
-        if random_mode:
-            # 随机模式
-            import random
-            return random.choice(self.members_data["members"])
+        # 确保 current_index 在有效范围内
+        if self.members_data["current_index"] >= len(self.roster):
+            self.members_data["current_index"] = 0
+            self.save_members()
+        if self.rotation.anchored:
+            day = self.rotation.next_duty_day(day or date.today())
+            return self.rotation.on(day, self.members_data["current_index"])
+        return self.rotation.current(self.members_data["current_index"])
+
+    def get_next_member(self, day=None):
+        """按轮换策略预测下一位值日成员, 不修改状态"""
+        if self.rotation.anchored:
+            if not self.roster:
+                return None
+            return self.current_member((day or date.today()) + timedelta(days=1))
+        return self.rotation.peek(self.members_data["current_index"], day)
+
+    def _confirm_leader(self) -> bool:
+        """主备模式下写入共享状态前确认仍持有租约(发送或等待期间可能已被备用实例接管)"""
+        return self.leader is None or self.leader.lease.confirm()
+
+    def _delivery_failed(self, member, today_str, attempt, force_send, paused, error):
+        """开始发送之后出错: 不再重试, 记录结果并立即告警
+
+        结果未知(服务器可能已收下)时同时记为今天已发送, 定时任务、主备接管都不会再补发,
+        由管理员确认后用 /send 手动补发。
+        """
+        self.ledger.record(member.id, CHANNEL_EMAIL, False, attempt, date.fromisoformat(today_str),
+                           forced=force_send, paused=paused, uncertain=error.uncertain)
+        METRICS.incr(self._tenant, "reminders_failed")
+        if error.uncertain:
+            self._record_sent(today_str, force_send)
+            text = (f"发送给 {member.name}({member.id}) 的提醒邮件在发送过程中出错, 服务器可能已经收下, "
+                    f"为避免重复不再重发, 请确认是否送达(未送达时用 /send 补发): {error}")
+            self.notifier.notify("reminder.uncertain", text, LEVEL_CRITICAL)
         else:
-            # 顺序模式
-            current_index = self.members_data["current_index"]
-            next_index = (current_index + 1) % len(self.members_data["members"])
-            return self.members_data["members"][next_index]
+            text = f"服务器拒收了发送给 {member.name}({member.id}) 的提醒邮件, 不再重试: {error}"
+            self.notifier.notify("reminder.rejected", text, LEVEL_CRITICAL)
+        _log.error(text)
+
+    def _record_sent(self, today_str, force_send):
+        """记录今天已发送
+
+        定时发送期间失去租约时, 新的主实例可能已经读取了 member.json: 仍然写入发送日期(合并写入,
+        不覆盖新主实例的其他修改), 以免其再补发一次, 并提醒管理员检查是否重复发送。
+        """
+        if not force_send and not self._confirm_leader():
+            _log.warning("发送期间本实例已不是主实例, 只记录今天已发送")
+            self.notifier.notify("reminder.lease_lost", f"发送 {today_str} 的提醒期间主实例已切换, 请检查是否重复发送", LEVEL_CRITICAL)
+        self.members_data["last_reminder_date"] = today_str
+        self.save_members()
+
+    def advance_rotation(self, day=None):
+        """切换到下一值日人员并保存, 返回新的值日成员
+
+        顺序轮换不需要每晚推进, 这里只用于 /next 手动顺延: 把锚点移到今天并后移一位。
+        """
+        if not self.roster:
+            return None
+        if self.rotation.anchored:
+            day = day or date.today()
+            # 从今天实际值日的人(可能是代班)之后一位开始
+            position = self.roster.position_of(self.current_member(day).id)
+            self.members_data["current_index"] = (position + 1) % len(self.roster)
+            self.members_data["rotation"]["anchor"] = day.isoformat()
+            self.save_members()
+            return self.current_member(day)
+        position, member = self.rotation.advance(self.members_data["current_index"], day)
+        self.members_data["current_index"] = position
+        self.members_data["rotation"]["anchor"] = (day or date.today()).isoformat()
+        self.save_members()
+        return member
+
+    def member_on(self, day_str):
+        """查询某天的值日人员, 支持 MM-DD、YYYY-MM-DD 和相对天数(如 +3、-1)"""
+        today = date.today()
+        try:
+            if day_str[:1] in "+-" and day_str[1:].isdigit():
+                day = today + timedelta(days=int(day_str))
+            elif len(day_str) == 5:
+                day = datetime.strptime(f"{today.year}-{day_str}", "%Y-%m-%d").date()
+            else:
+                day = date.fromisoformat(day_str)
+        except ValueError:
+            return False, "日期格式错误,请使用MM-DD、YYYY-MM-DD或+天数"
+        if not self.roster:
+            return False, "当前没有成员"
+        label = f"{day.isoformat()} 星期{WEEKDAY_NAMES[LANG_DEFAULT][day.weekday()]}"
+        if self.rotation.calendar.is_holiday(day):
+            return True, f"{label} 是假期,不用值日"
+        if not self.rotation.anchored and day != today:
+            if day == today + timedelta(days=1):
+                member = self.get_next_member()
+                return True, f"{label} 预计值日: {member.name}(ID:{member.id})"
+            return False, f"{STRATEGY_NAMES[self.rotation.strategy.name]}的结果取决于之前的值日情况,只能查询今天和明天"
+        member = self.current_member(day)
+        return True, f"{label} 值日: {member.name}(ID:{member.id})"
 
     def is_holiday(self):
         """检查今天是否是假期"""
-        today = datetime.now().strftime("%m-%d")
-        return today in self.config["holiday_whitelist"]
+        return self.rotation.calendar.is_holiday(date.today())
+
+    def _build_message(self, recipient_email: str, subject: str, content: str):
+        """构建邮件对象"""
+        MIMEText, MIMEMultipart = _load_mail_modules()[1:]
+        msg = MIMEMultipart()
+        msg['From'] = self.config["email_config"]["sender_email"]
+        msg['To'] = recipient_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(content, 'plain', 'utf-8'))
+        return msg
+
+    def _smtp_address(self):
+        email_config = self.config["email_config"]
+        return f"{email_config['smtp_server']}:{email_config.get('smtp_port', 465)}"
 
-    async def send_email(self, recipient_email: str, subject: str, content: str) -> bool:
+    async def _deliver(self, msg):
+        """通过 SMTP 发送(优先使用预热的连接), 在线程池中执行, 不阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(None, self.mailer.send, msg)
+
+    async def send_email(self, recipient_email: str, subject: str, content: str, message=None) -> bool:
         """发送邮件
         
         Args:
             recipient_email: 收件人邮箱
             subject: 邮件主题
             content: 邮件内容
+            message: 可选, 提前构建好的邮件对象
             
         Returns:
-            bool: 是否发送成功
+            bool: 是否发送成功; 返回 False 时邮件一定没有发出(连接、登录失败等), 可以重试
+
+        Raises:
+            DeliveryError: 开始发送之后出错, 不应重发
         """
+        if not self.smtp_breaker.allow():
+            _log.warning(f"SMTP 熔断中, 跳过发送邮件到: {recipient_email}")
+            return False
+        smtplib = _load_mail_modules()[0]
         try:
-            # 创建邮件对象
-            msg = MIMEMultipart()
-            msg['From'] = self.config["email_config"]["sender_email"]
-            msg['To'] = recipient_email
-            msg['Subject'] = subject
-            
-            # 添加邮件内容
-            msg.attach(MIMEText(content, 'plain', 'utf-8'))
-            
-            # 使用SSL连接SMTP服务器
-            _log.info(f"正在连接SMTP服务器: {self.config['email_config']['smtp_server']}:465")
-            server = smtplib.SMTP_SSL(self.config["email_config"]["smtp_server"], 465)
-            server.set_debuglevel(1)  # 启用调试模式
-            
-            _log.info("正在登录SMTP服务器...")
-            server.login(self.config["email_config"]["sender_email"], self.config["email_config"]["sender_password"])
-            _log.info("SMTP登录成功")
+            # 创建邮件对象(提前渲染过时直接使用)
+            msg = message if message is not None else self._build_message(recipient_email, subject, content)
             
             _log.info(f"正在发送邮件到: {recipient_email}")
-            server.send_message(msg)
+            # 发送开始的标记, develop/logquery.py smtp 以它和"邮件发送成功"计算耗时
+            _log.info(f"正在连接SMTP服务器: {self._smtp_address()}")
+            await self._deliver(msg)
             _log.info("邮件发送成功")
             
-            server.quit()
+            self.smtp_breaker.record_success()
             return True
             
+        except DeliveryError as e:
+            _log.error(f"发送邮件过程中出错: {e}")
+            self.smtp_breaker.record_failure(e)
+            raise
         except smtplib.SMTPAuthenticationError as e:
             _log.error(f"SMTP认证失败: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
         except smtplib.SMTPException as e:
             _log.error(f"SMTP错误: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
         except Exception as e:
             _log.error(f"发送邮件失败: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
 
-    async def admin_send_email(self, content: str) -> bool:
-        """发送管理员邮件
+    async def admin_send_email(self, content: str, subject: str = "Admin-bot-log-condition-email") -> bool:
+        """发送管理员邮件, 一般通过 self.notifier 汇总后调用
         
         Args:
             content: 邮件内容
+            subject: 邮件主题
             
         Returns:
             bool: 是否发送成功
         """
+        if not self.smtp_breaker.allow():
+            _log.warning("SMTP 熔断中, 跳过发送管理员邮件")
+            return False
+        smtplib = _load_mail_modules()[0]
         try:
             # 创建邮件对象
-            msg = MIMEMultipart()
-            msg['From'] = self.config["email_config"]["sender_email"]
-            msg['To'] = self.config["email_config"]["admin_email"]
-            msg['Subject'] = "Admin-bot-log-condition-email"
-            
-            # 添加邮件内容
-            msg.attach(MIMEText(content, 'plain', 'utf-8'))
-            
-            # 使用SSL连接SMTP服务器
-            _log.info(f"正在连接SMTP服务器: {self.config['email_config']['smtp_server']}:{self.config['email_config']['smtp_port']}")
-            server = smtplib.SMTP_SSL(self.config["email_config"]["smtp_server"], self.config['email_config']['smtp_port'])
-            server.set_debuglevel(0)  # 关闭调试模式
-            
-            _log.info("正在登录SMTP服务器...")
-            server.login(self.config["email_config"]["sender_email"], self.config["email_config"]["sender_password"])
-            _log.info("SMTP登录成功")
+            msg = self._build_message(self.config["email_config"]["admin_email"], subject, content)
             
             _log.info(f"正在发送邮件到admin: {msg['To']}")
-            server.send_message(msg)
+            _log.info(f"正在连接SMTP服务器: {self._smtp_address()}")
+            await self._deliver(msg)
             _log.info("邮件发送成功")
             
-            server.quit()
+            self.smtp_breaker.record_success()
             return True
             
         except smtplib.SMTPAuthenticationError as e:
             _log.error(f"SMTP认证失败: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
         except smtplib.SMTPException as e:
             _log.error(f"SMTP错误: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
         except Exception as e:
             _log.error(f"发送邮件失败: {e}")
+            self.smtp_breaker.record_failure(e)
             return False
 
+    def prepare_reminder(self, day=None):
+        """提前渲染并校验 day(默认下一次提醒的日期)的提醒邮件
+
+        在索引更新后调用, 模板或成员信息有问题时提前几个小时就能发现, 到点时只需发送。
+
+        Returns:
+            PreparedReminder, 当天不需要提醒时返回 None
+
+        Raises:
+            Exception: 渲染或构建邮件失败
+        """
+        self.prepared = None
+        day = day or next_fire_time(self.config["reminder_time"]).date()
+        if not self.config["enabled"] or self.config["silent_mode"] or self.rotation.calendar.is_holiday(day) \
+                or self.members_data["last_reminder_date"] == day.isoformat():
+            return None
+        member = self.current_member(day)
+        if member is None:
+            return None
+        if not str(member.qq_id).isdigit():
+            raise ValueError(f"成员 {member.name} 的QQ号无效: {member.qq_id}")
+        content = self.templates.render(KIND_NORMAL, member, day)
+        recipient = f"{member.qq_id}@qq.com"
+        subject = self.config["email_config"]["subject"]
+        message = self._build_message(recipient, subject, content)
+        self.prepared = PreparedReminder(day, member.id, self.data_version, recipient, subject, content, message)
+        return self.prepared
+
+    def _take_prepared(self, day, member):
+        """取出仍然有效的预渲染邮件, 过期或不匹配时返回 None"""
+        prepared, self.prepared = self.prepared, None
+        if prepared is None or (prepared.day, prepared.member_id, prepared.version) != \
+                (day, member.id, self.data_version):
+            return None
+        return prepared
+
+    async def _prewarm(self, day):
+        """提醒前的准备: 确认邮件已预渲染, 并预热 SMTP 连接"""
+        try:
+            prepared = self.prepared
+            if prepared is None or prepared.day != day or prepared.version != self.data_version:
+                prepared = self.prepare_reminder(day)
+        except Exception as e:
+            _log.error(f"预渲染提醒失败, 到点时将重新生成: {e}")
+            return
+        if prepared is None or self.smtp_breaker.is_open:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.mailer.prewarm)
+        except Exception as e:
+            # 预热失败不影响发送, 到点时照常现连现发
+            _log.warning(f"SMTP 连接预热失败: {e}")
+
     async def send_reminder(self, client: botpy.Client, force_send=False):
         """发送提醒消息
         
@@ -208,10 +699,16 @@ class Reminder:
             client: botpy客户端实例
             force_send: 是否强制发送,忽略日期检查
         """
-        if not self.config["enabled"]:
-            _log.info("提醒功能已禁用,不发送提醒")
+        if self.remote is not None:
+            # 由独立的调度进程发送, 网关进程不做 SMTP
+            result = await self.remote.call("send", force=force_send)
+            if result is None:
+                raise RuntimeError("调度进程未响应, 提醒已排队, 调度进程恢复后发送")
+            if not result[0]:
+                raise RuntimeError(result[1])
+            # 读入调度进程写入的发送日期
+            self.reload_members()
             return
-            
         if self.config["silent_mode"]:
             _log.info("静默模式已启用,不发送提醒")
             return
@@ -229,52 +726,46 @@ class Reminder:
             return
             
         # 获取当前成员
-        if not self.members_data["members"]:
+        current_member = self.current_member()
+        if current_member is None:
             _log.error("没有可用的成员")
             return
-            
-        current_member = self.members_data["members"][self.members_data["current_index"]]
-        
-        # 准备消息内容
-        weekday_names = ["一", "二", "三", "四", "五", "六", "日"]
-        weekday = weekday_names[today.weekday()]
         
         max_retries = 3
         retry_delay = 5  # 初始重试延迟（秒）
         
         if self.config["enabled"]:
-            template = self.config["message_templates"]["normal"]
-            message = template.format(
-                year=today.year,
-                month=today.month,
-                day=today.day,
-                weekday=weekday,
-                name=current_member["name"]
-            )
+            prepared = self._take_prepared(today.date(), current_member)
+            if prepared is not None:
+                message = prepared.content
+            else:
+                message = self.templates.render(KIND_NORMAL, current_member, today.date())
             
             # 发送邮件提醒
             for attempt in range(max_retries):
                 try:
-                    _log.info(f"尝试发送提醒给 {current_member['name']} (尝试 {attempt+1}/{max_retries})")
+                    if self.smtp_breaker.is_open:
+                        raise CircuitOpenError(self.smtp_breaker.name)
+                    _log.info(f"尝试发送提醒给 {current_member.name} (尝试 {attempt+1}/{max_retries})")
                     
                     # 构建收件人邮箱（QQ邮箱格式）
-                    recipient_email = f"{current_member['qq_id']}@qq.com"
+                    recipient_email = f"{current_member.qq_id}@qq.com"
                     
                     # 发送邮件
                     success = await self.send_email(
                         recipient_email=recipient_email,
                         subject=self.config["email_config"]["subject"],
-                        content=message
+                        content=message,
+                        message=prepared.message if prepared is not None else None
                     )
+                    self.ledger.record(current_member.id, CHANNEL_EMAIL, success, attempt + 1,
+                                       today.date(), forced=force_send)
                     
                     if success:
-                        _log.info(f"成功发送提醒邮件给 {current_member['name']}({current_member['id']})")
+                        _log.info(f"成功发送提醒邮件给 {current_member.name}({current_member.id})")
+                        METRICS.incr(self._tenant, "reminders_sent")
                         # 更新最后提醒日期
-                        self.members_data["last_reminder_date"] = today_str
-                        self.save_members()
-                        #更新发送状态
-                        self.config["sender?"] = True
-                        self.save_config()
+                        self._record_sent(today_str, force_send)
                         #管理员提醒邮件
                         #创建今天的索引更新时间 
                         now = datetime.now()
@@ -284,31 +775,41 @@ class Reminder:
                         if now >= next_update:
                             next_update += timedelta(days=1)
                         
-                        current_member = self.members_data["members"][self.members_data["current_index"]]
                         wait_seconds = (next_update - now).total_seconds()
-                        #管理员提醒邮件
-                        await self.admin_send_email(f"机器人成功发送提醒邮件给 {current_member['name']}({current_member['id']}),等待 {wait_seconds} 秒后更新索引到下一个成员\n{self.get_status()}\n")
+                        #管理员提醒(计入汇总邮件)
+                        self.notifier.notify("reminder.sent", f"机器人成功发送提醒邮件给 {current_member.name}({current_member.id}),等待 {wait_seconds} 秒后更新索引到下一个成员\n{self.get_status()}\n")
                         return
                     else:
                         raise Exception("发送邮件失败")
                         
+                except DeliveryError as e:
+                    # 已开始发送, 重试可能让成员收到两封
+                    self._delivery_failed(current_member, today_str, attempt + 1, force_send, False, e)
+                    raise
                 except Exception as e:
+                    if self.smtp_breaker.is_open:
+                        # SMTP 已熔断, 不再退避重试, 交给调度器等待恢复后补发
+                        raise CircuitOpenError(self.smtp_breaker.name) from e
                     if attempt < max_retries - 1:
                         _log.warning(f"发送提醒失败 (尝试 {attempt+1}/{max_retries}): {e}, {retry_delay}秒后重试")
                         await asyncio.sleep(retry_delay)
                         retry_delay *= 2  # 指数退避
                     else:
                         _log.error(f"发送提醒最终失败: {e}")
-                        await self.admin_send_email(f"发送提醒最终失败: {e}")
+                        METRICS.incr(self._tenant, "reminders_failed")
+                        self.notifier.notify("reminder.failed", f"发送提醒最终失败: {e}", LEVEL_CRITICAL)
                         raise e  # 重新抛出异常,让调用者知道发送失败
         else:
-            template = self.config["message_templates"]["pause"]
-            message = template.format(name=current_member["name"])
+            # 提醒功能暂停(/off)时, 当天的值日成员收到"今天不用扫"的通知, 并按暂停记入提醒记录
+            _log.info("提醒功能已暂停,发送暂停通知")
+            message = self.templates.render(KIND_PAUSE, current_member, today.date())
             
             for attempt in range(max_retries):
                 try:
+                    if self.smtp_breaker.is_open:
+                        raise CircuitOpenError(self.smtp_breaker.name)
                     # 构建收件人邮箱（QQ邮箱格式）
-                    recipient_email = f"{current_member['qq_id']}@qq.com"
+                    recipient_email = f"{current_member.qq_id}@qq.com"
                     
                     # 发送邮件
                     success = await self.send_email(
@@ -316,21 +817,29 @@ class Reminder:
                         subject=self.config["email_config"]["subject"],
                         content=message
                     )
+                    self.ledger.record(current_member.id, CHANNEL_EMAIL, success, attempt + 1,
+                                       today.date(), forced=force_send, paused=True)
                     
                     if success:
-                        _log.info("已发送暂停提醒邮件")
+                        _log.info(f"已发送暂停提醒邮件给 {current_member.name}({current_member.id})")
+                        self._record_sent(today_str, force_send)
                         return
                     else:
                         raise Exception("发送邮件失败")
                         
+                except DeliveryError as e:
+                    self._delivery_failed(current_member, today_str, attempt + 1, force_send, True, e)
+                    raise
                 except Exception as e:
+                    if self.smtp_breaker.is_open:
+                        raise CircuitOpenError(self.smtp_breaker.name) from e
                     if attempt < max_retries - 1:
                         _log.warning(f"发送暂停提醒失败 (尝试 {attempt+1}/{max_retries}): {e}, {retry_delay}秒后重试")
                         await asyncio.sleep(retry_delay)
                         retry_delay *= 2  # 指数退避
                     else:
                         _log.error(f"发送暂停提醒最终失败: {e}")
-                        await self.admin_send_email(f"发送暂停提醒最终失败: {e}")
+                        self.notifier.notify("reminder.pause_failed", f"发送暂停提醒最终失败: {e}", LEVEL_CRITICAL)
                         raise e  # 重新抛出异常,让调用者知道发送失败
     async def update_indexer(self, client):
         while True:
@@ -350,25 +859,40 @@ class Reminder:
                 if now >= next_update:
                     next_update += timedelta(days=1)
                 
-                # current_member = self.members_data["members"][self.members_data["current_index"]]
+                # current_member = self.current_member()
                 wait_seconds = (next_update - now).total_seconds()
                 _log.info(f"等待 {wait_seconds} 秒后更新索引到下一个成员")
                 #管理员提醒邮件
-                # await self.admin_send_email(f"机器人成功发送提醒邮件给 {current_member['name']}({current_member['id']}),等待 {wait_seconds} 秒后更新索引到下一个成员\n{self.get_status()}\n")
+                # await self.admin_send_email(f"机器人成功发送提醒邮件给 {current_member.name}({current_member.id}),等待 {wait_seconds} 秒后更新索引到下一个成员\n{self.get_status()}\n")
                 # 等待索引更新时间
                 await asyncio.sleep(wait_seconds)
                 #定时器触发
                 _log.info("索引更新器触发,准备更新索引")
                 #更新索引
-                current_index = self.members_data["current_index"]
-                next_index = (current_index + 1) % len(self.members_data["members"])
-                self.members_data["current_index"] = next_index
-                _log.info(f"索引已更新:{current_index + 1} -> {next_index + 1}")
-                await self.admin_send_email(f"值日索引已更新:{current_index + 1} -> {next_index + 1}")
-                #更新发送状态
-                self.config["sender?"] = False
-                self.save_members()
-                self.save_config()
+                if self.rotation.anchored:
+                    # 顺序轮换按日期直接计算, 不需要修改和保存索引
+                    current = self.current_member()
+                    if current is not None:
+                        _log.info(f"日期锚定轮换, 今日值日: {current.name}(ID:{current.id})")
+                elif not self._confirm_leader():
+                    _log.warning("本实例已不是主实例, 放弃本次索引更新")
+                else:
+                    with self.state_lock:
+                        # 在锁内读入最新的索引再推进, 不会在其他实例已推进的基础上再推进一次
+                        self.reload_members()
+                        previous = self.current_member()
+                        next_member = self.advance_rotation(date.today())
+                    if next_member is not None:
+                        _log.info(f"索引已更新:{previous.name} -> {next_member.name}(ID:{next_member.id})")
+                        self.notifier.notify("index.updated", f"值日索引已更新:{previous.name} -> {next_member.name}(ID:{next_member.id})")
+                # 预渲染下一次提醒, 有问题时提前告警而不是到点才失败
+                try:
+                    prepared = self.prepare_reminder()
+                    if prepared is not None:
+                        _log.info(f"已预渲染 {prepared.day.isoformat()} 的提醒: {prepared.recipient}")
+                except Exception as e:
+                    _log.error(f"预渲染提醒失败: {e}")
+                    self.notifier.notify("reminder.prepare_failed", f"下一次提醒无法生成, 请检查模板和成员信息: {e}", LEVEL_CRITICAL)
                 #短时间等待,防止重复发送
                 await asyncio.sleep(120)
             except asyncio.CancelledError:
@@ -380,6 +904,7 @@ class Reminder:
                 
                 if retry_count1 >= max_retry:
                     _log.critical(f"定时器在 {max_retry} 次尝试后仍然失败,等待较长时间后重试")
+                    self.notifier.notify("index.failed", f"索引更新在 {max_retry} 次尝试后仍然失败: {e}", LEVEL_CRITICAL)
                     retry_count1 = 0
                     await asyncio.sleep(3600)  # 出错多次后等待一小时再继续
                 else:
@@ -392,30 +917,30 @@ class Reminder:
         
         while True:
             try:
-                now = datetime.now()
-                reminder_time_str = self.config["reminder_time"]
-                reminder_hour, reminder_minute = map(int, reminder_time_str.split(":"))
-                
-                # 创建今天的提醒时间
-                next_reminder = now.replace(hour=reminder_hour, minute=reminder_minute, second=0, microsecond=0)
-                
-                # 如果已经过了今天的提醒时间,设置为明天
-                if now >= next_reminder:
-                    next_reminder = next_reminder + timedelta(days=1)
+                # 下一次提醒时间(今天已过则为明天)
+                next_reminder = next_fire_time(self.config["reminder_time"])
                 
                 # 计算等待时间
-                wait_seconds = (next_reminder - now).total_seconds()
+                wait_seconds = (next_reminder - datetime.now()).total_seconds()
                 _log.info(f"下一次提醒将在 {next_reminder.strftime('%Y-%m-%d %H:%M:%S')} 发送,等待 {wait_seconds:.2f} 秒")
                 
+                # 提前一点预渲染邮件并建立 SMTP 连接, 到点后只剩发送
+                if wait_seconds > PREWARM_LEAD:
+                    await asyncio.sleep(wait_seconds - PREWARM_LEAD)
+                    await self._prewarm(next_reminder.date())
+                
                 # 等待到提醒时间
-                await asyncio.sleep(wait_seconds)
+                await asyncio.sleep(max(0.0, (next_reminder - datetime.now()).total_seconds()))
                 
                 # 重置重试计数
                 retry_count = 0
                 
-                # 发送提醒
+                # 发送提醒; 发送在单独的任务中进行, 取消定时器(重启任务、退出)时不会中断正在进行的发送
                 _log.info("定时器触发,准备发送提醒")
-                await self.send_reminder(self.client)
+                self.delivery = asyncio.ensure_future(self._send_when_available())
+                # 定时器已被取消时由这里取走异常(发送失败已在 send_reminder 中记录)
+                self.delivery.add_done_callback(lambda task: task.cancelled() or task.exception())
+                await asyncio.shield(self.delivery)
                 
                 # 记录成功发送的日志
                 _log.info("提醒已成功发送")
@@ -432,13 +957,32 @@ class Reminder:
                 
                 if retry_count >= max_retries:
                     _log.critical(f"定时器在 {max_retries} 次尝试后仍然失败,等待较长时间后重试")
+                    self.notifier.notify("scheduler.failed", f"定时提醒在 {max_retries} 次尝试后仍然失败: {e}", LEVEL_CRITICAL)
                     retry_count = 0
                     await asyncio.sleep(3600)  # 出错多次后等待一小时再继续
                 else:
                     await asyncio.sleep(60 * retry_count)  # 重试前等待时间逐渐增加
 
+    async def _send_when_available(self, max_wait=6 * 3600):
+        """发送今天的提醒; SMTP 熔断时等待其恢复后补发, 最多等待 max_wait 秒"""
+        deadline = asyncio.get_running_loop().time() + max_wait
+        while True:
+            if not self._confirm_leader():
+                _log.warning("本实例已不是主实例, 放弃本次定时发送")
+                return
+            try:
+                await self.send_reminder(self.client)
+                return
+            except CircuitOpenError as e:
+                remaining = deadline - asyncio.get_running_loop().time()
+                _log.warning(f"{e}, 等待恢复后补发提醒")
+                if remaining <= 0 or not await self.smtp_breaker.wait_available(remaining):
+                    raise
+
     async def start_reminder(self, client):
         """启动定时调度器"""
+        if not self.run_schedulers:
+            return
         if self.scheduler_task is not None:
             self.scheduler_task.cancel()  
 
@@ -446,6 +990,8 @@ class Reminder:
         _log.info("定时提醒调度器已启动")
         
     async def start_update_index(self, client):
+        if not self.run_schedulers:
+            return
         if self.update_index is not None:
             self.update_index.cancel()
         
@@ -454,47 +1000,92 @@ class Reminder:
 
     def add_member(self, name, qq_id):
         """添加成员"""
-        # 检查成员是否已存在
-        for member in self.members_data["members"]:
-            if member["qq_id"] == qq_id:
-                return False, "该成员已存在"
-                
-        # 生成新ID
-        new_id = 1
-        if self.members_data["members"]:
-            new_id = max(member["id"] for member in self.members_data["members"]) + 1
-            
-        # 添加新成员
-        self.members_data["members"].append({
-            "id": new_id,
-            "name": name,
-            "qq_id": qq_id
-        })
+        return self.add_members_bulk([(name, qq_id)])
+
+    def add_members_bulk(self, rows):
+        """批量添加成员
+
+        先校验全部行, 有任何一行格式错误或批内QQ号重复则整批不做修改;
+        已存在的成员跳过。全部通过后一次性追加并只保存一次。
+
+        Args:
+            rows: [(name, qq_id), ...]
+
+        Returns:
+            (bool, str): 是否有成员被添加, 汇总信息
+        """
+        errors, seen, skipped, to_add = [], set(), [], []
+        for line_no, (name, qq_id) in enumerate(rows, 1):
+            name, qq_id = str(name).strip(), str(qq_id).strip()
+            if not name:
+                errors.append(f"第{line_no}行: 名字为空")
+            elif not qq_id.isdigit() or not 5 <= len(qq_id) <= 11:
+                errors.append(f"第{line_no}行: QQ号格式错误 {qq_id}")
+            elif qq_id in seen:
+                errors.append(f"第{line_no}行: QQ号 {qq_id} 在本次导入中重复")
+            elif self.roster.get_by_qq(qq_id) is not None:
+                skipped.append(name)
+            else:
+                to_add.append((name, qq_id))
+            seen.add(qq_id)
+
+        if errors:
+            if len(rows) == 1:
+                return False, errors[0].split(": ", 1)[1]
+            shown = "\n".join(errors[:10])
+            more = f"\n...另有 {len(errors) - 10} 处错误" if len(errors) > 10 else ""
+            return False, f"导入失败,未做任何修改:\n{shown}{more}"
+        if not to_add:
+            return False, "该成员已存在" if len(rows) == 1 else f"全部 {len(skipped)} 名成员已存在,未做修改"
+
+        # ID 由名单的单调计数器生成
+        self._anchor_today()
+        first_id = self.roster.next_id
+        for name, qq_id in to_add:
+            self.roster.add(name, qq_id)
+        next_id = self.roster.next_id
         self.save_members()
-        return True, f"成功添加成员 {name}(ID:{new_id})"
+
+        if len(rows) == 1:
+            return True, f"成功添加成员 {to_add[0][0]}(ID:{first_id})"
+        msg = f"成功添加 {len(to_add)} 名成员(ID:{first_id}-{next_id - 1})"
+        if skipped:
+            msg += f",跳过已存在的 {len(skipped)} 名: {', '.join(skipped)}"
+        return True, msg
+
+    def export_members(self):
+        """以 name,qq 的格式导出成员列表, 可直接用于 /addm 批量导入"""
+        if not self.roster:
+            return "当前没有成员"
+        return "\n".join(f"{member.name},{member.qq_id}" for member in self.roster)
 
     def remove_member(self, qq_id):
         """删除成员"""
-        original_count = len(self.members_data["members"])
-        self.members_data["members"] = [
-            member for member in self.members_data["members"] 
-            if member["qq_id"] != qq_id
-        ]
-        
-        if len(self.members_data["members"]) < original_count:
-            # 确保current_index不会越界
-            if self.members_data["members"]:
-                self.members_data["current_index"] = min(
-                    self.members_data["current_index"],
-                    len(self.members_data["members"]) - 1
-                )
-            else:
-                self.members_data["current_index"] = 0
-                
-            self.save_members()
-            return True, "成员删除成功"
-        else:
+        member = self.roster.get_by_qq(qq_id)
+        if member is None:
             return False, "未找到该成员"
+        self._remove_from_roster(member.id)
+        self.save_members()
+        return True, "成员删除成功"
+
+    def _remove_from_roster(self, member_id):
+        """从名单删除成员并修正 current_index, 返回是否删除成功
+
+        删除排在当前值日生之前的成员时索引前移一位, 保证当前值日生不变;
+        删除当前值日生时由其后一位接替。
+        """
+        if self.roster.get(member_id) is None:
+            return False
+        self._anchor_today()
+        self.rotation.forget(member_id)
+        position = self.roster.remove(member_id)
+        current_index = self.members_data["current_index"]
+        if position < current_index:
+            current_index -= 1
+        if current_index >= len(self.roster):
+            current_index = 0
+        self.members_data["current_index"] = current_index
+        return True
 
     def add_holiday(self, date_str):
         """添加假期"""
@@ -505,17 +1096,59 @@ class Reminder:
             if date_str in self.config["holiday_whitelist"]:
                 return False, "该日期已在假期列表中"
                 
+            self._anchor_today()
             self.config["holiday_whitelist"].append(date_str)
-            self.save_config()
+            self._holidays_changed()
             return True, f"成功添加假期 {date_str}"
         except ValueError:
             return False, "日期格式错误,请使用MM-DD格式"
         
+    def add_holidays_bulk(self, dates):
+        """批量添加假期, 任一日期格式错误则整批不做修改, 已存在的日期跳过"""
+        errors = []
+        for date_str in dates:
+            try:
+                datetime.strptime(date_str, "%m-%d")
+            except ValueError:
+                errors.append(date_str)
+        if errors:
+            return False, f"日期格式错误,请使用MM-DD格式,未做任何修改: {', '.join(errors)}"
+        whitelist = self.config["holiday_whitelist"]
+        existing = set(whitelist)
+        added = []
+        for date_str in dates:
+            if date_str not in existing:
+                existing.add(date_str)
+                added.append(date_str)
+        if not added:
+            return False, "该日期已在假期列表中" if len(dates) == 1 else "所有日期都已在假期列表中"
+        self._anchor_today()
+        whitelist.extend(added)
+        self._holidays_changed()
+        skipped = len(dates) - len(added)
+        msg = f"成功添加 {len(added)} 个假期: {', '.join(added)}"
+        if skipped:
+            msg += f",跳过已存在的 {skipped} 个"
+        return True, msg
+
+    def _holidays_changed(self):
+        """假期变化后更新轮换日历, 并保存配置和新的锚点"""
+        self.rotation.calendar = HolidayCalendar(self.config["holiday_whitelist"])
+        self.save_config()
+        self.save_members()
+
+    def export_holidays(self):
+        """每行一个日期导出假期列表"""
+        if not self.config["holiday_whitelist"]:
+            return "目前没有设置假期白名单"
+        return "\n".join(self.config["holiday_whitelist"])
+
     def remove_holiday(self, date_str):
         """删除假期"""
         if date_str in self.config["holiday_whitelist"]:
+            self._anchor_today()
             self.config["holiday_whitelist"].remove(date_str)
-            self.save_config()
+            self._holidays_changed()
             return True, f"成功删除假期 {date_str}"
         else:
             return False, "该日期不在假期列表中"
@@ -572,10 +1205,23 @@ class Reminder:
         """重置轮换"""
         self.members_data["current_index"] = 0
         self.members_data["last_reminder_date"] = ""  # 重置最后提醒日期
+        self.members_data["rotation"]["substitute"] = None
+        self.members_data["rotation"]["anchor"] = date.today().isoformat()
         self.save_members()
         _log.info("轮换已重置")
+    def stop_schedulers(self):
+        """取消定时提醒和索引更新任务"""
+        for task in (self.scheduler_task, self.update_index):
+            if task is not None:
+                task.cancel()
+        self.scheduler_task = None
+        self.update_index = None
+
     def restart_task(self):
         """重启任务"""
+        if self.remote is not None:
+            self.remote.submit("restart")
+            return True, "已通知调度进程重启所有定时任务"
         asyncio.create_task(self.start_reminder(self))
         asyncio.create_task(self.start_update_index(self))
         _log.info("任务已重启")
@@ -583,16 +1229,10 @@ class Reminder:
 
     def get_current_member(self):
         """获取当前值日人员信息"""
-        if not self.members_data["members"]:
+        current_member = self.current_member()
+        if current_member is None:
             return "当前没有设置值日人员"
-            
-        # 确保 current_index 在有效范围内
-        if self.members_data["current_index"] >= len(self.members_data["members"]):
-            self.members_data["current_index"] = 0
-            self.save_members()
-            
-        current_member = self.members_data["members"][self.members_data["current_index"]]
-        return f"今日值日人员: {current_member['name']} (ID: {current_member['id']})"
+        return f"今日值日人员: {current_member.name} (ID: {current_member.id})"
 
     def get_status(self):
         """获取当前状态"""
@@ -606,11 +1246,10 @@ class Reminder:
         
         # 获取下一个值日人员
         next_member = self.get_next_member()
-        next_member_name = "无" if not isinstance(next_member, dict) else next_member["name"]
-        next_member_index = next_member["id"]
+        next_member_name = "无" if next_member is None else next_member.name
+        next_member_index = "无" if next_member is None else next_member.id
         #发送状态
-        sendered = self.config["sender?"]
-        if sendered == True:
+        if self.members_data["last_reminder_date"] == date.today().isoformat():
             senderedtext = "已发送"
         else:
             senderedtext = "未发送"
@@ -624,29 +1263,44 @@ class Reminder:
             f"索引更新时间: {self.config['index_update_time']}\n"
             f"今日值日: {current_member}\n"
             f"下一位值日: {next_member_name}(ID:{next_member_index})\n"
-            f"成员数量: {len(self.members_data['members'])}\n"
-            f"假期数量: {len(self.config['holiday_whitelist'])}"
+            f"成员数量: {len(self.roster)}\n"
+            f"假期数量: {len(self.config['holiday_whitelist'])}\n"
+            f"SMTP: {self.smtp_breaker.describe()}"
         )
+        api_breaker = getattr(self.client, "api_breaker", None)
+        if api_breaker is not None:
+            text += f"\n开放平台接口: {api_breaker.describe()}"
+        if self.remote is not None:
+            text += f"\n调度进程: {self.remote.describe()}"
+        if self.leader is not None:
+            text += f"\n主备: {self.leader.describe()}"
+        if len(METRICS.tenants) > 1:
+            text += f"\n本进程托管 {len(METRICS.tenants)} 个机器人, 内存峰值 {rss_mb():.0f}MB"
         return (text)
 
-    def list_members(self):
-        """列出所有成员"""
-        if not self.members_data["members"]:
-            return "当前没有成员"
-        
-        member_list = "\n".join([
-            f"{member['id']}. {member['name']} (QQ: {member['qq_id']})"
-            for member in self.members_data["members"]
-        ])
-        return f"成员列表:\n{member_list}"
-
-    def list_holidays(self):
-        """列出所有假期"""
-        if not self.config["holiday_whitelist"]:
-            return "目前没有设置假期白名单"
-        
-        holidays = ", ".join(self.config["holiday_whitelist"])
-        return f"假期白名单: {holidays}"
+    def list_page(self, list_type, page=1):
+        """成员(m)或假期(h)列表的第 page 页, 类型错误时返回 None"""
+        if list_type == "m":
+            return self.pager.render(
+                "members", self.data_version,
+                lambda: (f"{m.id}. {m.name} (QQ: {m.qq_id})" for m in self.roster),
+                page, "成员列表", "/list m", "当前没有成员")
+        if list_type == "h":
+            holidays = self.config["holiday_whitelist"]
+            return self.pager.render(
+                "holidays", self.data_version,
+                # 每行8个日期
+                lambda: (", ".join(holidays[i:i + 8]) for i in range(0, len(holidays), 8)),
+                page, "假期白名单", "/list h", "目前没有设置假期白名单")
+        return None
+
+    def list_members(self, page=1):
+        """列出成员(分页)"""
+        return self.list_page("m", page).text
+
+    def list_holidays(self, page=1):
+        """列出假期(分页)"""
+        return self.list_page("h", page).text
 
     def set_email_config(self, smtp_server: str, smtp_port: int, sender_email: str, sender_password: str, subject: str = "扫地提醒"):
         """设置邮件配置
@@ -672,22 +1326,7 @@ class Reminder:
         """通过ID删除成员"""
         try:
             member_id = int(member_id)
-            original_count = len(self.members_data["members"])
-            self.members_data["members"] = [
-                member for member in self.members_data["members"] 
-                if member["id"] != member_id
-            ]
-            
-            if len(self.members_data["members"]) < original_count:
-                # 确保current_index不会越界
-                if self.members_data["members"]:
-                    self.members_data["current_index"] = min(
-                        self.members_data["current_index"],
-                        len(self.members_data["members"]) - 1
-                    )
-                else:
-                    self.members_data["current_index"] = 0
-                    
+            if self._remove_from_roster(member_id):
                 self.save_members()
                 return True, "成员删除成功"
             else:
@@ -700,11 +1339,90 @@ class Reminder:
         try:
             member_id = int(member_id)
             # 查找成员
-            for i, member in enumerate(self.members_data["members"]):
-                if member["id"] == member_id:
-                    self.members_data["current_index"] = i
-                    self.save_members()
-                    return True, f"已设置当前值日人员为: {member['name']}"
+            position = self.roster.position_of(member_id)
+            if position < 0:
+                return False, "未找到该成员"
+            self.members_data["current_index"] = position
+            self.members_data["rotation"]["substitute"] = None
+            self.members_data["rotation"]["anchor"] = date.today().isoformat()
+            self.save_members()
+            return True, f"已设置当前值日人员为: {self.roster[position].name}"
+        except ValueError:
+            return False, "ID格式错误,请输入数字" 
+
+    def set_rotation_strategy(self, strategy):
+        """设置轮换策略"""
+        if strategy not in STRATEGY_NAMES:
+            return False, f"未知的轮换策略,可选: {', '.join(STRATEGY_NAMES)}"
+        self._anchor_today()
+        self.config["rotation_strategy"] = strategy
+        self.save_config()
+        self._build_rotation()
+        self.save_members()
+        return True, f"轮换策略已设置为: {STRATEGY_NAMES[strategy]}"
+
+    def set_absence(self, member_id, until_str):
+        """设置成员请假到某天(包含当天), until_str 为 off 时取消请假"""
+        try:
+            member_id = int(member_id)
+        except ValueError:
+            return False, "ID格式错误,请输入数字"
+        member = self.roster.get(member_id)
+        if member is None:
             return False, "未找到该成员"
+        if until_str == "off":
+            self.rotation.set_absence(member_id, None)
+            self.rotation.uncover_absence(member_id)
+            self.save_members()
+            return True, f"已取消 {member.name} 的请假"
+        try:
+            if len(until_str) == 5:
+                # MM-DD: 取今天之后最近的这一天
+                today = date.today()
+                until = datetime.strptime(f"{today.year}-{until_str}", "%Y-%m-%d").date()
+                if until < today:
+                    until = until.replace(year=today.year + 1)
+            else:
+                until = date.fromisoformat(until_str)
         except ValueError:
-            return False, "ID格式错误,请输入数字" 
\ No newline at end of file
+            return False, "日期格式错误,请使用MM-DD或YYYY-MM-DD格式"
+        self.rotation.set_absence(member_id, until)
+        if not self.rotation.anchored:
+            self.save_members()
+            return True, f"{member.name} 请假至 {until.isoformat()},期间轮换会跳过该成员"
+        # 顺序轮换: 请假期间的值日由下一位代替, 请假结束后换回(今天已提醒时从明天算起)
+        start = date.today()
+        if self.members_data["last_reminder_date"] == start.isoformat():
+            start += timedelta(days=1)
+        moves = self.rotation.cover_absence(member_id, start, until, self.members_data["current_index"])
+        self.save_members()
+        lines = [f"{member.name} 请假至 {until.isoformat()}"]
+        for day, substitute_id, repay in moves:
+            lines.append(f"{day.isoformat()} 由 {self.roster.get(substitute_id).name} 代替, "
+                         f"{repay.isoformat()} 由 {member.name} 换回")
+        return True, "\n".join(lines)
+
+    def swap_members(self, first_id, second_id):
+        """一次性互换两位成员的值日"""
+        try:
+            first_id, second_id = int(first_id), int(second_id)
+        except ValueError:
+            return False, "ID格式错误,请输入数字"
+        first, second = self.roster.get(first_id), self.roster.get(second_id)
+        if first is None or second is None:
+            return False, "未找到该成员"
+        if first_id == second_id:
+            return False, "不能和自己互换"
+        if self.rotation.anchored:
+            # 顺序轮换: 直接互换两人接下来各自的值日日期(今天已提醒时从明天算起)
+            start = date.today()
+            if self.members_data["last_reminder_date"] == start.isoformat():
+                start += timedelta(days=1)
+            first_day, second_day = self.rotation.swap_turns(first_id, second_id, start,
+                                                             self.members_data["current_index"])
+            self.save_members()
+            return True, (f"已互换: {first_day.isoformat()} 由 {second.name} 代替 {first.name} 值日, "
+                          f"{second_day.isoformat()} 由 {first.name} 代替 {second.name} 值日")
+        self.rotation.swap(first_id, second_id)
+        self.save_members()
+        return True, f"已互换: 轮到 {first.name} 时由 {second.name} 值日, 轮到 {second.name} 时由 {first.name} 值日(各一次)"
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+值日成员名单
+
+成员按加入顺序保存在槽位数组中, 删除时只留下空槽(墓碑), 由树状数组维护
+"槽位 -> 轮换位置"的映射, 因此:
+    - 按 id / QQ号 查找: O(1)
+    - 按轮换位置取成员、求成员的位置、添加、删除: O(log n)
+空槽超过一半时整体压缩一次, 均摊 O(1)。成员记录使用 __slots__, 大名单下内存占用小。
+"""
+
+
+class Member:
+    """值日成员"""
+
+    __slots__ = ("id", "name", "qq_id")
+
+    def __init__(self, member_id: int, name: str, qq_id: str):
+        self.id = member_id
+        self.name = name
+        self.qq_id = qq_id
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Member":
+        return cls(int(data["id"]), str(data["name"]), str(data["qq_id"]))
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "qq_id": self.qq_id}
+
+    def __eq__(self, other):
+        return isinstance(other, Member) and (self.id, self.name, self.qq_id) == (other.id, other.name, other.qq_id)
+
+    def __repr__(self):
+        return f"Member(id={self.id}, name={self.name!r}, qq_id={self.qq_id!r})"
+
+
+class Roster:
+    """有序成员名单
+
+    Args:
+        members: 按轮换顺序排列的成员
+        next_id: 下一个新成员的ID, 只增不减, 删除成员后ID不会被复用
+    """
+
+    # 空槽数量超过该值且超过存活成员数时压缩
+    COMPACT_MIN = 64
+
+    def __init__(self, members=(), next_id: int = None):
+        self._slots = []
+        self._tree = [0]
+        self._slot_of_id = {}
+        self._id_of_qq = {}
+        self._size = 0
+        max_id = 0
+        for member in members:
+            if member.id in self._slot_of_id or member.qq_id in self._id_of_qq:
+                raise ValueError(f"成员ID或QQ号重复: {member}")
+            self._append(member)
+            max_id = max(max_id, member.id)
+        self.next_id = max(next_id or 0, max_id + 1)
+
+    @classmethod
+    def from_dicts(cls, members, next_id: int = None) -> "Roster":
+        return cls((Member.from_dict(m) for m in members), next_id)
+
+    def to_dicts(self) -> list:
+        return [member.to_dict() for member in self]
+
+    # ---- 树状数组 ----
+
+    def _fenwick_add(self, slot: int, delta: int):
+        i = slot + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, count: int) -> int:
+        """前 count 个槽位中的存活成员数"""
+        total = 0
+        i = count
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _select(self, position: int) -> int:
+        """第 position 个(从0开始)存活成员所在的槽位"""
+        tree = self._tree
+        n = len(tree) - 1
+        slot = 0
+        remaining = position + 1
+        step = 1 << n.bit_length()
+        while step:
+            nxt = slot + step
+            if nxt <= n and tree[nxt] < remaining:
+                slot = nxt
+                remaining -= tree[nxt]
+            step >>= 1
+        return slot
+
+    def _append(self, member: Member):
+        slot = len(self._slots)
+        self._slots.append(member)
+        # 新节点覆盖 (i - lowbit(i), i] 区间, 其中只有自己是新的
+        i = slot + 1
+        self._tree.append(self._prefix(i - 1) - self._prefix(i - (i & -i)) + 1)
+        self._slot_of_id[member.id] = slot
+        self._id_of_qq[member.qq_id] = member.id
+        self._size += 1
+
+    def _compact(self):
+        members = [member for member in self._slots if member is not None]
+        self._slots, self._tree = [], [0]
+        self._slot_of_id, self._id_of_qq = {}, {}
+        self._size = 0
+        for member in members:
+            self._append(member)
+
+    # ---- 查询 ----
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __iter__(self):
+        return (member for member in self._slots if member is not None)
+
+    def __getitem__(self, position: int) -> Member:
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError("成员位置越界")
+        return self._slots[self._select(position)]
+
+    def get(self, member_id: int):
+        slot = self._slot_of_id.get(member_id)
+        return None if slot is None else self._slots[slot]
+
+    def get_by_qq(self, qq_id: str):
+        member_id = self._id_of_qq.get(qq_id)
+        return None if member_id is None else self.get(member_id)
+
+    def position_of(self, member_id: int) -> int:
+        """成员在轮换顺序中的位置, 不存在时返回 -1"""
+        slot = self._slot_of_id.get(member_id)
+        return -1 if slot is None else self._prefix(slot)
+
+    # ---- 修改 ----
+
+    def add(self, name: str, qq_id: str) -> Member:
+        if qq_id in self._id_of_qq:
+            raise ValueError(f"QQ号已存在: {qq_id}")
+        member = Member(self.next_id, name, qq_id)
+        self.next_id += 1
+        self._append(member)
+        return member
+
+    def remove(self, member_id: int) -> int:
+        """删除成员, 返回其删除前的位置; 不存在时返回 -1"""
+        slot = self._slot_of_id.pop(member_id, None)
+        if slot is None:
+            return -1
+        position = self._prefix(slot)
+        member = self._slots[slot]
+        del self._id_of_qq[member.qq_id]
+        self._slots[slot] = None
+        self._fenwick_add(slot, -1)
+        self._size -= 1
+        holes = len(self._slots) - self._size
+        if holes > self.COMPACT_MIN and holes > self._size:
+            self._compact()
+        return position
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+值日轮换引擎
+
+轮换规则由可替换的策略决定:
+    - sequential: 按名单顺序轮换, 按日期锚定计算(见 AnchoredSchedule), 不需要每晚更新索引
+    - fair: 按值日次数(可按成员设置权重)选择次数最少的成员, 用小根堆实现, 每次选择 O(log n);
+      结果依赖历史, 仍由每晚的索引更新推进
+两种策略都支持临时请假(absences)和互换(swaps)。顺序轮换中请假期间的每次值日由其后第一位
+可以值日的成员代替, 代替者在请假结束后的下一次值日换给请假的成员(两天都记入 overrides),
+其余成员的日期不变, 没有人连续值日两天, 也没有人少轮一次。选择结果只取决于名单和轮换状态,
+不使用随机数, 相同输入总是得到相同的值日人员。
+
+轮换状态保存在 member.json 的 "rotation" 字段中:
+    {"absences": {成员ID: 请假截止日期}, "swaps": {成员ID: 代替其值日的成员ID},
+     "counts": {成员ID: 值日次数}, "substitute": 当前实际值日的成员ID或null,
+     "anchor": 锚定日期(该天的轮换位置为 current_index), "overrides": {日期: 当天改由其值日的成员ID},
+     "covers": {成员ID: 因其请假而写入 overrides 的日期列表}}
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+STRATEGY_SEQUENTIAL = "sequential"
+STRATEGY_FAIR = "fair"
+STRATEGY_NAMES = {STRATEGY_SEQUENTIAL: "顺序轮换", STRATEGY_FAIR: "按值日次数均衡"}
+
+
+def new_rotation_state() -> dict:
+    return {"absences": {}, "swaps": {}, "counts": {}, "substitute": None, "anchor": None, "overrides": {},
+            "covers": {}}
+
+
+def validate_rotation_state(state) -> dict:
+    """校验并补全轮换状态, JSON 中的成员ID键统一转为 int
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if state is None:
+        return new_rotation_state()
+    if not isinstance(state, dict):
+        raise ValueError("rotation 必须是对象")
+    result = new_rotation_state()
+    try:
+        for member_id, until in (state.get("absences") or {}).items():
+            result["absences"][int(member_id)] = date.fromisoformat(until).isoformat()
+        for member_id, partner in (state.get("swaps") or {}).items():
+            result["swaps"][int(member_id)] = int(partner)
+        for member_id, count in (state.get("counts") or {}).items():
+            result["counts"][int(member_id)] = int(count)
+        substitute = state.get("substitute")
+        result["substitute"] = None if substitute is None else int(substitute)
+        anchor = state.get("anchor")
+        result["anchor"] = None if anchor is None else date.fromisoformat(anchor).isoformat()
+        for day, member_id in (state.get("overrides") or {}).items():
+            result["overrides"][date.fromisoformat(day).isoformat()] = int(member_id)
+        for member_id, days in (state.get("covers") or {}).items():
+            result["covers"][int(member_id)] = [date.fromisoformat(day).isoformat() for day in days]
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"rotation 格式错误: {e}")
+    return result
+
+
+def dump_rotation_state(state: dict) -> dict:
+    """转为可写入 JSON 的格式(键为字符串)"""
+    return {
+        "absences": {str(k): v for k, v in state["absences"].items()},
+        "swaps": {str(k): v for k, v in state["swaps"].items()},
+        "counts": {str(k): v for k, v in state["counts"].items()},
+        "substitute": state["substitute"],
+        "anchor": state["anchor"],
+        "overrides": dict(state["overrides"]),
+        "covers": {str(k): list(v) for k, v in state["covers"].items()},
+    }
+
+
+class HolidayCalendar:
+    """按年重复的假期(MM-DD)日历, 假期不占用轮换次数
+
+    duty_number(day) 是公元1年1月1日到 day(不含)之间的非假期天数: 整年部分按闭式计算,
+    当年部分在排好序的假期中二分, 因此任意日期都是 O(log h)(h 为假期数量)。
+    """
+
+    def __init__(self, holidays):
+        days = {tuple(map(int, d.split("-"))) for d in holidays}
+        self._has_leap_day = (2, 29) in days
+        self._count = len(days)
+        self._days = sorted(days)
+        self._day_set = days
+        self._year_cache = {}
+
+    @staticmethod
+    def _leap_years(year: int) -> int:
+        """公元1年到 year 年(含)之间的闰年数"""
+        return year // 4 - year // 100 + year // 400
+
+    def _ordinals(self, year: int):
+        """某年每个假期是当年的第几天(从0开始), 已排序"""
+        ordinals = self._year_cache.get(year)
+        if ordinals is None:
+            start = date(year, 1, 1).toordinal()
+            ordinals = []
+            for month, day in self._days:
+                try:
+                    ordinals.append(date(year, month, day).toordinal() - start)
+                except ValueError:
+                    continue  # 平年没有 02-29
+            if len(self._year_cache) > 16:
+                self._year_cache.clear()
+            self._year_cache[year] = ordinals
+        return ordinals
+
+    def is_holiday(self, day: date) -> bool:
+        return (day.month, day.day) in self._day_set
+
+    def holidays_before(self, day: date) -> int:
+        """公元1年1月1日到 day(不含)之间的假期天数"""
+        full_years = day.year - 1
+        count = self._count * full_years
+        if self._has_leap_day:
+            count -= full_years - self._leap_years(full_years)
+        offset = day.toordinal() - date(day.year, 1, 1).toordinal()
+        return count + bisect_left(self._ordinals(day.year), offset)
+
+    def duty_number(self, day: date) -> int:
+        """day 之前的非假期天数; 假期当天与其后第一个非假期日相同"""
+        return day.toordinal() - 1 - self.holidays_before(day)
+
+    def duty_day(self, number: int) -> date:
+        """duty_number 的逆运算: 返回 duty_number 为 number 的非假期日"""
+        per_year = 365.2425 - self._count
+        if per_year < 1:
+            raise ValueError("全年都是假期")
+        year = max(1, int(number / per_year))
+        while year > 1 and self.duty_number(date(year, 1, 1)) > number:
+            year -= 1
+        while self.duty_number(date(year + 1, 1, 1)) <= number:
+            year += 1
+        remaining = number - self.duty_number(date(year, 1, 1))
+        # 第 remaining 个(从0开始)非假期日: ordinals[i] - i 单调不减, 二分找出它之前的假期数
+        ordinals = self._ordinals(year)
+        shifted = [o - i for i, o in enumerate(ordinals)]
+        return date(year, 1, 1) + timedelta(days=remaining + bisect_right(shifted, remaining))
+
+    def next_duty_day(self, day: date) -> date:
+        """day 当天或之后的第一个非假期日"""
+        return self.duty_day(self.duty_number(day))
+
+
+class AnchoredSchedule:
+    """按日期锚定的顺序轮换
+
+    锚定日期 anchor 当天(若是假期则为其后第一个非假期日)轮到名单第 anchor_index 位,
+    之后每个非假期日顺延一位。任意日期的值日人员都可以直接算出, 无需每晚修改并保存索引,
+    漏掉某次更新也不会让轮换错位; 过去和将来的日期同样可以查询。
+    """
+
+    def __init__(self, roster, calendar: HolidayCalendar, anchor: date, anchor_index: int):
+        self.roster = roster
+        self.calendar = calendar
+        self.anchor = anchor
+        self.anchor_index = anchor_index
+        self._anchor_number = calendar.duty_number(anchor)
+
+    def position_on(self, day: date):
+        """day 当天按名单应轮到的位置, 假期返回 None"""
+        if not self.roster or self.calendar.is_holiday(day):
+            return None
+        offset = self.calendar.duty_number(day) - self._anchor_number
+        return (self.anchor_index + offset) % len(self.roster)
+
+    def next_turn(self, position: int, start: date) -> date:
+        """start 当天或之后, 名单第 position 位下一次轮到的日期"""
+        number = self.calendar.duty_number(start)
+        offset = (position - self.anchor_index - (number - self._anchor_number)) % len(self.roster)
+        return self.calendar.duty_day(number + offset)
+
+
+class SequentialStrategy:
+    """按名单顺序轮换, 请假的成员本轮被跳过"""
+
+    name = STRATEGY_SEQUENTIAL
+
+    def choose(self, roster, current_index: int, available) -> int:
+        size = len(roster)
+        for step in range(1, size + 1):
+            position = (current_index + step) % size
+            if available(roster[position].id):
+                return position
+        return -1
+
+    def assigned(self, roster, member_id: int):
+        pass
+
+
+class FairStrategy:
+    """选择 值日次数/权重 最小的成员, 相同时按成员ID(加入顺序)决定
+
+    小根堆中的条目可能因次数变化而过期, 取出时与当前分数比对后丢弃(惰性删除)。
+    名单成员变化时重建一次堆, O(n)。
+    """
+
+    name = STRATEGY_FAIR
+
+    def __init__(self, counts: dict, weights: dict = None):
+        self.counts = counts
+        self.weights = weights or {}
+        self._heap = []
+        self._roster_key = None
+
+    def _score(self, member_id: int) -> float:
+        return self.counts.get(member_id, 0) / self.weights.get(member_id, 1)
+
+    def _sync(self, roster):
+        key = (id(roster), len(roster), roster.next_id)
+        if key == self._roster_key:
+            return
+        # 新加入的成员从当前最小次数开始, 避免连续多天都轮到新成员
+        if self.counts:
+            floor = min((self.counts[m.id] for m in roster if m.id in self.counts), default=0)
+            for member in roster:
+                self.counts.setdefault(member.id, floor)
+        self._heap = [(self._score(m.id), m.id) for m in roster]
+        heapq.heapify(self._heap)
+        self._roster_key = key
+
+    def choose(self, roster, current_index: int, available) -> int:
+        self._sync(roster)
+        current_id = roster[current_index].id if 0 <= current_index < len(roster) else None
+        skipped = []
+        chosen = None
+        while self._heap:
+            score, member_id = heapq.heappop(self._heap)
+            if roster.get(member_id) is None or score != self._score(member_id):
+                continue  # 过期条目
+            skipped.append((score, member_id))
+            # 同一人不连续值日(名单只有一人时除外)
+            if available(member_id) and (member_id != current_id or len(roster) == 1):
+                chosen = member_id
+                break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return -1 if chosen is None else roster.position_of(chosen)
+
+    def assigned(self, roster, member_id: int):
+        self._sync(roster)
+        heapq.heappush(self._heap, (self._score(member_id), member_id))
+
+
+class RotationEngine:
+    """根据策略和轮换状态决定下一位值日人员
+
+    Args:
+        roster: 成员名单
+        state: 轮换状态(会被原地修改, 由调用方负责保存)
+        strategy: 策略名称
+        weights: {成员ID: 权重}, 仅 fair 策略使用, 权重越大值日越频繁
+        calendar: 假期日历, 仅 sequential 策略(日期锚定)使用
+    """
+
+    def __init__(self, roster, state: dict, strategy: str = STRATEGY_SEQUENTIAL, weights: dict = None,
+                 calendar: HolidayCalendar = None):
+        if strategy not in STRATEGY_NAMES:
+            raise ValueError(f"未知的轮换策略: {strategy}")
+        self.roster = roster
+        self.state = state
+        self.calendar = calendar or HolidayCalendar([])
+        if strategy == STRATEGY_FAIR:
+            self.strategy = FairStrategy(state["counts"], weights)
+        else:
+            self.strategy = SequentialStrategy()
+
+    @property
+    def anchored(self) -> bool:
+        """顺序轮换按日期锚定直接计算, 不需要每晚推进索引"""
+        return self.strategy.name == STRATEGY_SEQUENTIAL
+
+    # ---- 日期锚定(sequential) ----
+
+    def schedule(self, current_index: int) -> AnchoredSchedule:
+        return AnchoredSchedule(self.roster, self.calendar, date.fromisoformat(self.state["anchor"]), current_index)
+
+    def on(self, day: date, current_index: int):
+        """day 当天实际值日的成员(考虑互换和请假), 假期或没有成员时返回 None"""
+        position = self.schedule(current_index).position_on(day)
+        if position is None:
+            return None
+        override = self.roster.get(self.state["overrides"].get(day.isoformat()))
+        if override is not None and self.is_available(override.id, day):
+            return override
+        size = len(self.roster)
+        for step in range(size):
+            member = self.roster[(position + step) % size]
+            if self.is_available(member.id, day):
+                return member
+        # 所有人都请假时仍按原顺序, 不让提醒中断
+        return self.roster[position]
+
+    def next_duty_day(self, day: date) -> date:
+        """day 当天或之后的第一个非假期日"""
+        return self.calendar.next_duty_day(day)
+
+    def cover_absence(self, member_id: int, start: date, until: date, current_index: int):
+        """安排 member_id 从 start 到 until(含)请假期间的值日, 返回 [(日期, 代替者ID, 换回日期), ...]
+
+        每次值日由一位当天可以值日的成员代替, 代替者在 until 之后的下一次值日改由 member_id 值日。
+        代替者和换回日期都避开前后一天已经值日的成员, 多次值日尽量轮流由不同的成员代替。
+        已被 /swap 改过的日期保持不变。
+        """
+        self.uncover_absence(member_id)
+        size = len(self.roster)
+        if size < 2:
+            return []
+        overrides = self.state["overrides"]
+        schedule = self.schedule(current_index)
+        position = self.roster.position_of(member_id)
+        covered = []
+        moves = []
+        # 每位代替者已代替的次数和下一次可用于换回的日期
+        used = {}
+        repay_from = {}
+
+        def on_duty(member, day):
+            override = overrides.get(day.isoformat())
+            if override is not None:
+                return override == member
+            natural = schedule.position_on(day)
+            return natural is not None and self.roster[natural].id == member
+
+        def next_to(member, day):
+            return on_duty(member, day - timedelta(days=1)) or on_duty(member, day + timedelta(days=1))
+
+        day = start
+        while True:
+            turn = schedule.next_turn(position, day)
+            if turn > until:
+                break
+            day = turn + timedelta(days=1)
+            if turn.isoformat() in overrides:
+                continue
+            candidates = [(next_to(member.id, turn), used.get(member.id, 0), abs(step - size / 2), member)
+                          for step in range(1, size)
+                          for member in (self.roster[(position + step) % size],)
+                          if self.is_available(member.id, turn)]
+            if not candidates:
+                break
+            substitute = min(candidates, key=lambda c: c[:3])[3]
+            used[substitute.id] = used.get(substitute.id, 0) + 1
+            substitute_position = self.roster.position_of(substitute.id)
+            repay = schedule.next_turn(substitute_position, repay_from.get(substitute.id, until + timedelta(days=1)))
+            for _ in range(size):
+                if repay.isoformat() not in overrides and not next_to(member_id, repay):
+                    break
+                repay = schedule.next_turn(substitute_position, repay + timedelta(days=1))
+            while repay.isoformat() in overrides:
+                repay = schedule.next_turn(substitute_position, repay + timedelta(days=1))
+            repay_from[substitute.id] = repay + timedelta(days=1)
+            overrides[turn.isoformat()] = substitute.id
+            overrides[repay.isoformat()] = member_id
+            covered += [turn.isoformat(), repay.isoformat()]
+            moves.append((turn, substitute.id, repay))
+        if covered:
+            self.state["covers"][member_id] = covered
+        return moves
+
+    def uncover_absence(self, member_id: int):
+        """撤销 cover_absence 写入的日期(请假取消或修改时)"""
+        for day in self.state["covers"].pop(member_id, ()):
+            self.state["overrides"].pop(day, None)
+
+    def position_on(self, day: date, current_index: int) -> int:
+        """day 之后(含当天)第一个非假期日按名单轮到的位置, 用于把锚点移到 day"""
+        return self.schedule(current_index).position_on(self.next_duty_day(day))
+
+    def swap_turns(self, first: int, second: int, start: date, current_index: int):
+        """互换两人从 start 起各自的下一次值日, 返回 (first 原定日期, second 原定日期)"""
+        self._prune(start)
+        schedule = self.schedule(current_index)
+        first_day = schedule.next_turn(self.roster.position_of(first), start)
+        second_day = schedule.next_turn(self.roster.position_of(second), start)
+        self.state["overrides"][first_day.isoformat()] = second
+        self.state["overrides"][second_day.isoformat()] = first
+        return first_day, second_day
+
+    # ---- 通用 ----
+
+    def is_available(self, member_id: int, day: date) -> bool:
+        until = self.state["absences"].get(member_id)
+        return until is None or day.isoformat() > until
+
+    def current(self, current_index: int):
+        """当前实际值日的成员(考虑互换)"""
+        if not self.roster:
+            return None
+        substitute = self.state["substitute"]
+        if substitute is not None:
+            member = self.roster.get(substitute)
+            if member is not None:
+                return member
+        return self.roster[current_index]
+
+    def _pick(self, current_index: int, day: date):
+        """返回 (轮换位置, 实际值日成员, 是否使用了互换)"""
+        position = self.strategy.choose(self.roster, current_index, lambda m: self.is_available(m, day))
+        if position < 0:
+            # 所有人都请假时仍按原顺序轮换, 不让提醒中断
+            position = (current_index + 1) % len(self.roster)
+        member = self.roster[position]
+        partner = self.roster.get(self.state["swaps"].get(member.id))
+        if partner is not None and self.is_available(partner.id, day):
+            return position, partner, True
+        return position, member, False
+
+    def peek(self, current_index: int, day: date = None):
+        """下一位值日人员, 不修改状态"""
+        if not self.roster:
+            return None
+        return self._pick(current_index, day or date.today())[1]
+
+    def advance(self, current_index: int, day: date = None):
+        """切换到下一位, 返回 (新的轮换位置, 实际值日成员)"""
+        if not self.roster:
+            return 0, None
+        day = day or date.today()
+        self._prune(day)
+        position, member, swapped = self._pick(current_index, day)
+        natural = self.roster[position]
+        if swapped:
+            del self.state["swaps"][natural.id]
+        self.state["substitute"] = member.id if swapped else None
+        counts = self.state["counts"]
+        counts[member.id] = counts.get(member.id, 0) + 1
+        self.strategy.assigned(self.roster, member.id)
+        return position, member
+
+    def _prune(self, day: date):
+        """清理过期的请假和已不在名单中的成员"""
+        today = day.isoformat()
+        state = self.state
+        state["absences"] = {k: v for k, v in state["absences"].items()
+                             if v >= today and self.roster.get(k) is not None}
+        state["swaps"] = {k: v for k, v in state["swaps"].items()
+                          if self.roster.get(k) is not None and self.roster.get(v) is not None}
+        state["overrides"] = {k: v for k, v in state["overrides"].items()
+                              if k >= today and self.roster.get(v) is not None}
+        covers = {}
+        for member_id, days in state["covers"].items():
+            days = [d for d in days if d in state["overrides"]]
+            if days and self.roster.get(member_id) is not None:
+                covers[member_id] = days
+        state["covers"] = covers
+
+    # ---- 调整 ----
+
+    def set_absence(self, member_id: int, until: date = None):
+        """设置请假截止日期(包含当天), until 为 None 时取消请假"""
+        if until is None:
+            self.state["absences"].pop(member_id, None)
+        else:
+            self.state["absences"][member_id] = until.isoformat()
+
+    def swap(self, first: int, second: int):
+        """一次性互换: 轮到其中一人时由另一人代替, 两人各代替一次后恢复"""
+        self.state["swaps"][first] = second
+        self.state["swaps"][second] = first
+
+    def forget(self, member_id: int):
+        """成员被删除时清理相关状态"""
+        state = self.state
+        state["absences"].pop(member_id, None)
+        partner = state["swaps"].pop(member_id, None)
+        if partner is not None and state["swaps"].get(partner) == member_id:
+            del state["swaps"][partner]
+        state["counts"].pop(member_id, None)
+        self.uncover_absence(member_id)
+        state["overrides"] = {k: v for k, v in state["overrides"].items() if v != member_id}
+        if state["substitute"] == member_id:
+            state["substitute"] = None
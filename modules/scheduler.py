@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+独立的调度进程
+
+定时提醒、索引更新和 SMTP 发送原来与 botpy 网关连接共用一个事件循环, 一方卡住会拖慢另一方,
+网关重连时还会经 on_ready 重新启动定时任务。现在可以拆成两个进程:
+    python main.py --role scheduler   # 只运行定时任务和邮件发送, 不连接网关
+    python main.py --role gateway     # 只处理消息, 不运行定时任务
+两个进程通过数据目录下的 SQLite 队列(scheduler.db)通信:
+    - 网关进程的 /send、/restart 写入任务, 调度进程轮询领取、执行并写回结果
+    - 调度进程定期写入心跳, /status 中显示调度进程是否在运行
+    - 成员和配置的修改照常写入 member.json/config.json, 对方通过配置文件监视器读入
+任一进程重启都不影响另一个: 网关重连期间提醒照常准时发送, 调度进程重启期间网关照常回复,
+排队的任务在调度进程恢复后执行(超过 PENDING_TTL 的任务作废, 避免很久以前的 /send 突然生效)。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+
+from botpy import logging as botpy_logging
+
+from .metrics import METRICS
+from .watcher import FileWatcher
+
+_log = botpy_logging.get_logger()
+
+# 数据目录下的队列数据库
+QUEUE_FILE = "scheduler.db"
+# 调度进程检查任务和写心跳的间隔(秒)
+POLL_INTERVAL = 1.0
+# 超过该秒数没有心跳视为调度进程未运行
+HEARTBEAT_STALE = 15
+# 排队超过该秒数仍未被领取的任务作废
+PENDING_TTL = 600
+# 已完成的任务保留天数
+KEEP_DAYS = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL DEFAULT '{}',
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    ok INTEGER,
+    result TEXT
+);
+CREATE TABLE IF NOT EXISTS heartbeat (
+    role TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    at REAL NOT NULL,
+    detail TEXT
+);
+"""
+
+
+class SchedulerQueue:
+    """网关进程与调度进程之间的任务队列和心跳(SQLite, WAL 模式)
+
+    每次操作只是一两条短语句, 直接在事件循环中执行。
+
+    Args:
+        path: 数据库文件路径
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @classmethod
+    def for_data_dir(cls, data_dir: str) -> "SchedulerQueue":
+        return cls(os.path.join(data_dir, QUEUE_FILE))
+
+    # ---- 网关进程 ----
+
+    def submit(self, kind: str, **args) -> int:
+        """提交任务, 返回任务编号"""
+        cursor = self._db.execute("INSERT INTO jobs (kind, args, created) VALUES (?, ?, ?)",
+                                  (kind, json.dumps(args), time.time()))
+        return cursor.lastrowid
+
+    def result(self, job_id: int):
+        """已完成的任务返回 (ok, result), 未完成返回 None"""
+        row = self._db.execute("SELECT ok, result FROM jobs WHERE id = ? AND finished IS NOT NULL",
+                               (job_id,)).fetchone()
+        return None if row is None else (bool(row[0]), row[1])
+
+    def last_beat(self, role: str = "scheduler"):
+        """最近一次心跳 (时间, pid, 说明), 从未写入时返回 None"""
+        return self._db.execute("SELECT at, pid, detail FROM heartbeat WHERE role = ?", (role,)).fetchone()
+
+    # ---- 调度进程 ----
+
+    def claim(self):
+        """领取最早的待执行任务, 返回 (id, kind, args), 没有时返回 None"""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute("UPDATE jobs SET started = ?, finished = ?, ok = 0, result = ? "
+                             "WHERE started IS NULL AND created < ?",
+                             (now, now, "排队超时, 已作废", now - PENDING_TTL))
+            row = self._db.execute("SELECT id, kind, args FROM jobs WHERE started IS NULL ORDER BY id LIMIT 1").fetchone()
+            if row is not None:
+                self._db.execute("UPDATE jobs SET started = ? WHERE id = ?", (now, row[0]))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def finish(self, job_id: int, ok: bool, result: str):
+        self._db.execute("UPDATE jobs SET finished = ?, ok = ?, result = ? WHERE id = ?",
+                         (time.time(), int(ok), result, job_id))
+
+    def abandon_running(self) -> int:
+        """调度进程启动时调用: 上次领取后未完成的任务不再重试(可能已经发出, 重试会重复发送)"""
+        cursor = self._db.execute("UPDATE jobs SET finished = ?, ok = 0, result = ? "
+                                  "WHERE started IS NOT NULL AND finished IS NULL",
+                                  (time.time(), "调度进程在执行中重启, 未确认是否完成"))
+        return cursor.rowcount
+
+    def beat(self, role: str = "scheduler", detail: str = ""):
+        self._db.execute("INSERT OR REPLACE INTO heartbeat (role, pid, at, detail) VALUES (?, ?, ?, ?)",
+                         (role, os.getpid(), time.time(), detail))
+
+    def prune(self):
+        self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                         (time.time() - KEEP_DAYS * 86400,))
+
+    def close(self):
+        self._db.close()
+
+
+class RemoteScheduler:
+    """网关进程中代替本地定时任务的句柄, 把 /send、/restart 交给调度进程
+
+    Args:
+        queue: SchedulerQueue
+        timeout: 等待任务结果的最长时间(秒)
+    """
+
+    def __init__(self, queue: SchedulerQueue, timeout: float = 60):
+        self.queue = queue
+        self.timeout = timeout
+
+    def alive(self) -> bool:
+        beat = self.queue.last_beat()
+        return beat is not None and time.time() - beat[0] < HEARTBEAT_STALE
+
+    def describe(self) -> str:
+        beat = self.queue.last_beat()
+        if beat is None:
+            return "未启动"
+        age = time.time() - beat[0]
+        if age >= HEARTBEAT_STALE:
+            return f"无响应(最后心跳 {age:.0f} 秒前), 任务将在其恢复后执行"
+        return f"运行中(PID {beat[1]}){', ' + beat[2] if beat[2] else ''}"
+
+    def submit(self, kind: str, **args) -> int:
+        return self.queue.submit(kind, **args)
+
+    async def call(self, kind: str, **args):
+        """提交任务并等待结果; 超时返回 None(任务仍在队列中)"""
+        job_id = self.queue.submit(kind, **args)
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            result = self.queue.result(job_id)
+            if result is not None:
+                return result
+            await asyncio.sleep(0.2)
+        return None
+
+
+class SchedulerService:
+    """调度进程: 运行定时提醒、索引更新, 并执行网关进程提交的任务
+
+    Args:
+        settings: 配置快照(只使用其中的数据目录和路径)
+        ha: 为 True 时以主备模式运行, 只有持有租约的调度进程运行定时任务
+    """
+
+    def __init__(self, settings, ha: bool = False):
+        self.settings = settings
+        self.ha = ha
+        self.tenant = "scheduler"
+        self.reminder = None
+        self.queue = None
+        self.watcher = None
+        # 退出流程: 停止领取新任务, 等待正在执行的任务
+        self.accepting = True
+        self.inflight = set()
+
+    def stop_accepting(self):
+        self.accepting = False
+
+    async def run(self):
+        from .reminder import Reminder
+
+        METRICS.register(self.tenant)
+        self.reminder = Reminder(self)
+        self.queue = SchedulerQueue.for_data_dir(self.settings.data_dir)
+
+        self.watcher = FileWatcher()
+        self.watcher.watch(self.reminder.config_path, self.reminder.reload_config)
+        self.watcher.watch(self.reminder.members_path, self.reminder.reload_members)
+        self.watcher.start()
+        if self.ha:
+            from .lease import Lease, LeaderElection
+            LeaderElection(Lease.for_data_dir(self.settings.data_dir), self.reminder).start()
+        else:
+            await self.reminder.start_reminder(self)
+            await self.reminder.start_update_index(self)
+        _log.info("调度进程已启动")
+
+        pruned_at = 0.0
+        active = False
+        try:
+            while True:
+                # 主备模式下只有主实例领取任务和写心跳
+                leader = self.reminder.leader
+                if leader is not None and not leader.leading:
+                    active = False
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                if not active:
+                    active = True
+                    abandoned = self.queue.abandon_running()
+                    if abandoned:
+                        _log.warning(f"上次调度进程退出时有 {abandoned} 个任务未完成, 已标记为失败")
+                self.queue.beat(detail=f"提醒时间 {self.reminder.config['reminder_time']}")
+                # 退出流程中不再领取新任务, 留在队列中由下次启动的调度进程执行
+                job = self.queue.claim() if self.accepting else None
+                while job is not None:
+                    task = asyncio.ensure_future(self._execute(*job))
+                    self.inflight.add(task)
+                    task.add_done_callback(self.inflight.discard)
+                    await asyncio.shield(task)
+                    job = self.queue.claim() if self.accepting else None
+                if time.time() - pruned_at > 3600:
+                    self.queue.prune()
+                    pruned_at = time.time()
+                await asyncio.sleep(POLL_INTERVAL)
+        finally:
+            self.watcher.stop()
+            if self.reminder.leader is not None:
+                self.reminder.leader.stop()
+            self.reminder.mailer.close()
+            self.queue.close()
+
+    async def _execute(self, job_id: int, kind: str, args: dict):
+        _log.info(f"执行网关进程提交的任务 #{job_id}: {kind}")
+        try:
+            if kind == "send":
+                member = self.reminder.current_member()
+                await self.reminder.send_reminder(self, force_send=args.get("force", True))
+                ok, result = True, "已发送提醒" if member is None else f"已发送提醒给：{member.name}(ID:{member.id})"
+            elif kind == "restart":
+                ok, result = self.reminder.restart_task()
+            else:
+                ok, result = False, f"未知的任务类型: {kind}"
+        except Exception as e:
+            _log.error(f"任务 #{job_id} 执行失败: {e}")
+            ok, result = False, str(e)
+        self.queue.finish(job_id, ok, result)
+
+
+def run_scheduler(settings, ha: bool = False) -> int:
+    """调度进程入口, 返回退出码"""
+    from .shutdown import ShutdownCoordinator
+
+    service = SchedulerService(settings, ha=ha)
+    return ShutdownCoordinator(lambda: [service] if service.reminder is not None else []).run(service.run())
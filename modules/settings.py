@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+机器人主配置(config.yaml)的只读快照
+
+config.yaml 在启动时只解析一次, 校验后生成不可变的 Settings, 由 main、SweepingBot
+和 Reminder 共享。解析结果会缓存到 data/.settings.snapshot, 只要 config.yaml 的
+修改时间和大小没有变化, 下次启动直接读取快照, 不再解析 YAML。
+"""
+
+import os
+import re
+import json
+from dataclasses import dataclass, asdict
+
+import botpy
+from botpy import logging as botpy_logging
+
+from .auth import parse_group_admins
+
+_log = botpy_logging.get_logger()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
+DEFAULT_DATA_DIR = os.path.join(BASE_DIR, "data")
+SNAPSHOT_NAME = ".settings.snapshot"
+SNAPSHOT_VERSION = 2
+# config.yaml 中 intent 的旧名称 -> botpy.Intents 的标志
+INTENT_ALIASES = {
+    "at_messages": "public_guild_messages",
+    "group_messages": "public_messages",
+    "c2c_messages": "public_messages",
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """config.yaml 的校验后快照"""
+    appid: str
+    secret: str
+    token: str = ""
+    intents: tuple = ()
+    admin_ids: tuple = ()
+    group_admins: tuple = ()
+    version: str = ""
+    config_path: str = DEFAULT_CONFIG_PATH
+    data_dir: str = DEFAULT_DATA_DIR
+
+
+def _split_ids(value) -> tuple:
+    """admin_ids 既可以是逗号/空白分隔的字符串, 也可以是列表"""
+    if value is None:
+        return ()
+    if isinstance(value, (int, str)):
+        items = re.split(r"[\s,，]+", str(value))
+    elif isinstance(value, (list, tuple)):
+        items = [str(item) for item in value]
+    else:
+        raise ValueError(f"admin_ids 格式错误: {value!r}")
+    return tuple(item.strip() for item in items if item and item.strip())
+
+
+def validate_settings(raw: dict, config_path: str = DEFAULT_CONFIG_PATH,
+                      data_dir: str = DEFAULT_DATA_DIR) -> Settings:
+    """校验 config.yaml 的内容并生成快照
+
+    Raises:
+        ValueError: 缺少必要字段或字段类型错误
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("配置文件格式错误")
+    if not raw.get("appid") or not raw.get("secret"):
+        raise ValueError("配置文件缺少必要的appid或secret")
+
+    intents = raw.get("intent") or []
+    if isinstance(intents, str):
+        intents = [intents]
+    if not isinstance(intents, (list, tuple)) or not all(isinstance(i, str) for i in intents):
+        raise ValueError(f"intent 格式错误: {intents!r}")
+    unknown = [i for i in intents if INTENT_ALIASES.get(i, i) not in botpy.Intents.VALID_FLAGS]
+    if unknown:
+        raise ValueError(f"未知的 intent: {', '.join(unknown)}")
+
+    return Settings(
+        appid=str(raw["appid"]),
+        secret=str(raw["secret"]),
+        token=str(raw.get("token") or ""),
+        intents=tuple(intents),
+        admin_ids=_split_ids(raw.get("admin_ids")),
+        group_admins=parse_group_admins(raw.get("group_admins")),
+        version=str(raw.get("Version") or ""),
+        config_path=config_path,
+        data_dir=data_dir,
+    )
+
+
+def _source_key(config_path: str) -> list:
+    stat = os.stat(config_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_snapshot(snapshot_path: str, key: list):
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("source") != key:
+        return None
+    return snapshot.get("raw")
+
+
+def _write_snapshot(snapshot_path: str, key: list, raw: dict):
+    tmp_path = snapshot_path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        # 快照中包含 secret, 只允许当前用户读写
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "source": key, "raw": raw}, f, ensure_ascii=False)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        _log.warning(f"写入配置快照失败: {e}")
+
+
+def build_intents(names, handled=None):
+    """按 config.yaml 的 intent 列表生成 botpy.Intents
+
+    Args:
+        names: 配置的名称(已校验), 为空时订阅 handled 中的全部通道
+        handled: 可选, 机器人实际处理的通道; 配置了但不在其中的通道不订阅,
+            免得为没有处理函数的事件付出解码和分发的开销
+
+    Raises:
+        ValueError: 没有可订阅的通道
+    """
+    flags = list(dict.fromkeys(INTENT_ALIASES.get(name, name) for name in names))
+    if not flags:
+        flags = list(handled or ("public_messages",))
+    if handled is not None:
+        skipped = [flag for flag in flags if flag not in handled]
+        if skipped:
+            _log.info(f"以下事件通道没有对应的处理函数, 不订阅: {', '.join(skipped)}")
+        flags = [flag for flag in flags if flag in handled]
+    if not flags:
+        raise ValueError("intent 中没有机器人能处理的事件通道, 请至少包含 public_messages")
+    _log.info(f"订阅事件通道: {', '.join(flags)}")
+    return botpy.Intents(**{flag: True for flag in flags})
+
+
+def load_settings(config_path: str = DEFAULT_CONFIG_PATH, data_dir: str = DEFAULT_DATA_DIR,
+                  use_snapshot: bool = True) -> Settings:
+    """读取 config.yaml 并返回校验后的 Settings
+
+    Raises:
+        FileNotFoundError: 配置文件不存在
+        ValueError: 配置内容无效
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"配置文件不存在: {config_path}")
+
+    snapshot_path = os.path.join(data_dir, SNAPSHOT_NAME)
+    key = _source_key(config_path)
+    cached = _read_snapshot(snapshot_path, key) if use_snapshot else None
+    if cached is not None:
+        # 快照中保存的是校验后的字段
+        cached.update(config_path=config_path, data_dir=data_dir)
+        cached["intents"] = tuple(cached.get("intents") or ())
+        cached["admin_ids"] = tuple(cached.get("admin_ids") or ())
+        cached["group_admins"] = tuple(tuple(entry) for entry in cached.get("group_admins") or ())
+        try:
+            return Settings(**cached)
+        except TypeError:
+            _log.info("配置快照字段已变化, 重新解析配置文件")
+
+    from botpy.ext.cog_yaml import read
+    settings = validate_settings(read(config_path), config_path, data_dir)
+    if use_snapshot:
+        _write_snapshot(snapshot_path, key, asdict(settings))
+    return settings
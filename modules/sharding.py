@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+"""
+多进程分片运行
+
+单个进程只有一个事件循环, 群很多时网关处理、命令解析、渲染和 JSON 读写都挤在同一个核上。
+分片模式(python main.py --shards N)把工作分给多个进程:
+    - 路由进程: 只持有网关连接, 收到群/私聊事件后按一致性哈希选出工作进程,
+      把原始事件通过本地 Unix 套接字转发过去; 不做任何命令处理
+    - 工作进程: 各自运行一个不连网关的 SweepingBot, 用 botpy 自己的解析器还原事件后处理,
+      直接调用开放平台接口回复。同一个群(或同一个私聊用户)的事件总是交给同一个进程,
+      并在进程内按收到的顺序逐个处理, 不同群之间并行
+    - 0 号工作进程额外负责定时提醒和索引更新, 其他进程不启动定时任务, 不会重复发送
+
+所有进程共用同一个数据目录。每次写入 config.json/member.json 都持有数据目录下的文件锁
+(modules/statelock.py, 0 号进程的定时任务也一样); 会修改数据的事件(管理员命令、机器人进群/退群)
+在处理前先在锁内重新读取两个文件, 不必等配置文件监视器。
+
+收到 SIGTERM/SIGINT 时路由进程不再重启工作进程, 把信号转发给每个工作进程并等待其退出
+(最多 WORKER_STOP_TIMEOUT 秒, 超时的强制结束); 工作进程与单进程运行一样由 ShutdownCoordinator
+停止接收、等待进行中的消息和提醒并保存状态。任一工作进程放弃了工作或被强制结束时,
+路由进程的退出码为 EXIT_ABANDONED。
+
+增加工作进程时, 一致性哈希只让约 1/N 的群换到新进程, 启动时会在日志中给出迁移计划,
+也可以提前查看:
+    python -m modules.sharding --plan 6
+
+仅支持 Linux(Unix 套接字和 fcntl 文件锁)。
+"""
+
+import os
+import sys
+import json
+import bisect
+import asyncio
+import hashlib
+import signal
+import argparse
+import multiprocessing
+from collections import deque
+
+import botpy
+from botpy import logging as botpy_logging
+from botpy.connection import ConnectionSession
+from botpy.robot import Robot
+
+from .commands import is_command_event, ignore_event
+from .settings import load_settings, build_intents, DEFAULT_DATA_DIR
+from .shutdown import ShutdownCoordinator, DRAIN_TIMEOUT, FLUSH_TIMEOUT, EXIT_OK, EXIT_ABANDONED
+from .token_manager import TokenManager, ManagedToken, CACHE_FILE as TOKEN_CACHE_FILE
+
+_log = botpy_logging.get_logger()
+
+# 每个工作进程在哈希环上的虚拟节点数, 越多分布越均匀
+VNODES = 160
+# 数据目录下的文件
+SOCKET_FILE = ".shards.sock"
+LAYOUT_FILE = ".shards.json"
+# 工作进程断开期间每个进程最多缓存的事件数, 超出时丢弃最早的事件
+QUEUE_LIMIT = 10000
+# 单条事件的最大长度(字节)
+LINE_LIMIT = 1 << 20
+# 退出时等待工作进程处理完进行中的工作的最长时间(秒), 比工作进程自己的等待和保存多留几秒
+WORKER_STOP_TIMEOUT = DRAIN_TIMEOUT + FLUSH_TIMEOUT + 5
+
+# 转发给工作进程的事件及其分片键所在的字段
+ROUTED_EVENTS = {
+    "group_at_message_create": ("group_openid",),
+    "group_add_robot": ("group_openid",),
+    "group_del_robot": ("group_openid",),
+    "group_msg_reject": ("group_openid",),
+    "group_msg_receive": ("group_openid",),
+    "c2c_message_create": ("author", "user_openid"),
+    "friend_add": ("openid",),
+    "friend_del": ("openid",),
+    "c2c_msg_reject": ("openid",),
+    "c2c_msg_receive": ("openid",),
+}
+# 会修改数据目录的事件(管理员命令另行判断)
+STATE_EVENTS = {"group_add_robot", "group_del_robot"}
+
+
+def shard_key(event: str, data: dict) -> str:
+    """事件的分片键: 群事件为群 openid, 私聊事件为用户 openid"""
+    value = data
+    for field in ROUTED_EVENTS[event]:
+        value = value.get(field) if isinstance(value, dict) else None
+    return str(value or "")
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """一致性哈希环, 节点为工作进程编号 0..count-1
+
+    Args:
+        count: 工作进程数
+        vnodes: 每个进程的虚拟节点数
+    """
+
+    def __init__(self, count: int, vnodes: int = VNODES):
+        if count < 1:
+            raise ValueError("工作进程数至少为 1")
+        self.count = count
+        ring = sorted((_point(f"worker-{node}#{replica}"), node)
+                      for node in range(count) for replica in range(vnodes))
+        self._points = [point for point, _node in ring]
+        self._nodes = [node for _point_, node in ring]
+
+    def owner(self, key: str) -> int:
+        """负责该键的工作进程编号"""
+        i = bisect.bisect(self._points, _point(key))
+        return self._nodes[i % len(self._nodes)]
+
+
+def rebalance_plan(old_count: int, new_count: int, keys) -> dict:
+    """工作进程数从 old_count 变为 new_count 时需要换进程的键
+
+    Returns:
+        {key: (原进程编号, 新进程编号)}
+    """
+    old_ring, new_ring = HashRing(old_count), HashRing(new_count)
+    plan = {}
+    for key in keys:
+        before, after = old_ring.owner(key), new_ring.owner(key)
+        if before != after:
+            plan[key] = (before, after)
+    return plan
+
+
+def describe_plan(old_count: int, new_count: int, keys) -> str:
+    keys = list(keys)
+    plan = rebalance_plan(old_count, new_count, keys)
+    lines = [f"工作进程 {old_count} -> {new_count}: {len(plan)}/{len(keys)} 个群改由其他进程处理"]
+    for key, (before, after) in sorted(plan.items(), key=lambda item: item[1]):
+        lines.append(f"  {key}: {before} -> {after}")
+    return "\n".join(lines)
+
+
+def _known_groups(data_dir: str) -> list:
+    try:
+        with open(os.path.join(data_dir, "config.json"), "r", encoding="utf-8") as f:
+            return list(json.load(f).get("group_open_ids", []))
+    except (OSError, ValueError):
+        return []
+
+
+def _record_layout(data_dir: str, count: int):
+    """记录本次的工作进程数; 与上次不同时在日志中给出迁移计划"""
+    path = os.path.join(data_dir, LAYOUT_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            previous = int(json.load(f).get("workers", 0))
+    except (OSError, ValueError, TypeError):
+        previous = 0
+    if previous and previous != count:
+        _log.info(describe_plan(previous, count, _known_groups(data_dir)))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"workers": count}, f)
+    os.replace(tmp_path, path)
+
+
+# ---- 工作进程 ----
+
+class _KeyedChain:
+    """同一个键的协程按提交顺序逐个执行, 不同键之间并发"""
+
+    def __init__(self):
+        self._tails = {}
+
+    def submit(self, key: str, coro):
+        previous = self._tails.get(key)
+        task = asyncio.ensure_future(self._after(previous, coro))
+        self._tails[key] = task
+        task.add_done_callback(lambda done, key=key: self._tails.get(key) is done and self._tails.pop(key))
+        return task
+
+    @staticmethod
+    async def _after(previous, coro):
+        if previous is not None:
+            # 只等待完成, 前一个事件的异常已由 botpy 的 _run_event 处理
+            await asyncio.wait([previous])
+        await coro
+
+
+class ShardWorker:
+    """工作进程: 处理路由进程转发的事件
+
+    Args:
+        index: 进程编号, 0 号负责定时任务
+        settings: 配置快照
+        socket_path: 路由进程的 Unix 套接字
+    """
+
+    def __init__(self, index: int, settings, socket_path: str):
+        self.index = index
+        self.settings = settings
+        self.socket_path = socket_path
+        self.bot = None
+        self._chain = _KeyedChain()
+        self._key = ""
+        self._locked = False
+
+    async def run(self):
+        from .commands import SweepingBot
+
+        intents = build_intents(self.settings.intents, SweepingBot.HANDLED_INTENTS)
+        bot = SweepingBot(intents=intents, settings=self.settings, tenant=f"worker{self.index}",
+                          run_schedulers=self.index == 0)
+        self.bot = bot
+        await bot._async_setup_hook()
+        bot.token_manager = TokenManager(self.settings.appid, self.settings.secret,
+                                         cache_path=os.path.join(self.settings.data_dir, TOKEN_CACHE_FILE))
+        user = await bot.http.login(ManagedToken(bot.token_manager))
+        bot.token_manager.start()
+        # 不连接网关, 只借用 botpy 的事件解析器还原转发来的事件; 事件照常经 SweepingBot 调度
+        # (停止接收、进行中的任务记录), 只是任务按群排队执行
+        bot._connection = ConnectionSession(max_async=1, connect=None, dispatch=bot.ws_dispatch, loop=bot.loop,
+                                            api=bot.api)
+        bot.event_runner = self._submit
+        bot._connection.state.robot = Robot(user)
+        # 同一用户的私聊总是转发到同一个工作进程, 提示限流在这里生效
+        bot._install_event_filter()
+        await bot.on_ready()
+        _log.info(f"工作进程 {self.index} 已就绪" + (", 负责定时任务" if self.index == 0 else ""))
+        try:
+            await self._connect()
+        finally:
+            # 不调用 bot.close(): 工作进程没有网关会话需要保存
+            await bot.http.close()
+
+    async def _connect(self):
+        delay = 1
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=LINE_LIMIT)
+            except OSError as e:
+                _log.warning(f"工作进程 {self.index} 连接路由进程失败, {delay} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1
+            writer.write(json.dumps({"worker": self.index}).encode("utf-8") + b"\n")
+            await writer.drain()
+            await self._serve(reader)
+            writer.close()
+            _log.warning(f"工作进程 {self.index} 与路由进程的连接已断开, 重新连接")
+
+    async def _serve(self, reader):
+        while True:
+            try:
+                line = await reader.readline()
+            except (OSError, ValueError) as e:
+                _log.error(f"读取转发事件失败: {e}")
+                return
+            if not line:
+                return
+            try:
+                message = json.loads(line)
+                event, payload = message["t"], message["p"]
+                parser = self.bot._connection.parser[event]
+            except (ValueError, KeyError) as e:
+                _log.error(f"无法处理的转发事件: {e}")
+                continue
+            # 解析器同步调用 ws_dispatch -> _submit, 期间没有其他事件插入
+            self._key = shard_key(event, payload.get("d", {}))
+            self._locked = self._changes_state(event, payload.get("d", {}))
+            parser(payload)
+
+    def _changes_state(self, event: str, data: dict) -> bool:
+        """事件是否可能修改数据目录(管理员命令或进群/退群)"""
+        if event in STATE_EVENTS:
+            return True
+        content = (data.get("content") or "").strip()
+        if not content.startswith(self.bot.command_prefix):
+            return False
+        parts = content[len(self.bot.command_prefix):].strip().split()
+        name = parts[0].lower() if parts else ""
+        name = self.bot.command_aliases.get(name, name)
+        handler = self.bot.command_handlers.get(name)
+        # 未注册的命令按会修改处理, 宁可多加一次锁
+        return handler is None or getattr(handler, "is_admin", True)
+
+    def _submit(self, coro):
+        """SweepingBot 调度事件任务时调用: 同一个群的事件按收到的顺序执行"""
+        if self._locked:
+            coro = self._after_refresh(coro)
+        return self._chain.submit(self._key, coro)
+
+    async def _after_refresh(self, coro):
+        """会修改数据的事件: 先读入其他进程的修改再处理"""
+        try:
+            self.bot.reminder.refresh()
+        except OSError as e:
+            _log.error(f"读取其他进程的修改失败: {e}")
+        await coro
+
+
+def _worker_main(index: int, config_path: str, data_dir: str, socket_path: str):
+    """工作进程入口(spawn 启动, 不继承路由进程的事件循环)"""
+    settings = load_settings(config_path, data_dir)
+    worker = ShardWorker(index, settings, socket_path)
+    # 与单进程运行相同: 收到 SIGTERM 后等待进行中的工作并保存状态, 退出码反映放弃的工作
+    sys.exit(ShutdownCoordinator(lambda: [worker.bot] if worker.bot is not None else []).run(worker.run()))
+
+
+# ---- 路由进程 ----
+
+class _WorkerLink:
+    """路由进程到一个工作进程的发送队列; 断开期间事件保留在队列中, 重连后按顺序补发"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.writer = None
+        self.process = None
+        self.restarts = 0
+        self.forwarded = 0
+        self.dropped = 0
+
+    def put(self, line: bytes):
+        if len(self.queue) >= QUEUE_LIMIT:
+            self.queue.popleft()
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                _log.warning(f"工作进程 {self.index} 积压过多, 已丢弃 {self.dropped} 个最早的事件")
+        self.queue.append(line)
+        self.wakeup.set()
+
+    async def pump(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.queue and self.writer is not None:
+                line = self.queue[0]
+                try:
+                    self.writer.write(line)
+                    await self.writer.drain()
+                except (OSError, ConnectionError):
+                    # 当前事件留在队首, 重连后重发
+                    self.writer = None
+                    break
+                self.queue.popleft()
+                self.forwarded += 1
+
+
+class ShardRouter(botpy.Client):
+    """路由进程: 持有网关连接, 按群把事件转发给工作进程
+
+    Args:
+        intents: 事件通道
+        settings: 配置快照
+        workers: 工作进程数
+    """
+
+    def __init__(self, intents, settings, workers: int):
+        super().__init__(intents=intents)
+        self.settings = settings
+        self.ring = HashRing(workers)
+        self.links = []
+        self.socket_path = os.path.abspath(os.path.join(settings.data_dir, SOCKET_FILE))
+        self.token_manager = None
+        self._server = None
+        self._stopping = False
+
+    def serve(self, appid: str, secret: str) -> int:
+        """运行到收到 SIGTERM/SIGINT 或网关连接出错结束, 等待工作进程退出后返回退出码"""
+        return self.loop.run_until_complete(self._serve(appid, secret))
+
+    async def _serve(self, appid: str, secret: str) -> int:
+        stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(sig, self._request_stop, stop, sig.name)
+        main = asyncio.ensure_future(self._run_gateway(appid, secret))
+        waiter = asyncio.ensure_future(stop.wait())
+        await asyncio.wait([main, waiter], return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if main.done() and not main.cancelled() and main.exception() is not None:
+            _log.error(f"网关连接出错结束, 停止工作进程后退出: {main.exception()}")
+        code = await self._stop_workers()
+        if not main.done():
+            main.cancel()
+            await asyncio.wait([main])
+        return code
+
+    async def _run_gateway(self, appid: str, secret: str):
+        # 与 botpy.Client.run 相同, 结束(被取消)时关闭网关连接
+        async with self:
+            await self.start(appid, secret)
+
+    def _request_stop(self, stop: asyncio.Event, reason: str):
+        if not stop.is_set():
+            _log.warning(f"收到 {reason}, 通知工作进程处理完进行中的工作后退出(最多 {WORKER_STOP_TIMEOUT} 秒)")
+            stop.set()
+            return
+        # 再次收到时转发给工作进程, 它们不再等待
+        _log.warning(f"再次收到 {reason}, 通知工作进程立即退出")
+        self._signal_workers()
+
+    def _signal_workers(self):
+        for link in self.links:
+            if link.process is not None and link.process.is_alive():
+                link.process.terminate()
+
+    async def _stop_workers(self) -> int:
+        """向工作进程转发 SIGTERM 并等待其退出, 返回退出码"""
+        self._stopping = True
+        self._signal_workers()
+        loop = asyncio.get_running_loop()
+        processes = [link.process for link in self.links if link.process is not None]
+        await asyncio.gather(*(loop.run_in_executor(None, process.join, WORKER_STOP_TIMEOUT)
+                               for process in processes))
+        code = EXIT_OK
+        for link in self.links:
+            process = link.process
+            if process is None:
+                continue
+            if process.is_alive():
+                _log.error(f"工作进程 {link.index} 在 {WORKER_STOP_TIMEOUT} 秒内没有退出, 强制结束")
+                process.kill()
+                process.join()
+                code = EXIT_ABANDONED
+            elif process.exitcode != 0:
+                _log.error(f"工作进程 {link.index} 退出码 {process.exitcode}")
+                code = EXIT_ABANDONED
+        if code == EXIT_OK:
+            _log.info("工作进程已全部正常退出")
+        return code
+
+    async def start(self, appid: str, secret: str, ret_coro: bool = False):
+        """启动工作进程和本地套接字后再登录网关"""
+        await self._start_workers()
+        self.token_manager = TokenManager(
+            appid, secret, cache_path=os.path.join(self.settings.data_dir, TOKEN_CACHE_FILE))
+        token = ManagedToken(self.token_manager)
+        self.ret_coro = ret_coro
+
+        if self.loop is botpy.client._loop:
+            await self._async_setup_hook()
+
+        await self._bot_login(token)
+        self.token_manager.start()
+        # 网关收到的群/私聊事件不在本进程解析, 直接转发原始内容; 其他没有处理函数的事件直接丢弃
+        parsers = self._connection.parser
+        for event in list(parsers):
+            if event in ROUTED_EVENTS:
+                parsers[event] = lambda payload, event=event: self._forward(event, payload)
+            elif not hasattr(self, "on_" + event):
+                parsers[event] = ignore_event
+        return await self._bot_init(token)
+
+    async def _start_workers(self):
+        _record_layout(self.settings.data_dir, self.ring.count)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._on_worker, path=self.socket_path, limit=LINE_LIMIT)
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.ring.count):
+            link = _WorkerLink(index)
+            self.links.append(link)
+            self._spawn(context, link)
+            asyncio.create_task(link.pump())
+        asyncio.create_task(self._supervise(context))
+        _log.info(f"已启动 {self.ring.count} 个工作进程")
+
+    def _spawn(self, context, link: _WorkerLink):
+        link.process = context.Process(
+            target=_worker_main, name=f"sweeping-worker-{link.index}",
+            args=(link.index, self.settings.config_path, self.settings.data_dir, self.socket_path),
+            daemon=True)
+        link.process.start()
+
+    async def _supervise(self, context):
+        """工作进程退出时按退避时间重新启动, 期间的事件留在队列中"""
+        while not self._stopping:
+            await asyncio.sleep(5)
+            for link in self.links:
+                if self._stopping:
+                    return
+                if link.process.is_alive():
+                    continue
+                link.writer = None
+                link.restarts += 1
+                delay = min(2 ** link.restarts, 60)
+                _log.error(f"工作进程 {link.index} 已退出(退出码 {link.process.exitcode}), "
+                           f"{delay} 秒后第 {link.restarts} 次重启")
+                await asyncio.sleep(delay)
+                if self._stopping:
+                    return
+                self._spawn(context, link)
+
+    async def _on_worker(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline())
+            link = self.links[int(hello["worker"])]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            _log.error(f"未知的工作进程连接: {e}")
+            writer.close()
+            return
+        link.writer = writer
+        link.wakeup.set()
+        _log.info(f"工作进程 {link.index} 已连接, 待转发事件 {len(link.queue)} 个")
+        # 工作进程不会发送其他内容, 读到结束即表示断开
+        await reader.read()
+        if link.writer is writer:
+            link.writer = None
+
+    def _forward(self, event: str, payload: dict):
+        if event == "group_at_message_create" and not is_command_event(payload):
+            # 群聊中的非命令消息工作进程也不会处理, 不必转发
+            return
+        index = self.ring.owner(shard_key(event, payload.get("d", {})))
+        self.links[index].put(json.dumps({"t": event, "p": payload}, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    async def on_ready(self):
+        _log.info(f"路由进程已连接网关, 事件分发给 {self.ring.count} 个工作进程")
+
+    async def close(self):
+        # 工作进程由 _stop_workers 停止, 这里只关闭网关和本地套接字
+        if self._server is not None:
+            self._server.close()
+        if self.token_manager is not None:
+            self.token_manager.stop()
+        await super().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看工作进程数变化时各群的迁移计划")
+    parser.add_argument("--plan", type=int, required=True, metavar="N", help="新的工作进程数")
+    parser.add_argument("--from", dest="previous", type=int, help="原工作进程数(默认读取上次运行的记录)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    args = parser.parse_args()
+
+    previous = args.previous
+    if previous is None:
+        try:
+            with open(os.path.join(args.data_dir, LAYOUT_FILE), "r", encoding="utf-8") as f:
+                previous = int(json.load(f)["workers"])
+        except (OSError, ValueError, KeyError):
+            sys.exit("没有上次运行的记录, 请用 --from 指定原工作进程数")
+    print(describe_plan(previous, args.plan, _known_groups(args.data_dir)))
+
+
+if __name__ == "__main__":
+    main()
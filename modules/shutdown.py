@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+退出流程
+
+原来 systemctl stop/restart 或出错退出时直接结束事件循环: 正在重试的提醒、尚未发出的回复和
+汇总中的管理员通知都会丢失。现在收到 SIGTERM/SIGINT(或主任务出错结束)后按顺序退出:
+    1. 不再接受新的事件和任务: 网关会话的 seq 停在这一刻, 之后收到的事件由下次 resume 补发
+    2. 取消定时提醒和索引更新任务; 正在发送的提醒不受影响, 继续发送
+    3. 等待正在处理的消息和正在发送的提醒, 最多 DRAIN_TIMEOUT 秒, 超时的取消
+    4. 保存一次状态: 写入失败的成员/配置、汇总中的管理员通知, 关闭 SMTP 连接, 停止令牌刷新
+    5. 结束主任务(断开网关、保存网关会话、释放主实例租约)
+全部完成时退出码为 0, 有被放弃的工作时为 EXIT_ABANDONED。等待期间再次收到信号时立即结束等待;
+SIGNAL_GRACE 秒内的重复信号属于同一次停止(systemd 向整个 cgroup 发送, 分片的路由进程又转发一次), 不算再次收到。
+
+被管理的对象(SweepingBot、SchedulerService)需要提供:
+    stop_accepting(): 停止接受新的事件或任务
+    inflight: 正在执行的任务集合
+    reminder: Reminder
+    token_manager: 可选, TokenManager
+"""
+
+import time
+import signal
+import asyncio
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+# 等待进行中的工作的最长时间(秒), 应小于 systemd 的 TimeoutStopSec(默认 90 秒)
+DRAIN_TIMEOUT = 30
+# 发送汇总通知至少等待的时间(秒), 等待进行中的工作耗尽了时限时也会尝试一次
+FLUSH_TIMEOUT = 10
+EXIT_OK = 0
+# 退出时有未完成的消息处理、提醒发送或管理员通知
+EXIT_ABANDONED = 3
+# 第一次信号之后该秒数内的信号视为重复送达, 忽略
+SIGNAL_GRACE = 1
+
+
+class ShutdownCoordinator:
+    """收到退出信号后停止接收、等待进行中的工作并保存状态
+
+    Args:
+        services: 返回当前所有被管理对象的函数(托管多个机器人时对象在主任务中创建)
+        drain_timeout: 等待进行中的工作的最长时间(秒)
+    """
+
+    def __init__(self, services, drain_timeout: float = DRAIN_TIMEOUT):
+        self.services = services
+        self.drain_timeout = drain_timeout
+        self.abandoned = {}
+        self._requested = None
+        self._requested_at = 0.0
+        self._forced = None
+
+    def run(self, main) -> int:
+        """在当前事件循环中运行主协程, 返回退出码; 主任务的异常在保存状态后重新抛出"""
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(self._run(main))
+
+    def request(self, reason: str):
+        """开始退出; 已在退出中时结束等待"""
+        if not self._requested.is_set():
+            _log.warning(f"收到 {reason}, 停止接收新消息并等待进行中的工作(最多 {self.drain_timeout} 秒)")
+            self._requested.set()
+            self._requested_at = time.monotonic()
+        elif time.monotonic() - self._requested_at < SIGNAL_GRACE:
+            return
+        elif not self._forced.is_set():
+            _log.warning(f"再次收到 {reason}, 不再等待, 立即退出")
+            self._forced.set()
+
+    def _install_signals(self, loop):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows 的事件循环不支持 add_signal_handler
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(
+                    self.request, signal.Signals(signum).name))
+
+    async def _run(self, main) -> int:
+        loop = asyncio.get_running_loop()
+        self._requested = asyncio.Event()
+        self._forced = asyncio.Event()
+        self._install_signals(loop)
+        main_task = asyncio.ensure_future(main)
+        stop_task = asyncio.ensure_future(self._requested.wait())
+        await asyncio.wait([main_task, stop_task], return_when=asyncio.FIRST_COMPLETED)
+        if main_task.done() and not self._requested.is_set():
+            if main_task.exception() is not None:
+                _log.error(f"主任务出错结束, 保存状态后退出: {main_task.exception()}")
+            self._requested.set()
+        stop_task.cancel()
+
+        await self.shutdown()
+        if not main_task.done():
+            main_task.cancel()
+            await asyncio.wait([main_task])
+        if not main_task.cancelled() and main_task.exception() is not None:
+            raise main_task.exception()
+        return self._report()
+
+    async def shutdown(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        services = list(self.services())
+        for service in services:
+            service.stop_accepting()
+            reminder = service.reminder
+            if reminder.leader is not None:
+                # 不再续期和接管, 以免等待期间重新启动定时任务; 租约在主任务结束时释放
+                reminder.leader.pause()
+            reminder.stop_schedulers()
+
+        await self._drain(services, deadline)
+
+        for service in services:
+            await self._flush(service, max(deadline - loop.time(), FLUSH_TIMEOUT))
+
+    async def _drain(self, services, deadline):
+        """等待进行中的消息处理和提醒发送, 超时或再次收到信号时取消"""
+        loop = asyncio.get_running_loop()
+        pending = {}
+        for service in services:
+            for task in list(service.inflight):
+                pending[task] = "handlers"
+            delivery = service.reminder.delivery
+            if delivery is not None and not delivery.done():
+                pending[delivery] = "deliveries"
+        if not pending:
+            return
+        _log.info(f"等待 {len(pending)} 个进行中的任务完成")
+        forced = asyncio.ensure_future(self._forced.wait())
+        remaining = set(pending)
+        while remaining and not forced.done():
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            done, _ = await asyncio.wait(remaining | {forced}, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            remaining -= done
+        forced.cancel()
+        for task in remaining:
+            task.cancel()
+            kind = pending[task]
+            self.abandoned[kind] = self.abandoned.get(kind, 0) + 1
+        if remaining:
+            await asyncio.wait(remaining)
+
+    async def _flush(self, service, timeout: float):
+        """保存一次状态"""
+        reminder = service.reminder
+        reminder.flush_state()
+        notifier = reminder.notifier
+        notifier.stop()
+        if notifier.pending():
+            try:
+                await asyncio.wait_for(notifier.flush(), timeout)
+            except asyncio.TimeoutError:
+                _log.error("退出前发送管理员汇总通知超时")
+            if notifier.pending():
+                self.abandoned["notifications"] = self.abandoned.get("notifications", 0) + notifier.pending()
+        reminder.mailer.close()
+        token_manager = getattr(service, "token_manager", None)
+        if token_manager is not None:
+            token_manager.stop()
+
+    def _report(self) -> int:
+        if not self.abandoned:
+            _log.info("进行中的工作已全部完成, 正常退出")
+            return EXIT_OK
+        names = {"handlers": "消息处理", "deliveries": "提醒发送", "notifications": "管理员通知"}
+        summary = ", ".join(f"{names[kind]} {count} 个" for kind, count in self.abandoned.items())
+        _log.error(f"退出时放弃了未完成的工作: {summary}")
+        return EXIT_ABANDONED
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+数据目录的跨进程写入
+
+独立调度进程、主备的两个实例和分片的工作进程都会修改同一个 member.json/config.json,
+每个进程只按自己内存中的内容整体写回, 一方的修改(例如 /addm)会覆盖另一方刚写入的
+发送日期或轮换位置。现在所有写入都:
+    - 持有数据目录下 .state.lock 的文件锁(fcntl.flock), 同一时间只有一个进程在读写
+    - 写入前重新读取文件, 与上次读到/写入的内容比较做三方合并: 本进程改过的字段用本进程的值,
+      其余字段保留文件中(其他进程写入)的值, 再写回合并结果
+锁只在一次读-合并-写期间持有(几毫秒), 不跨越 await。不支持 fcntl 的平台(Windows)只做合并。
+"""
+
+import os
+import json
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOCK_FILE = ".state.lock"
+
+_locks = {}
+_MISSING = object()
+
+
+class StateLock:
+    """数据目录的文件锁, 同一进程内可重入
+
+    同一进程中同一数据目录只应有一个实例(见 for_data_dir): flock 按打开的文件区分,
+    同一进程的两个文件描述符也会互相阻塞。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+
+    @classmethod
+    def for_data_dir(cls, data_dir: str) -> "StateLock":
+        path = os.path.abspath(os.path.join(data_dir, LOCK_FILE))
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = cls(path)
+        return lock
+
+    def __enter__(self):
+        if self._depth == 0 and fcntl is not None:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+def normalize(data):
+    """转换为 JSON 读回后的形式(整数键变为字符串), 便于比较"""
+    return json.loads(json.dumps(data, ensure_ascii=False))
+
+
+def read_json(path: str):
+    """读取 JSON 文件, 不存在或无法解析时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def merge_changes(base, ours, theirs):
+    """三方合并: base 为上次读到或写入的内容, ours 为本进程的当前内容, theirs 为文件中的内容
+
+    本进程改过的字段(与 base 不同)取 ours, 没改过的取 theirs; 两边都改过的字典逐个键合并。
+    base 或 theirs 不可用时直接返回 ours。
+    """
+    if not isinstance(base, dict) or not isinstance(ours, dict) or not isinstance(theirs, dict):
+        return ours
+    merged = {}
+    for key in list(theirs) + [key for key in ours if key not in theirs]:
+        mine = ours.get(key, _MISSING)
+        old = base.get(key, _MISSING)
+        other = theirs.get(key, _MISSING)
+        if mine == old:
+            value = other
+        elif isinstance(mine, dict) and isinstance(other, dict) and isinstance(old, dict):
+            value = merge_changes(old, mine, other)
+        else:
+            value = mine
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+提醒消息模板
+
+config.json 中的 message_templates 在加载时统一解析和校验: 引用了未知字段、括号不匹配
+等错误会立即报出, 而不是等到发送提醒时才抛出 KeyError。每个模板被编译为
+"文本片段 + 字段" 的序列; 日期相关字段(year/month/day/weekday/date)每天只填充一次并缓存,
+发送时只需填入成员相关字段再拼接。
+
+支持按语言覆盖模板:
+    "message_templates": {
+        "normal": "...", "pause": "...",             # 默认(中文)
+        "language": "en",                            # 可选, 提醒使用的语言
+        "languages": {"en": {"normal": "...", "pause": "..."}}
+    }
+查找顺序: 所用语言的模板 -> 默认模板。提醒邮件发给成员本人, 不属于某个群,
+因此不支持按群覆盖; 配置了 groups 时报错, 而不是静默忽略。
+"""
+
+import string
+from datetime import date
+
+KIND_NORMAL = "normal"
+KIND_PAUSE = "pause"
+KINDS = (KIND_NORMAL, KIND_PAUSE)
+
+LANG_DEFAULT = "zh"
+WEEKDAY_NAMES = {
+    "zh": ("一", "二", "三", "四", "五", "六", "日"),
+    "en": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+}
+
+# 每天固定的字段和每位成员不同的字段
+DAY_FIELDS = frozenset({"year", "month", "day", "weekday", "date"})
+MEMBER_FIELDS = frozenset({"name", "id", "qq"})
+FIELDS = DAY_FIELDS | MEMBER_FIELDS
+
+DEFAULT_TEMPLATES = {
+    KIND_NORMAL: "今天 ({year}-{month}-{day}) 星期 {weekday} ,今天该 {name} 你扫地啦",
+    KIND_PAUSE: "今天( {year}-{month}-{day} ) 星期 {weekday} ,本应该是 {name} 扫地,但轮换任务已暂停(不用扫)",
+}
+
+_formatter = string.Formatter()
+
+
+class CompiledTemplate:
+    """编译后的模板
+
+    parts 中字符串为文本片段, 元组 (字段, 转换, 格式) 为待填充字段。
+    """
+
+    __slots__ = ("source", "parts", "fields", "_day", "_day_parts")
+
+    def __init__(self, source: str, where: str = "模板"):
+        self.source = source
+        parts = []
+        fields = set()
+        try:
+            for literal, field, spec, conversion in _formatter.parse(source):
+                if literal:
+                    parts.append(literal)
+                if field is None:
+                    continue
+                if field not in FIELDS:
+                    raise ValueError(f"{where} 引用了未知字段 {{{field}}}, 可用字段: {', '.join(sorted(FIELDS))}")
+                if conversion not in (None, "s", "r", "a"):
+                    raise ValueError(f"{where} 中字段 {{{field}}} 的转换符无效: !{conversion}")
+                parts.append((field, conversion, spec or ""))
+                fields.add(field)
+        except ValueError as e:
+            if str(e).startswith(where):
+                raise
+            raise ValueError(f"{where} 格式错误: {e}")
+        self.parts = tuple(parts)
+        self.fields = frozenset(fields)
+        # 校验格式说明符
+        self._fill(self.parts, {"year": 2000, "month": 1, "day": 1, "weekday": "", "date": "",
+                                "name": "", "id": 0, "qq": ""}, where)
+        self._day = None
+        self._day_parts = None
+
+    @staticmethod
+    def _fill(parts, values: dict, where: str = "模板") -> list:
+        """填充 values 中存在的字段, 其余字段保持原样"""
+        filled = []
+        for part in parts:
+            if isinstance(part, str) or part[0] not in values:
+                filled.append(part)
+                continue
+            field, conversion, spec = part
+            value = _formatter.convert_field(values[field], conversion)
+            try:
+                filled.append(format(value, spec))
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"{where} 中字段 {{{field}}} 的格式 '{spec}' 无效: {e}")
+        return filled
+
+    def render(self, day_values: dict, day_key, member) -> str:
+        if day_key != self._day:
+            # 日期字段每天只填充一次, 相邻的文本片段合并
+            merged = []
+            for part in self._fill(self.parts, day_values):
+                if isinstance(part, str) and merged and isinstance(merged[-1], str):
+                    merged[-1] += part
+                else:
+                    merged.append(part)
+            self._day_parts = tuple(merged)
+            self._day = day_key
+        member_values = {"name": member.name, "id": member.id, "qq": member.qq_id}
+        return "".join(self._fill(self._day_parts, member_values))
+
+
+class TemplateSet:
+    """全部消息模板及其语言/群变体
+
+    Raises:
+        ValueError: 模板格式错误或引用了未知字段
+    """
+
+    def __init__(self, config: dict):
+        if not isinstance(config, dict):
+            raise ValueError("message_templates 必须是对象")
+        self.defaults = self._compile_kinds(config, "message_templates", required=True)
+        if "groups" in config:
+            raise ValueError("message_templates.groups 不受支持: 提醒邮件发给成员本人, 无法按群选择模板, "
+                             "请改用 language 和 languages")
+        self.languages = {}
+        for lang, templates in (config.get("languages") or {}).items():
+            if lang not in WEEKDAY_NAMES:
+                raise ValueError(f"不支持的语言: {lang}, 可选: {', '.join(WEEKDAY_NAMES)}")
+            self.languages[lang] = self._compile_kinds(templates, f"languages.{lang}")
+        self.language = config.get("language", LANG_DEFAULT)
+        if self.language not in WEEKDAY_NAMES:
+            raise ValueError(f"message_templates.language 不支持: {self.language}, 可选: {', '.join(WEEKDAY_NAMES)}")
+        self._day_cache = {}
+        self._cache_day = None
+
+    @staticmethod
+    def _compile_kinds(templates, where: str, required: bool = False) -> dict:
+        if not isinstance(templates, dict):
+            raise ValueError(f"{where} 必须是对象")
+        compiled = {}
+        for kind in KINDS:
+            source = templates.get(kind)
+            if source is None:
+                if required:
+                    # 旧配置可能没有 pause 模板, 使用默认值
+                    source = DEFAULT_TEMPLATES[kind]
+                else:
+                    continue
+            if not isinstance(source, str):
+                raise ValueError(f"{where}.{kind} 必须是字符串")
+            compiled[kind] = CompiledTemplate(source, f"{where}.{kind}")
+        return compiled
+
+    def warnings(self) -> list:
+        """不影响使用但可能是笔误的问题, 例如模板中没有 {name}"""
+        result = []
+        scopes = [("message_templates", self.defaults)]
+        scopes += [(f"languages.{k}", v) for k, v in self.languages.items()]
+        for where, templates in scopes:
+            for kind, template in templates.items():
+                if "name" not in template.fields:
+                    result.append(f"{where}.{kind} 中没有 {{name}}, 提醒消息不会包含值日人员")
+        return result
+
+    def resolve(self, kind: str, language: str = None) -> tuple:
+        """返回 (模板, 语言), language 默认为配置的 language"""
+        language = language or self.language
+        template = self.languages.get(language, {}).get(kind)
+        if template is not None:
+            return template, language
+        # 默认模板是中文的, 星期也用中文
+        return self.defaults[kind], LANG_DEFAULT
+
+    def _day_values(self, day: date, language: str) -> dict:
+        if day != self._cache_day:
+            # 只保留当天的缓存
+            self._day_cache.clear()
+            self._cache_day = day
+        values = self._day_cache.get(language)
+        if values is None:
+            values = {
+                "year": day.year, "month": day.month, "day": day.day,
+                "weekday": WEEKDAY_NAMES[language][day.weekday()],
+                "date": day.isoformat(),
+            }
+            self._day_cache[language] = values
+        return values
+
+    def render(self, kind: str, member, day: date = None, language: str = None) -> str:
+        """渲染提醒消息"""
+        template, language = self.resolve(kind, language)
+        day = day or date.today()
+        return template.render(self._day_values(day, language), (day, language), member)
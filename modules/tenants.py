@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+单进程托管多个机器人
+
+原来每个地点/机器人各开一个 screen 会话和完整的 Python 进程, 每个进程都有自己的解释器、
+botpy 客户端、SMTP 连接和状态文件。现在可以用一份清单(tenants.yaml)在同一个进程、
+同一个事件循环中运行多个机器人:
+    - 共享: 开放平台 HTTP 连接池、配置文件监视器(一个 inotify)、线程池(SMTP 发送)、计数
+    - 隔离: 每个机器人有自己的 config.yaml(appid/secret/管理员)和数据目录(成员、配置、令牌缓存)
+某个机器人登录失败或断开只影响它自己, 按退避时间重试, 不影响其他机器人。
+
+清单格式:
+    tenants:
+      - name: 东区
+        config: sites/east/config.yaml
+        data_dir: sites/east/data
+"""
+
+import os
+import asyncio
+
+import aiohttp
+from botpy import logging as botpy_logging
+
+from .metrics import METRICS
+from .settings import load_settings, build_intents
+from .watcher import FileWatcher
+
+_log = botpy_logging.get_logger()
+
+# 所有机器人共用的开放平台连接池大小
+SHARED_POOL_LIMIT = 100
+# 汇总计数写入日志的间隔(秒)
+METRICS_LOG_INTERVAL = 3600
+
+
+class Tenant:
+    __slots__ = ("name", "settings", "client")
+
+    def __init__(self, name: str, settings):
+        self.name = name
+        self.settings = settings
+        self.client = None
+
+
+def _resolve(base: str, path: str) -> str:
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base, path))
+
+
+def load_tenants(path: str) -> list:
+    """读取机器人清单, 并加载每个机器人自己的 config.yaml
+
+    Raises:
+        FileNotFoundError: 清单或某个 config.yaml 不存在
+        ValueError: 清单格式错误、名称或 appid/数据目录重复
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"机器人清单不存在: {path}")
+    from botpy.ext.cog_yaml import read
+    raw = read(path)
+    entries = raw.get("tenants") if isinstance(raw, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("机器人清单缺少 tenants 列表")
+
+    base = os.path.dirname(os.path.abspath(path))
+    tenants, names, appids, data_dirs = [], set(), set(), set()
+    for i, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict) or not entry.get("config"):
+            raise ValueError(f"第 {i} 个机器人缺少 config")
+        name = str(entry.get("name") or f"bot{i}")
+        config_path = _resolve(base, entry["config"])
+        data_dir = _resolve(base, entry.get("data_dir") or os.path.join(os.path.dirname(config_path), "data"))
+        os.makedirs(data_dir, exist_ok=True)
+        settings = load_settings(config_path, data_dir)
+        for value, seen, label in ((name, names, "名称"), (settings.appid, appids, "appid"),
+                                   (os.path.abspath(data_dir), data_dirs, "数据目录")):
+            if value in seen:
+                raise ValueError(f"机器人{label}重复: {value}")
+            seen.add(value)
+        tenants.append(Tenant(name, settings))
+    return tenants
+
+
+class TenantHost:
+    """在当前事件循环中运行多个机器人
+
+    Args:
+        tenants: load_tenants 的结果
+        startup_timer: 可选, 启动计时
+    """
+
+    def __init__(self, tenants: list, startup_timer=None):
+        self.tenants = tenants
+        self.startup_timer = startup_timer
+        self.session = None
+        self.watcher = None
+
+    async def run(self):
+        from .commands import SweepingBot
+
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=SHARED_POOL_LIMIT))
+        self.watcher = FileWatcher()
+        self.watcher.start()
+        for tenant in self.tenants:
+            METRICS.register(tenant.name)
+            intents = build_intents(tenant.settings.intents, SweepingBot.HANDLED_INTENTS)
+            tenant.client = SweepingBot(intents=intents, settings=tenant.settings, tenant=tenant.name,
+                                        http_session=self.session, watcher=self.watcher)
+        if self.startup_timer is not None:
+            self.startup_timer.mark(f"创建 {len(self.tenants)} 个机器人实例")
+            _log.info(self.startup_timer.summary())
+        metrics_task = asyncio.create_task(self._log_metrics())
+        try:
+            await asyncio.gather(*(self._run_tenant(tenant) for tenant in self.tenants))
+        finally:
+            metrics_task.cancel()
+            self.watcher.stop()
+            for tenant in self.tenants:
+                await tenant.client.close()
+            await self.session.close()
+
+    async def _run_tenant(self, tenant: Tenant):
+        """运行单个机器人, 出错时只重试它自己"""
+        client = tenant.client
+        await client._async_setup_hook()
+        delay = 10
+        while True:
+            try:
+                _log.info(f"[{tenant.name}] 正在登录...")
+                await client.start(appid=tenant.settings.appid, secret=tenant.settings.secret)
+                _log.warning(f"[{tenant.name}] 网关连接已结束, {delay} 秒后重新连接")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _log.error(f"[{tenant.name}] 运行出错, {delay} 秒后重试: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 600)
+
+    async def _log_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            _log.info(METRICS.summary())
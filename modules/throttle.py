@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+私聊非命令消息的提示限流
+
+私聊中每条不以命令前缀开头的消息原来都会回复一次"请使用/help查看可用命令"并写一行日志,
+闲聊的用户每发一条就多一次开放平台请求。现在同一用户在 HINT_WINDOW 秒内只提示一次,
+窗口内的其余闲聊在构造消息对象之前就被丢弃。
+
+记录的用户数有上限(HINT_CAPACITY), 超过时淘汰最久未提示的用户, 过期的记录在访问时顺带清除,
+内存占用不会随私聊用户数无限增长。
+"""
+
+import time
+from collections import OrderedDict
+
+# 同一用户两次提示之间的最短间隔(秒)
+HINT_WINDOW = 3600
+# 最多记录的用户数
+HINT_CAPACITY = 10000
+
+
+class RecentKeys:
+    """带过期时间和容量上限的最近访问记录(LRU)
+
+    Args:
+        ttl: 记录的有效期(秒)
+        capacity: 最多保留的记录数
+    """
+
+    def __init__(self, ttl: float = HINT_WINDOW, capacity: int = HINT_CAPACITY):
+        self.ttl = ttl
+        self.capacity = capacity
+        self._expires = OrderedDict()
+
+    def __len__(self):
+        return len(self._expires)
+
+    def hit(self, key: str) -> bool:
+        """key 在有效期内出现过时返回 True; 否则记录本次并返回 False"""
+        now = time.monotonic()
+        self._evict(now)
+        if key in self._expires:
+            return True
+        self._expires[key] = now + self.ttl
+        if len(self._expires) > self.capacity:
+            self._expires.popitem(last=False)
+        return False
+
+    def _evict(self, now: float):
+        # 有效期相同, 按写入顺序排列即按过期时间排列, 只需检查开头
+        expires = self._expires
+        while expires:
+            key, deadline = next(iter(expires.items()))
+            if deadline > now:
+                return
+            del expires[key]
+
+    def clear(self):
+        self._expires.clear()
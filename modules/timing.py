@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+启动阶段计时
+
+记录从进程启动到网关就绪的各阶段耗时, 便于对比 systemd 重启时每一步花费的时间。
+"""
+
+import time
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+
+class PhaseTimer:
+    """按阶段累计耗时的计时器
+
+    用法:
+        timer = PhaseTimer(origin=time.perf_counter())
+        with timer.phase("读取配置"):
+            ...
+        timer.mark("网关就绪")
+        _log.info(timer.summary())
+    """
+
+    def __init__(self, name: str = "启动", origin: float = None):
+        self.name = name
+        self.origin = time.perf_counter() if origin is None else origin
+        self._last = self.origin
+        self.phases = []
+
+    def mark(self, phase: str) -> float:
+        """记录从上一个阶段结束到现在的耗时, 返回该阶段秒数"""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self.phases.append((phase, elapsed))
+        self._last = now
+        return elapsed
+
+    def phase(self, phase: str):
+        return _Phase(self, phase)
+
+    @property
+    def total(self) -> float:
+        return self._last - self.origin
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{phase} {elapsed * 1000:.1f}ms" for phase, elapsed in self.phases)
+        return f"{self.name}耗时 {self.total * 1000:.1f}ms: {parts}"
+
+
+class _Phase:
+    def __init__(self, timer: PhaseTimer, phase: str):
+        self._timer = timer
+        self._phase = phase
+
+    def __enter__(self):
+        # 阶段之间的空档不计入下一个阶段
+        self._timer._last = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timer.mark(self._phase)
+        return False
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+access_token 管理
+
+机器人和 develop/ 下的工具共用。access_token 的有效期是 7200 秒, 原来每个工具实例启动时
+各自获取一次且从不刷新, 长时间运行会因令牌过期失败。这里:
+    - 令牌缓存在内存中, 可选再写入权限为 0600 的文件, 重启或运行其他工具时直接复用
+    - 后台任务在过期前 refresh_margin 秒提前刷新, 失败时退避重试, 调用方不会等待
+    - 多个调用方同时需要刷新时共享同一次请求(single-flight)
+"""
+
+import os
+import json
+import time
+import asyncio
+
+import aiohttp
+from botpy import logging as botpy_logging
+from botpy.robot import Token
+
+_log = botpy_logging.get_logger()
+
+TOKEN_URL = "https://bots.qq.com/app/getAppAccessToken"
+# 数据目录下的令牌缓存文件名
+CACHE_FILE = ".access_token"
+# 距离过期不足该秒数时视为已过期, 避免请求途中失效
+EXPIRY_SKEW = 30
+
+
+class TokenManager:
+    """单个机器人(appid)的 access_token 管理器
+
+    Args:
+        app_id: 机器人 appid
+        secret: 机器人 secret
+        cache_path: 可选, 令牌缓存文件路径
+        refresh_margin: 提前多少秒刷新
+        token_url: 获取令牌的地址
+    """
+
+    def __init__(self, app_id: str, secret: str, cache_path: str = None, refresh_margin: float = 300,
+                 token_url: str = TOKEN_URL):
+        self.app_id = str(app_id)
+        self.secret = secret
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.token_url = token_url
+        self.token = None
+        self.expires_at = 0.0
+        self.refreshes = 0
+        self._inflight = None
+        self._task = None
+        self._load_cache()
+
+    # ---- 磁盘缓存 ----
+
+    def _load_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("app_id") == self.app_id and cached.get("expires_at", 0) - EXPIRY_SKEW > time.time():
+            self.token = cached["access_token"]
+            self.expires_at = float(cached["expires_at"])
+            _log.info(f"使用缓存的access_token, 剩余 {int(self.expires_at - time.time())} 秒")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            # 先以 0600 创建, 令牌不会出现在其他用户可读的文件中
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"app_id": self.app_id, "access_token": self.token, "expires_at": self.expires_at}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            _log.warning(f"写入access_token缓存失败: {e}")
+
+    # ---- 获取与刷新 ----
+
+    def valid(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at - EXPIRY_SKEW
+
+    async def get(self) -> str:
+        """返回有效的令牌, 必要时等待(共享的)刷新请求"""
+        if self.valid():
+            return self.token
+        return await self.refresh()
+
+    def invalidate(self, token: str = None):
+        """令牌被服务端拒绝时调用; token 为已失效的令牌, 已经换新时忽略"""
+        if token is None or token == self.token:
+            self.token = None
+            self.expires_at = 0.0
+
+    async def refresh(self) -> str:
+        """获取新令牌, 并发调用共享同一次请求"""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future):
+        if self._inflight is future:
+            self._inflight = None
+        if not future.cancelled():
+            # 避免无人等待时出现 "exception was never retrieved"
+            future.exception()
+
+    async def _fetch(self) -> str:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                self.token_url,
+                json={"appId": self.app_id, "clientSecret": self.secret},
+                timeout=aiohttp.ClientTimeout(total=20),
+            ) as response:
+                data = await response.json(content_type=None)
+        if not isinstance(data, dict) or "access_token" not in data or "expires_in" not in data:
+            raise RuntimeError(f"获取access_token失败, 请检查appid和secret: {data}")
+        self.token = data["access_token"]
+        self.expires_at = time.time() + int(data["expires_in"])
+        self.refreshes += 1
+        _log.info(f"access_token 已更新, 有效期 {data['expires_in']} 秒")
+        self._save_cache()
+        return self.token
+
+    # ---- 后台刷新 ----
+
+    def start(self):
+        """在当前事件循环中启动后台刷新任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self):
+        delay = 5
+        while True:
+            wait = self.expires_at - self.refresh_margin - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.refresh()
+                delay = 5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 旧令牌在过期前仍可使用, 退避后重试
+                _log.warning(f"提前刷新access_token失败, {delay} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+
+class ManagedToken(Token):
+    """交给 botpy 使用的 Token, 实际的获取和刷新由 TokenManager 完成"""
+
+    def __init__(self, manager: TokenManager):
+        super().__init__(manager.app_id, manager.secret)
+        self.manager = manager
+        self._issued = None
+
+    async def check_token(self):
+        if self.access_token is None and self._issued is not None:
+            # 网关鉴权失败时 botpy 会清空 access_token, 此时强制换新
+            self.manager.invalidate(self._issued)
+        self.access_token = await self.manager.get()
+        self._issued = self.access_token
+        self.expires_in = int(self.manager.expires_at)
+
+    async def update_access_token(self):
+        self.manager.invalidate(self._issued)
+        await self.check_token()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件监视器
+
+Linux 下通过 inotify 监听文件所在目录(编辑器和本程序都用"写临时文件再替换"的方式保存,
+所以要监听目录而不是文件本身); 其他平台或 inotify 不可用时退回按 mtime 轮询。
+检测到变化后做短暂防抖, 再在事件循环中调用对应的回调。回调抛出的异常只记录日志,
+不会影响机器人进程。
+"""
+
+import os
+import sys
+import struct
+import asyncio
+import ctypes
+import ctypes.util
+
+from botpy import logging as botpy_logging
+
+_log = botpy_logging.get_logger()
+
+# inotify 常量, 见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+
+def _stat_key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class _Inotify:
+    """基于 ctypes 的最小 inotify 封装"""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify 仅支持 Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}
+
+    def add_dir(self, directory: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {directory}")
+        self._dirs[wd] = directory
+
+    def read_paths(self) -> set:
+        """读取所有待处理事件, 返回发生变化的文件路径"""
+        paths = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                wd, _mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                directory = self._dirs.get(wd)
+                if directory and name:
+                    paths.add(os.path.join(directory, os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FileWatcher:
+    """监视一组文件, 内容变化时调用回调
+
+    Args:
+        debounce: 防抖时间(秒), 合并编辑器保存时的多次写入
+        poll_interval: 轮询模式下的检查间隔(秒)
+        use_inotify: 为 False 时强制使用轮询
+    """
+
+    def __init__(self, debounce: float = 0.5, poll_interval: float = 2.0, use_inotify: bool = True):
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self._callbacks = {}
+        self._keys = {}
+        self._pending = {}
+        self._inotify = None
+        self._poll_task = None
+        self._loop = None
+        self.mode = None
+
+    def watch(self, path: str, callback):
+        """注册文件及其回调, 回调参数为文件路径, 可以是普通函数或协程函数"""
+        path = os.path.abspath(path)
+        directory = os.path.dirname(path)
+        if self._inotify is not None and all(os.path.dirname(p) != directory for p in self._callbacks):
+            # 已启动后(例如多个机器人共用一个监视器)再加入的新目录
+            self._inotify.add_dir(directory)
+        self._callbacks[path] = callback
+        self._keys[path] = _stat_key(path)
+
+    def start(self):
+        """在当前事件循环中启动监视"""
+        self._loop = asyncio.get_running_loop()
+        if self.use_inotify:
+            try:
+                self._inotify = _Inotify()
+                for directory in {os.path.dirname(path) for path in self._callbacks}:
+                    self._inotify.add_dir(directory)
+                self._loop.add_reader(self._inotify.fd, self._on_inotify)
+                self.mode = "inotify"
+            except (OSError, AttributeError, NotImplementedError) as e:
+                _log.info(f"inotify 不可用({e}), 改用轮询监视配置文件")
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        if self._inotify is None:
+            self._poll_task = self._loop.create_task(self._poll())
+            self.mode = "poll"
+        _log.info(f"配置文件监视已启动({self.mode}): {', '.join(os.path.basename(p) for p in self._callbacks)}")
+
+    def stop(self):
+        if self._inotify is not None:
+            self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+
+    def _on_inotify(self):
+        for path in self._inotify.read_paths():
+            if path in self._callbacks:
+                self._schedule(path)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for path in self._callbacks:
+                if _stat_key(path) != self._keys.get(path):
+                    self._schedule(path)
+
+    def _schedule(self, path: str):
+        handle = self._pending.pop(path, None)
+        if handle is not None:
+            handle.cancel()
+        self._pending[path] = self._loop.call_later(self.debounce, self._fire, path)
+
+    def _fire(self, path: str):
+        self._pending.pop(path, None)
+        key = _stat_key(path)
+        if key is None or key == self._keys.get(path):
+            return
+        self._keys[path] = key
+        callback = self._callbacks[path]
+        try:
+            result = callback(path)
+            if asyncio.iscoroutine(result):
+                self._loop.create_task(self._guard(result, path))
+        except Exception as e:
+            _log.error(f"处理文件变化失败 {path}: {e}")
+
+    async def _guard(self, coro, path):
+        try:
+            await coro
+        except Exception as e:
+            _log.error(f"处理文件变化失败 {path}: {e}")
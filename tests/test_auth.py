@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+from modules.auth import AdminAuthority, parse_group_admins, ROLE_ADMIN, ROLE_OWNER, CACHE_LIMIT
+
+
+def group_message(user_id, group_id):
+    return SimpleNamespace(author=SimpleNamespace(member_openid=user_id), group_openid=group_id)
+
+
+def c2c_message(user_id):
+    return SimpleNamespace(author=SimpleNamespace(user_openid=user_id))
+
+
+@pytest.fixture
+def authority():
+    return AdminAuthority(["boss"], parse_group_admins({"G1": ["ga", {"id": "go", "role": ROLE_OWNER}]}))
+
+
+def test_parse_group_admins_accepts_single_entries_and_roles():
+    entries = parse_group_admins({"G1": "a", "G2": {"id": "b", "role": "owner"}, 3: ["c"]})
+    assert entries == (("G1", "a", ROLE_ADMIN), ("G2", "b", ROLE_OWNER), ("3", "c", ROLE_ADMIN))
+    assert parse_group_admins(None) == ()
+
+
+@pytest.mark.parametrize("value", [["G1"], {"G1": 5}, {"G1": [{"role": "admin"}]}, {"G1": [{"id": "a", "role": "root"}]}])
+def test_parse_group_admins_rejects_bad_config(value):
+    with pytest.raises(ValueError):
+        parse_group_admins(value)
+
+
+def test_global_admin_is_owner_everywhere(authority):
+    assert authority.check_message(group_message("boss", "G2"), ROLE_OWNER)
+    assert authority.check_message(c2c_message("boss"), ROLE_OWNER)
+
+
+def test_group_admin_cannot_change_shared_state(authority):
+    assert not authority.check_message(group_message("ga", "G1"))
+    assert not authority.check_message(group_message("go", "G1"), ROLE_OWNER)
+    assert not authority.check_message(c2c_message("ga"))
+
+
+def test_group_admin_read_only_commands_only_in_own_group(authority):
+    assert authority.check_message(group_message("ga", "G1"), shared=False)
+    assert not authority.check_message(group_message("ga", "G2"), shared=False)
+    assert not authority.check_message(group_message("stranger", "G1"), shared=False)
+
+
+def test_open_access_without_admins():
+    authority = AdminAuthority()
+    assert authority.open_access
+    assert authority.check_message(group_message("anyone", "G1"), ROLE_OWNER)
+    assert authority.has_role(None)
+
+
+def test_missing_user_id_is_denied(authority):
+    assert not authority.has_role(None, "G1")
+    assert not authority.check_message(SimpleNamespace(author=None))
+
+
+def test_cache_is_bounded(authority):
+    for i in range(CACHE_LIMIT + 10):
+        authority.role_level(f"user{i}", "G1")
+    assert len(authority._cache) <= CACHE_LIMIT
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from datetime import date
+
+from modules.ledger import (ReminderLedger, LedgerRecord, RECORD, CHANNEL_EMAIL, STATUS_OK, STATUS_UNKNOWN,
+                            FLAG_FORCED, FLAG_PAUSED)
+from modules.roster import Roster, Member
+
+
+def test_record_pack_round_trip():
+    record = LedgerRecord(1760000000, 7, date(2026, 10, 19), CHANNEL_EMAIL, STATUS_OK, 2, FLAG_FORCED)
+    data = record.pack()
+    assert len(data) == RECORD.size == 16
+    copy = LedgerRecord.unpack(data)
+    assert (copy.ts, copy.member_id, copy.duty_date, copy.channel, copy.status, copy.attempt, copy.flags) == \
+        (1760000000, 7, date(2026, 10, 19), CHANNEL_EMAIL, STATUS_OK, 2, FLAG_FORCED)
+    assert copy.ok
+
+
+def test_stats_count_each_duty_day_once(tmp_path):
+    ledger = ReminderLedger(str(tmp_path))
+    ledger.record(1, CHANNEL_EMAIL, False, 1, date(2026, 10, 19))
+    ledger.record(1, CHANNEL_EMAIL, True, 2, date(2026, 10, 19))
+    # 同一天手动 /send 只算一次值日
+    ledger.record(1, CHANNEL_EMAIL, True, 1, date(2026, 10, 19), forced=True)
+    ledger.record(1, CHANNEL_EMAIL, True, 1, date(2026, 10, 20), paused=True)
+    ledger.record(2, CHANNEL_EMAIL, False, 1, date(2026, 10, 20), uncertain=True)
+    assert ledger.member_stats(1) == {"ok": 1, "failed": 1, "last": "2026-10-19", "term_ok": 1}
+    assert ledger.member_stats(2)["failed"] == 1
+    recent = ledger.recent(2)
+    assert recent[0].status == STATUS_UNKNOWN
+    assert recent[1].flags & FLAG_PAUSED
+
+
+def test_history_text(tmp_path):
+    ledger = ReminderLedger(str(tmp_path))
+    ledger.record(1, CHANNEL_EMAIL, False, 3, date(2026, 10, 19), uncertain=True)
+    ledger.record(9, CHANNEL_EMAIL, True, 1, date(2026, 10, 20))
+    text = ledger.format_history(Roster([Member(1, "a", "1")]))
+    assert "已删除成员#9" in text
+    assert "结果未知(第3次)" in text
+
+
+def test_replays_records_missing_from_stats(tmp_path):
+    ledger = ReminderLedger(str(tmp_path))
+    ledger.record(1, CHANNEL_EMAIL, True, 1, date(2026, 10, 19))
+    os.remove(ledger.stats_path)
+    rebuilt = ReminderLedger(str(tmp_path))
+    assert rebuilt.records == 1
+    assert rebuilt.member_stats(1)["ok"] == 1
+
+
+def test_truncated_ledger_resets_stats(tmp_path):
+    ledger = ReminderLedger(str(tmp_path))
+    ledger.record(1, CHANNEL_EMAIL, True, 1, date(2026, 10, 19))
+    with open(ledger.stats_path, "r", encoding="utf-8") as f:
+        stats = json.load(f)
+    stats["records"] = 5
+    with open(ledger.stats_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    rebuilt = ReminderLedger(str(tmp_path))
+    assert rebuilt.records == 1
+    assert rebuilt.member_stats(1)["ok"] == 1
+
+
+def test_instances_sharing_a_data_dir_stay_consistent(tmp_path):
+    # 相当于网关进程和调度进程各自的 ReminderLedger
+    gateway = ReminderLedger(str(tmp_path))
+    scheduler = ReminderLedger(str(tmp_path))
+    scheduler.record(1, CHANNEL_EMAIL, True, 1, date(2026, 10, 19))
+    assert gateway.member_stats(1)["ok"] == 1
+    gateway.start_term(date(2026, 10, 20))
+    scheduler.record(2, CHANNEL_EMAIL, True, 1, date(2026, 10, 20))
+    fresh = ReminderLedger(str(tmp_path))
+    assert fresh.records == 2
+    assert fresh.term_start == "2026-10-20"
+    assert fresh.member_stats(1) == {"ok": 1, "failed": 0, "last": "2026-10-19", "term_ok": 0}
+    assert fresh.member_stats(2)["term_ok"] == 1
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from modules.pager import Paginator, _truncate, _byte_len
+
+
+def lines_of(count):
+    return lambda: (f"{i:04d}" for i in range(count))
+
+
+def test_pages_fit_byte_budget():
+    paginator = Paginator(byte_budget=20)
+    # 每行 4 字节加换行, 每页 4 行
+    lines, has_next, total = paginator.page("m", 1, lines_of(10), 1)
+    assert lines == ("0000", "0001", "0002", "0003")
+    assert has_next and total is None
+    lines, has_next, total = paginator.page("m", 1, lines_of(10), 3)
+    assert lines == ("0008", "0009")
+    assert not has_next and total == 3
+    assert paginator.page("m", 1, lines_of(10), 4) is None
+
+
+def test_exact_fit_knows_there_is_no_next_page():
+    paginator = Paginator(byte_budget=20)
+    lines, has_next, total = paginator.page("m", 1, lines_of(4), 1)
+    assert len(lines) == 4
+    assert not has_next and total == 1
+
+
+def test_multibyte_lines_are_counted_in_bytes():
+    paginator = Paginator(byte_budget=10)
+    lines, _, _ = paginator.page("m", 1, lambda: iter(["一二三", "四五六"]), 1)
+    assert lines == ("一二三",)
+
+
+def test_lines_generated_once_per_version():
+    paginator = Paginator(byte_budget=20)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return lines_of(10)()
+
+    paginator.page("m", 1, factory, 1)
+    paginator.page("m", 1, factory, 2)
+    paginator.page("m", 1, factory, 1)
+    assert len(calls) == 1
+    paginator.page("m", 2, factory, 1)
+    assert len(calls) == 2
+
+
+def test_truncate_long_line():
+    assert _truncate("abc", 10) == "abc"
+    text = _truncate("一" * 10, 10)
+    assert text == "一一..."
+    assert _byte_len(text) <= 10
+    paginator = Paginator(byte_budget=10)
+    lines, _, _ = paginator.page("m", 1, lambda: iter(["x" * 50]), 1)
+    assert lines == ("x" * 7 + "...",)
+
+
+def test_render():
+    paginator = Paginator(byte_budget=20)
+    args = ("成员列表", "/list m", "名单为空")
+    page = paginator.render("m", 1, lines_of(3), 1, *args)
+    assert page.text == "成员列表:\n0000\n0001\n0002"
+    assert not page.has_next and page.total == 1
+
+    page = paginator.render("n", 1, lines_of(10), 1, *args)
+    assert page.text.endswith("(第 1 页, 下一页: /list m 2)")
+    page = paginator.render("n", 1, lines_of(10), 3, *args)
+    assert page.text.startswith("成员列表(第 3/3 页):")
+    assert page.text.endswith("已是最后一页)")
+    assert paginator.render("n", 1, lines_of(10), 5, *args).text == "没有第 5 页"
+
+    assert paginator.render("e", 1, lines_of(0), 1, *args).text == "名单为空"
+    assert paginator.render("e", 1, lines_of(0), 2, *args).text == "名单为空"
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import random
+
+import pytest
+
+from modules.roster import Roster, Member
+
+
+def make_roster(count):
+    return Roster([Member(i, f"m{i}", str(1000 + i)) for i in range(1, count + 1)])
+
+
+def test_positions_follow_insertion_order():
+    roster = make_roster(5)
+    assert [m.id for m in roster] == [1, 2, 3, 4, 5]
+    assert [roster[i].id for i in range(5)] == [1, 2, 3, 4, 5]
+    assert roster[-1].id == 5
+    assert [roster.position_of(i) for i in range(1, 6)] == [0, 1, 2, 3, 4]
+
+
+def test_remove_shifts_later_positions():
+    roster = make_roster(5)
+    assert roster.remove(2) == 1
+    assert len(roster) == 4
+    assert [roster[i].id for i in range(4)] == [1, 3, 4, 5]
+    assert roster.position_of(4) == 2
+    assert roster.position_of(2) == -1
+    assert roster.get(2) is None
+    assert roster.get_by_qq("1002") is None
+    assert roster.remove(2) == -1
+
+
+def test_add_uses_increasing_ids_and_rejects_duplicate_qq():
+    roster = make_roster(3)
+    roster.remove(3)
+    member = roster.add("new", "2000")
+    # 删除成员后ID不会被复用
+    assert member.id == 4
+    assert roster.position_of(4) == 2
+    assert roster.get_by_qq("2000") is member
+    with pytest.raises(ValueError):
+        roster.add("dup", "2000")
+
+
+def test_duplicate_members_are_rejected():
+    with pytest.raises(ValueError):
+        Roster([Member(1, "a", "1"), Member(1, "b", "2")])
+    with pytest.raises(ValueError):
+        Roster([Member(1, "a", "1"), Member(2, "b", "1")])
+
+
+def test_index_out_of_range():
+    roster = make_roster(2)
+    with pytest.raises(IndexError):
+        roster[2]
+    with pytest.raises(IndexError):
+        make_roster(0)[0]
+
+
+def test_fenwick_matches_list_model_through_compaction():
+    rng = random.Random(7)
+    roster = Roster()
+    model = []
+    for step in range(2000):
+        if model and rng.random() < 0.45:
+            member = rng.choice(model)
+            assert roster.remove(member.id) == model.index(member)
+            model.remove(member)
+        else:
+            model.append(roster.add(f"n{step}", f"q{step}"))
+        if step % 97 == 0:
+            assert [m.id for m in roster] == [m.id for m in model]
+            for position, member in enumerate(model):
+                assert roster[position] is member
+                assert roster.position_of(member.id) == position
+    assert len(roster) == len(model)
+
+
+def test_dict_round_trip():
+    roster = make_roster(3)
+    roster.remove(1)
+    copy = Roster.from_dicts(roster.to_dicts(), roster.next_id)
+    assert list(copy) == list(roster)
+    assert copy.next_id == roster.next_id
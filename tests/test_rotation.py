@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+from datetime import date, timedelta
+
+import pytest
+
+from modules.roster import Roster, Member
+from modules.rotation import (HolidayCalendar, RotationEngine, STRATEGY_FAIR, new_rotation_state,
+                              validate_rotation_state, dump_rotation_state)
+
+ANCHOR = date(2026, 10, 19)
+
+
+def make_roster(count):
+    return Roster([Member(i, f"m{i}", str(1000 + i)) for i in range(1, count + 1)])
+
+
+def make_engine(count=4, holidays=(), strategy="sequential"):
+    state = new_rotation_state()
+    state["anchor"] = ANCHOR.isoformat()
+    return RotationEngine(make_roster(count), state, strategy, calendar=HolidayCalendar(holidays))
+
+
+def duty(engine, start, days):
+    return [engine.on(start + timedelta(days=i), 0).id for i in range(days)]
+
+
+def test_duty_number_skips_holidays():
+    calendar = HolidayCalendar(["10-01", "10-02", "02-29"])
+    plain = HolidayCalendar([])
+    assert plain.duty_number(date(2026, 1, 1)) == date(2026, 1, 1).toordinal() - 1
+    # 假期当天与其后第一个非假期日编号相同
+    assert calendar.duty_number(date(2026, 10, 1)) == calendar.duty_number(date(2026, 10, 3))
+    assert calendar.duty_number(date(2026, 10, 3)) == calendar.duty_number(date(2026, 9, 30)) + 1
+    assert calendar.next_duty_day(date(2026, 10, 1)) == date(2026, 10, 3)
+    assert calendar.duty_day(calendar.duty_number(date(2028, 2, 29))) == date(2028, 3, 1)
+
+
+@pytest.mark.parametrize("holidays", [[], ["01-01", "12-31"], ["02-28", "02-29", "03-01"]])
+def test_duty_day_is_inverse_of_duty_number(holidays):
+    calendar = HolidayCalendar(holidays)
+    day = date(2023, 12, 1)
+    while day < date(2025, 3, 10):
+        if not calendar.is_holiday(day):
+            assert calendar.duty_day(calendar.duty_number(day)) == day
+        day += timedelta(days=1)
+    # 和逐日计数一致
+    count = sum(1 for i in range(366 * 2)
+                if not calendar.is_holiday(date(2023, 1, 1) + timedelta(days=i))
+                and date(2023, 1, 1) + timedelta(days=i) < date(2025, 1, 1))
+    assert calendar.duty_number(date(2025, 1, 1)) - calendar.duty_number(date(2023, 1, 1)) == count
+
+
+def test_on_follows_anchor_and_holidays():
+    engine = make_engine(3, holidays=["10-21"])
+    assert duty(engine, ANCHOR - timedelta(days=1), 2) == [3, 1]
+    assert duty(engine, ANCHOR, 2) == [1, 2]
+    assert engine.on(date(2026, 10, 21), 0) is None
+    assert duty(engine, date(2026, 10, 22), 2) == [3, 1]
+    # 锚点位置由 current_index 决定
+    assert engine.on(ANCHOR, 2).id == 3
+
+
+def test_absence_is_covered_and_repaid():
+    engine = make_engine(4)
+    engine.set_absence(2, date(2026, 10, 20))
+    moves = engine.cover_absence(2, ANCHOR, date(2026, 10, 20), 0)
+    assert len(moves) == 1
+    turn, substitute, repay = moves[0]
+    assert turn == date(2026, 10, 20)
+    schedule = duty(engine, ANCHOR, 8)
+    assert schedule == [1, 4, 3, 2, 1, 2, 3, 4]
+    # 没有人连续值日, 也没有人少轮一次
+    assert all(a != b for a, b in zip(schedule, schedule[1:]))
+    assert sorted(schedule) == [1, 1, 2, 2, 3, 3, 4, 4]
+    assert engine.on(repay, 0).id == 2 and engine.on(turn, 0).id == substitute
+
+    engine.uncover_absence(2)
+    engine.set_absence(2, None)
+    assert engine.state["overrides"] == {} and engine.state["covers"] == {}
+    assert duty(engine, ANCHOR, 4) == [1, 2, 3, 4]
+
+
+def test_long_absence_is_spread_over_substitutes():
+    engine = make_engine(5)
+    until = ANCHOR + timedelta(days=14)
+    engine.set_absence(1, until)
+    moves = engine.cover_absence(1, ANCHOR, until, 0)
+    assert len(moves) == 3
+    # 不连续值日优先于轮流代替
+    assert max(sum(1 for _, s, _ in moves if s == m) for m in range(2, 6)) == 2
+    schedule = duty(engine, ANCHOR, 35)
+    assert all(a != b for a, b in zip(schedule, schedule[1:]))
+    assert all(schedule.count(m) == 7 for m in range(1, 6))
+    assert 1 not in schedule[:15]
+
+
+def test_swap_turns():
+    engine = make_engine(4)
+    first_day, second_day = engine.swap_turns(1, 3, date(2026, 10, 20), 0)
+    assert (first_day, second_day) == (date(2026, 10, 23), date(2026, 10, 21))
+    assert duty(engine, ANCHOR, 6) == [1, 2, 1, 4, 3, 2]
+
+
+def test_state_round_trip():
+    engine = make_engine(4)
+    engine.set_absence(2, date(2026, 10, 20))
+    engine.cover_absence(2, ANCHOR, date(2026, 10, 20), 0)
+    engine.swap(1, 3)
+    dumped = dump_rotation_state(engine.state)
+    assert all(isinstance(k, str) for k in dumped["covers"])
+    assert validate_rotation_state(dumped) == engine.state
+    with pytest.raises(ValueError):
+        validate_rotation_state({"covers": {"2": ["not a date"]}})
+
+
+def test_forget_drops_covers():
+    engine = make_engine(4)
+    engine.set_absence(2, date(2026, 10, 20))
+    engine.cover_absence(2, ANCHOR, date(2026, 10, 20), 0)
+    engine.forget(2)
+    assert engine.state["covers"] == {} and engine.state["overrides"] == {}
+
+
+def test_fair_strategy_balances_counts():
+    engine = make_engine(3, strategy=STRATEGY_FAIR)
+    index = 0
+    chosen = []
+    for _ in range(9):
+        index, member = engine.advance(index, ANCHOR)
+        chosen.append(member.id)
+    assert all(a != b for a, b in zip(chosen, chosen[1:]))
+    assert engine.state["counts"] == {1: 3, 2: 3, 3: 3}
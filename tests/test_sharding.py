@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+
+import pytest
+
+from modules.sharding import HashRing, rebalance_plan, describe_plan, shard_key
+
+KEYS = [f"group-{i:05d}" for i in range(4000)]
+
+
+def test_shard_key():
+    assert shard_key("group_at_message_create", {"group_openid": "G1"}) == "G1"
+    assert shard_key("c2c_message_create", {"author": {"user_openid": "U1"}}) == "U1"
+    assert shard_key("friend_add", {"openid": "U2"}) == "U2"
+    assert shard_key("c2c_message_create", {"author": None}) == ""
+    assert shard_key("group_add_robot", {}) == ""
+
+
+def test_owner_is_deterministic_and_balanced():
+    ring = HashRing(4)
+    owners = [ring.owner(key) for key in KEYS]
+    other = HashRing(4)
+    assert owners == [other.owner(key) for key in KEYS]
+    counts = Counter(owners)
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(700 < n < 1300 for n in counts.values())
+
+
+def test_single_worker_and_invalid_count():
+    assert {HashRing(1).owner(key) for key in KEYS[:100]} == {0}
+    with pytest.raises(ValueError):
+        HashRing(0)
+
+
+def test_rebalance_moves_about_one_nth():
+    plan = rebalance_plan(4, 5, KEYS)
+    # 只有换到新进程的键, 约 1/5
+    assert {after for _before, after in plan.values()} == {4}
+    assert 0.12 < len(plan) / len(KEYS) < 0.28
+    ring = HashRing(4)
+    assert all(ring.owner(key) == before for key, (before, _after) in plan.items())
+    assert rebalance_plan(4, 4, KEYS) == {}
+    # 减少进程时只有被移除进程的键需要迁移
+    assert {before for before, _after in rebalance_plan(5, 4, KEYS).values()} == {4}
+
+
+def test_describe_plan():
+    text = describe_plan(2, 3, KEYS[:50])
+    plan = rebalance_plan(2, 3, KEYS[:50])
+    assert text.splitlines()[0] == f"工作进程 2 -> 3: {len(plan)}/50 个群改由其他进程处理"
+    assert len(text.splitlines()) == len(plan) + 1
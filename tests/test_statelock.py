@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from modules.statelock import StateLock, merge_changes, normalize, read_json, fcntl
+
+
+def test_merge_keeps_changes_from_both_sides():
+    base = {"index": 1, "date": "2026-10-18", "name": "a"}
+    ours = {"index": 2, "date": "2026-10-18", "name": "a"}
+    theirs = {"index": 1, "date": "2026-10-19", "name": "a"}
+    assert merge_changes(base, ours, theirs) == {"index": 2, "date": "2026-10-19", "name": "a"}
+
+
+def test_merge_conflict_prefers_ours():
+    assert merge_changes({"x": 1}, {"x": 2}, {"x": 3}) == {"x": 2}
+    assert merge_changes({"x": [1]}, {"x": [1, 2]}, {"x": [1, 3]}) == {"x": [1, 2]}
+
+
+def test_merge_nested_dicts():
+    base = {"rotation": {"absences": {}, "anchor": "2026-10-01"}}
+    ours = {"rotation": {"absences": {"2": "2026-10-20"}, "anchor": "2026-10-01"}}
+    theirs = {"rotation": {"absences": {}, "anchor": "2026-10-19"}}
+    assert merge_changes(base, ours, theirs) == {
+        "rotation": {"absences": {"2": "2026-10-20"}, "anchor": "2026-10-19"}}
+
+
+def test_merge_additions_and_deletions():
+    base = {"a": 1, "b": 2}
+    # 本进程删除 a, 另一进程删除 b 并新增 c
+    assert merge_changes(base, {"b": 2, "d": 4}, {"a": 1, "c": 3}) == {"c": 3, "d": 4}
+
+
+def test_merge_without_usable_base_returns_ours():
+    ours = {"a": 1}
+    assert merge_changes(None, ours, {"a": 2}) is ours
+    assert merge_changes({"a": 0}, ours, None) is ours
+    assert merge_changes({"a": 0}, ["x"], {"a": 2}) == ["x"]
+
+
+def test_normalize_and_read_json(tmp_path):
+    assert normalize({1: {2: "值"}}) == {"1": {"2": "值"}}
+    path = tmp_path / "data.json"
+    assert read_json(str(path)) is None
+    path.write_text("{broken", encoding="utf-8")
+    assert read_json(str(path)) is None
+    path.write_text(json.dumps({"a": [1]}), encoding="utf-8")
+    assert read_json(str(path)) == {"a": [1]}
+
+
+def test_lock_is_shared_per_data_dir_and_reentrant(tmp_path):
+    lock = StateLock.for_data_dir(str(tmp_path))
+    assert StateLock.for_data_dir(str(tmp_path) + "/.") is lock
+    assert StateLock.for_data_dir(str(tmp_path / "other")) is not lock
+    with lock:
+        with lock:
+            assert lock._depth == 2
+        assert lock._depth == 1
+    assert lock._depth == 0
+
+
+@pytest.mark.skipif(fcntl is None, reason="需要 fcntl")
+def test_lock_excludes_other_file_descriptions(tmp_path):
+    lock = StateLock.for_data_dir(str(tmp_path))
+    # 另一个进程的锁相当于另一个打开的文件
+    other = open(lock.path, "a")
+    try:
+        with lock:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fcntl.flock(other, fcntl.LOCK_UN)
+    finally:
+        other.close()
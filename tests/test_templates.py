@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import pytest
+
+from modules.roster import Member
+from modules.templates import TemplateSet, KIND_NORMAL, KIND_PAUSE, DEFAULT_TEMPLATES
+
+MEMBER = Member(3, "小明", "10001")
+DAY = date(2026, 10, 19)  # 星期一
+
+
+def test_default_render():
+    templates = TemplateSet({"normal": DEFAULT_TEMPLATES[KIND_NORMAL]})
+    assert templates.render(KIND_NORMAL, MEMBER, DAY) == "今天 (2026-10-19) 星期 一 ,今天该 小明 你扫地啦"
+    # 旧配置缺少 pause 模板时使用默认值
+    assert "轮换任务已暂停" in templates.render(KIND_PAUSE, MEMBER, DAY)
+
+
+def test_fields_and_format_spec():
+    templates = TemplateSet({"normal": "{date} #{id:03d} {name!r} {qq}", "pause": "{month:02d}"})
+    assert templates.render(KIND_NORMAL, MEMBER, DAY) == "2026-10-19 #003 '小明' 10001"
+    assert templates.render(KIND_PAUSE, MEMBER, DAY) == "10"
+    # 日期字段按天缓存, 换一天要重新填充
+    assert templates.render(KIND_NORMAL, MEMBER, date(2026, 10, 20)).startswith("2026-10-20")
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"normal": "{nmae}"}, "未知字段"),
+    ({"normal": "{name"}, "格式错误"),
+    ({"normal": "{name!x}"}, "转换符无效"),
+    ({"normal": "{id:q}"}, "格式"),
+    ({"normal": 1}, "必须是字符串"),
+    ({"normal": "{name}", "groups": {}}, "groups 不受支持"),
+    ({"normal": "{name}", "languages": {"fr": {}}}, "不支持的语言"),
+    ({"normal": "{name}", "language": "fr"}, "language 不支持"),
+])
+def test_invalid_config(config, message):
+    with pytest.raises(ValueError, match=message):
+        TemplateSet(config)
+
+
+def test_language_selection():
+    templates = TemplateSet({
+        "normal": "{name} 星期{weekday}",
+        "language": "en",
+        "languages": {"en": {"normal": "{weekday}: {name} is on duty"}},
+    })
+    assert templates.render(KIND_NORMAL, MEMBER, DAY) == "Monday: 小明 is on duty"
+    assert templates.render(KIND_NORMAL, MEMBER, DAY, language="zh") == "小明 星期一"
+    # 英文没有 pause 模板时回退到中文默认模板, 星期也用中文
+    assert templates.resolve(KIND_PAUSE)[1] == "zh"
+    assert "星期 一" in templates.render(KIND_PAUSE, MEMBER, DAY)
+
+
+def test_warnings_missing_name():
+    templates = TemplateSet({"normal": "{date}", "languages": {"en": {"pause": "{weekday}"}}})
+    warnings = templates.warnings()
+    assert len(warnings) == 2
+    assert any(w.startswith("message_templates.normal") for w in warnings)
+    assert any(w.startswith("languages.en.pause") for w in warnings)
+    assert TemplateSet({"normal": "{name}"}).warnings() == []
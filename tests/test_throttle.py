@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from modules import throttle
+from modules.throttle import RecentKeys
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hit_within_ttl(clock):
+    keys = RecentKeys(ttl=60, capacity=10)
+    assert not keys.hit("u1")
+    clock[0] += 59
+    assert keys.hit("u1")
+    assert not keys.hit("u2")
+
+
+def test_expired_keys_are_dropped(clock):
+    keys = RecentKeys(ttl=60, capacity=10)
+    keys.hit("u1")
+    clock[0] += 30
+    keys.hit("u2")
+    clock[0] += 30
+    # 命中不会延长有效期
+    assert not keys.hit("u1")
+    assert len(keys) == 2
+    clock[0] += 100
+    keys.hit("u3")
+    assert len(keys) == 1
+
+
+def test_capacity_evicts_oldest(clock):
+    keys = RecentKeys(ttl=60, capacity=3)
+    for key in ("a", "b", "c", "d"):
+        keys.hit(key)
+    assert len(keys) == 3
+    assert not keys.hit("a")
+    assert keys.hit("c") and keys.hit("d")
+
+
+def test_clear(clock):
+    keys = RecentKeys(ttl=60, capacity=3)
+    keys.hit("a")
+    keys.clear()
+    assert len(keys) == 0
+    assert not keys.hit("a")